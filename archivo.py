@@ -0,0 +1,581 @@
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from datetime import datetime
+from urllib.request import pathname2url
+
+import datos
+from metricas import medido, contar
+from migraciones import LLENAR_STOCK
+
+# Importaciones cerradas (sin cambios desde una fecha de corte) se mueven de
+# productos.db a un archivo SQLite por año de su última actividad, en la carpeta
+# archivo/ junto a la base. Los archivos solo se leen (adjuntos en modo ro) cuando
+# se pide ver o exportar también lo archivado; el resto de la aplicación y los
+# vencimientos trabajan solo con lo que queda en la base. El resumen de stock sigue
+# contando las líneas archivadas: archivar no es dar de baja lo recibido.
+
+CARPETA_ARCHIVO = "archivo"
+CARPETA_RESPALDOS = "respaldos"
+TAMANO_LOTE = 500
+# importaciones_AAAA.db, o importaciones_AAAA-BBBB.db si agrupar_archivos juntó varios años.
+_NOMBRE_ARCHIVO = re.compile(r"^importaciones_(\d{4}(?:-\d{4})?)\.db$")
+COLUMNAS = ("id, importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones, "
+            "sku_linea, marca_linea, producto_linea")
+# Texto propio de la línea (ver migraciones._v12_texto_por_linea); los archivos
+# anteriores no lo tienen.
+COLUMNAS_TEXTO = ("sku_linea", "marca_linea", "producto_linea")
+ESQUEMA_ARCHIVO = (
+    '''CREATE TABLE IF NOT EXISTS {s}.importaciones (
+        id INTEGER PRIMARY KEY,
+        importacion_no TEXT,
+        codebar TEXT,
+        lote TEXT,
+        fecha_expira TEXT,
+        cant_recibida INTEGER,
+        cant_rechazada INTEGER,
+        cant_aceptada INTEGER,
+        observaciones TEXT,
+        sku_linea TEXT,
+        marca_linea TEXT,
+        producto_linea TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS {s}.idx_importaciones_no ON importaciones(importacion_no)',
+    # Líneas que el archivado en curso copió a este archivo (ver _copiar). Se vacía al
+    # terminar; si el archivado se interrumpe, el siguiente sigue desde acá.
+    'CREATE TABLE IF NOT EXISTS {s}.copiando (id INTEGER PRIMARY KEY)',
+    'CREATE INDEX IF NOT EXISTS {s}.idx_importaciones_codebar ON importaciones(codebar)',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS {s}.importaciones_fts USING fts5(
+        producto, marca, sku, lote, observaciones,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )''',
+)
+
+def _limite_adjuntos():
+    # SQLite admite 10 bases adjuntas por conexión salvo que se compile con otro límite.
+    conn = sqlite3.connect(":memory:")
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:
+        # getlimit es de Python 3.11.
+        return 10
+    finally:
+        conn.close()
+
+# Cuántos archivos puede adjuntar la vista unificada; agrupar_archivos junta los más
+# antiguos para no pasar de ahí.
+MAX_ADJUNTOS = _limite_adjuntos()
+
+# Archivar, respaldar y restaurar no se cruzan dentro del mismo proceso: un respaldo
+# nunca ve líneas a medio mover entre la base y un archivo.
+_lock = threading.Lock()
+
+def carpeta_junto_a_base(nombre):
+    return os.path.join(os.path.dirname(os.path.abspath(datos.DB_NAME)), nombre)
+
+def _anios(periodo):
+    # ("AAAA", "BBBB") de un archivo agrupado; ("AAAA", "AAAA") de uno anual.
+    desde, _, hasta = periodo.partition("-")
+    return desde, hasta or desde
+
+def _todos_los_archivos(carpeta):
+    if not os.path.isdir(carpeta):
+        return []
+    archivos = []
+    for nombre in os.listdir(carpeta):
+        coincide = _NOMBRE_ARCHIVO.match(nombre)
+        if coincide:
+            archivos.append((coincide.group(1), os.path.join(carpeta, nombre)))
+    return sorted(archivos)
+
+def _cubiertos(archivos):
+    # Los que ya están copiados dentro de uno agrupado que abarca sus años: quedan si
+    # agrupar_archivos no los pudo borrar (p. ej. abiertos por otra aplicación).
+    rangos = [_anios(periodo) for periodo, _ in archivos]
+    return [(periodo, ruta) for periodo, ruta in archivos
+            if any(desde <= _anios(periodo)[0] and _anios(periodo)[1] <= hasta and (desde, hasta) != _anios(periodo)
+                   for desde, hasta in rangos)]
+
+def listar_archivos(carpeta=None):
+    # [(periodo, ruta)] ordenados por año; el periodo es "AAAA" o "AAAA-BBBB".
+    archivos = _todos_los_archivos(carpeta or carpeta_junto_a_base(CARPETA_ARCHIVO))
+    cubiertos = _cubiertos(archivos)
+    return [a for a in archivos if a not in cubiertos]
+
+def ruta_archivo(periodo, carpeta=None):
+    return os.path.join(carpeta or carpeta_junto_a_base(CARPETA_ARCHIVO), f"importaciones_{periodo}.db")
+
+def archivo_de(anio, carpeta=None):
+    # Archivo donde va (o está) lo archivado de `anio`: el agrupado que lo abarca o el anual.
+    for periodo, ruta in listar_archivos(carpeta):
+        desde, hasta = _anios(periodo)
+        if desde <= anio <= hasta:
+            return ruta
+    return ruta_archivo(anio, carpeta)
+
+# --- Archivado ---
+
+def importaciones_cerradas(conn, antes_de):
+    # (importacion_no, año) sin actividad desde `antes_de`, salvo las que tienen cambios
+    # que algún consumidor todavía no exportó (ver cambios.py). Los id no se reutilizan
+    # (AUTOINCREMENT, ver migraciones._v11_id_autoincremental): uno archivado nunca
+    # vuelve a aparecer en la base.
+    return conn.execute('''
+        SELECT importacion_no, substr(ultima_actividad, 1, 4) FROM importaciones_actividad
+        WHERE ultima_actividad < ?
+          AND importacion_no NOT IN (
+              SELECT i.importacion_no FROM main.cambios c JOIN main.importaciones i ON i.id = c.clave
+              WHERE c.tabla = 'importaciones' AND c.seq > (SELECT min(seq) FROM main.cambios_consumidores))
+        ORDER BY importacion_no
+    ''', (antes_de.isoformat(),)).fetchall()
+
+def _copiar(conn):
+    # Transacción diferida: solo el archivo queda bloqueado para escribir; la base se
+    # lee desde una misma instantánea (WAL) sin frenar a quien esté escaneando. Los id
+    # copiados se anotan en destino.copiando en la misma transacción; OR IGNORE y el
+    # NOT IN permiten repetir el archivado tras una interrupción.
+    conn.execute('BEGIN')
+    try:
+        conn.execute('''
+            INSERT OR IGNORE INTO destino.copiando (id)
+            SELECT id FROM main.importaciones
+            WHERE importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+              AND id NOT IN (SELECT id FROM destino.importaciones)
+        ''')
+        conn.execute(f'''
+            INSERT OR IGNORE INTO destino.importaciones ({COLUMNAS})
+            SELECT {COLUMNAS} FROM main.importaciones
+            WHERE importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+        ''')
+        conn.execute('''
+            INSERT INTO destino.importaciones_fts (rowid, producto, marca, sku, lote, observaciones)
+            SELECT id, producto, marca, sku, lote, observaciones FROM main.importaciones_detalle
+            WHERE importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+              AND id NOT IN (SELECT rowid FROM destino.importaciones_fts)
+        ''')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+# Líneas de la base que este archivado copió y siguen idénticas a su copia: si una se
+# modificó después de copiarla, se queda en la base (y su copia vieja se borra al
+# final). CROSS JOIN fija el orden: se recorre lo que queda en la base, no lo ya
+# borrado del archivo.
+_YA_COPIADAS = '''
+    SELECT i.id FROM main.importaciones i CROSS JOIN destino.importaciones a ON a.id = i.id
+    WHERE i.importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+      AND i.id IN (SELECT id FROM destino.copiando)
+      AND a.importacion_no IS i.importacion_no AND a.codebar IS i.codebar AND a.lote IS i.lote
+      AND a.fecha_expira IS i.fecha_expira AND a.cant_recibida IS i.cant_recibida
+      AND a.cant_rechazada IS i.cant_rechazada AND a.cant_aceptada IS i.cant_aceptada
+      AND a.observaciones IS i.observaciones AND a.sku_linea IS i.sku_linea
+      AND a.marca_linea IS i.marca_linea AND a.producto_linea IS i.producto_linea
+    LIMIT ?
+'''
+
+# Devuelve al resumen de stock lo que su disparador de borrado restó por las líneas
+# del lote (misma forma que stock_ai en migraciones._v4_resumen_stock). El WHERE evita
+# que SQLite lea ON CONFLICT como parte del SELECT.
+_DEVOLVER_STOCK = '''
+    INSERT INTO main.stock (codebar, lote, cant_recibida, cant_rechazada, cant_aceptada, lineas)
+    SELECT coalesce(codebar, ''), coalesce(lote, ''), total(cant_recibida), total(cant_rechazada),
+           total(cant_aceptada), count(*)
+    FROM temp.lote_archivado WHERE true
+    GROUP BY coalesce(codebar, ''), coalesce(lote, '')
+    ON CONFLICT (codebar, lote) DO UPDATE SET
+        cant_recibida = cant_recibida + excluded.cant_recibida,
+        cant_rechazada = cant_rechazada + excluded.cant_rechazada,
+        cant_aceptada = cant_aceptada + excluded.cant_aceptada,
+        lineas = lineas + excluded.lineas
+'''
+
+def _quitar_de_la_base(conn, tamano_lote, progreso, hechas, total):
+    # Por lotes, cada uno en su propia transacción corta: entre lote y lote las
+    # estaciones pueden seguir guardando líneas. Archivar no es dar de baja: las
+    # bajas que anotan los disparadores del diario de cambios se descartan y lo que
+    # resta el disparador del stock se vuelve a sumar, en la misma transacción.
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS lote_archivado AS SELECT id, codebar, lote, cant_recibida, '
+                 'cant_rechazada, cant_aceptada FROM main.importaciones WHERE false')
+    quitadas = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            tope = conn.execute('SELECT coalesce(max(seq), 0) FROM main.cambios').fetchone()[0]
+            conn.execute('DELETE FROM temp.lote_archivado')
+            conn.execute(f'''
+                INSERT INTO temp.lote_archivado
+                SELECT id, codebar, lote, cant_recibida, cant_rechazada, cant_aceptada FROM main.importaciones
+                WHERE id IN ({_YA_COPIADAS})
+            ''', (tamano_lote,))
+            borradas = conn.execute('DELETE FROM main.importaciones WHERE id IN (SELECT id FROM temp.lote_archivado)').rowcount
+            conn.execute(_DEVOLVER_STOCK)
+            conn.execute('DELETE FROM main.cambios WHERE seq > ?', (tope,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        quitadas += borradas
+        if progreso:
+            progreso(hechas + quitadas, total)
+        if borradas < tamano_lote:
+            break
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Del archivo solo se borran copias hechas por este archivado: un id del archivo
+        # que también está en la base no alcanza para saber que es la misma línea.
+        seguidas = 'SELECT id FROM destino.copiando WHERE id IN (SELECT id FROM main.importaciones)'
+        conn.execute(f'DELETE FROM destino.importaciones_fts WHERE rowid IN ({seguidas})')
+        conn.execute(f'DELETE FROM destino.importaciones WHERE id IN ({seguidas})')
+        conn.execute('DELETE FROM destino.copiando')
+        conn.execute('''
+            DELETE FROM main.importaciones_actividad
+            WHERE importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+              AND NOT EXISTS (SELECT 1 FROM main.importaciones i WHERE i.importacion_no = importaciones_actividad.importacion_no)
+        ''')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return quitadas
+
+@medido
+def archivar(antes_de, progreso=None, tamano_lote=TAMANO_LOTE):
+    # Mueve las importaciones sin actividad desde `antes_de` a su archivo anual.
+    # Primero se copian (y se confirman en el archivo) y después se borran de la base:
+    # una interrupción deja como mucho líneas repetidas, que el siguiente archivado
+    # termina de mover. Devuelve {año: líneas archivadas}. Si quedan más archivos de
+    # los que la vista unificada puede adjuntar, se agrupan los más antiguos.
+    with _lock:
+        conn = datos.conectar()
+        try:
+            por_periodo = {}
+            for importacion_no, periodo in importaciones_cerradas(conn, antes_de):
+                por_periodo.setdefault(periodo, []).append(importacion_no)
+            if not por_periodo:
+                return {}
+            os.makedirs(carpeta_junto_a_base(CARPETA_ARCHIVO), exist_ok=True)
+            conn.execute('CREATE TEMP TABLE por_archivar (importacion_no TEXT PRIMARY KEY)')
+            conn.executemany('INSERT INTO temp.por_archivar VALUES (?)',
+                             ((n,) for numeros in por_periodo.values() for n in numeros))
+            total = conn.execute('''
+                SELECT count(*) FROM importaciones WHERE importacion_no IN (SELECT importacion_no FROM temp.por_archivar)
+            ''').fetchone()[0]
+            archivadas = {}
+            hechas = 0
+            for periodo, numeros in sorted(por_periodo.items()):
+                conn.execute('DELETE FROM temp.por_archivar')
+                conn.executemany('INSERT INTO temp.por_archivar VALUES (?)', ((n,) for n in numeros))
+                conn.execute('ATTACH DATABASE ? AS destino', (archivo_de(periodo),))
+                try:
+                    # Sin WAL: el archivo queda en un solo archivo, que se puede adjuntar en modo ro.
+                    conn.execute('PRAGMA destino.journal_mode=DELETE')
+                    for sql in ESQUEMA_ARCHIVO:
+                        conn.execute(sql.format(s="destino"))
+                    for columna in _columnas_faltantes(conn, "destino"):
+                        conn.execute(f'ALTER TABLE destino.importaciones ADD COLUMN {columna} TEXT')
+                    _copiar(conn)
+                    archivadas[periodo] = _quitar_de_la_base(conn, tamano_lote, progreso, hechas, total)
+                    hechas += archivadas[periodo]
+                finally:
+                    conn.execute('DETACH DATABASE destino')
+            contar("archivo.lineas", hechas)
+        finally:
+            conn.close()
+        _agrupar(MAX_ADJUNTOS)
+        return archivadas
+
+def agrupar_archivos(maximo=None):
+    # Junta los archivos más antiguos en uno solo (importaciones_AAAA-BBBB.db) hasta
+    # que queden `maximo` (por defecto MAX_ADJUNTOS). Devuelve la ruta del agrupado, o
+    # None si no hizo falta.
+    with _lock:
+        return _agrupar(maximo or MAX_ADJUNTOS)
+
+def _agrupar(maximo):
+    for _, ruta in _cubiertos(_todos_los_archivos(carpeta_junto_a_base(CARPETA_ARCHIVO))):
+        _borrar_si_se_puede(ruta)
+    archivos = listar_archivos()
+    if len(archivos) <= maximo:
+        return None
+    juntar = archivos[:len(archivos) - maximo + 1]
+    destino = ruta_archivo(f"{_anios(juntar[0][0])[0]}-{_anios(juntar[-1][0])[1]}")
+    # Se arma con otro nombre y se renombra al terminar: hasta entonces los archivos
+    # originales siguen siendo los que se listan.
+    parcial = destino + ".parcial"
+    if os.path.exists(parcial):
+        os.remove(parcial)
+    conn = sqlite3.connect(parcial, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+        for sql in ESQUEMA_ARCHIVO:
+            conn.execute(sql.format(s="main"))
+        # De a uno: adjuntarlos todos juntos chocaría con el mismo límite.
+        for _, ruta in juntar:
+            conn.execute('ATTACH DATABASE ? AS origen', ("file:" + pathname2url(os.path.abspath(ruta)) + "?mode=ro",))
+            try:
+                conn.execute('BEGIN')
+                try:
+                    conn.execute(f'INSERT INTO main.importaciones ({COLUMNAS}) SELECT {_columnas_de(conn, "origen")} '
+                                 f'FROM origen.importaciones')
+                    conn.execute('INSERT INTO main.importaciones_fts (rowid, producto, marca, sku, lote, observaciones) '
+                                 'SELECT rowid, producto, marca, sku, lote, observaciones FROM origen.importaciones_fts')
+                    if conn.execute("SELECT 1 FROM origen.sqlite_master WHERE name = 'copiando'").fetchone():
+                        conn.execute('INSERT OR IGNORE INTO main.copiando SELECT id FROM origen.copiando')
+                except sqlite3.IntegrityError as e:
+                    conn.execute('ROLLBACK')
+                    raise ValueError(f"No se pueden agrupar los archivos: {os.path.basename(ruta)} repite id de "
+                                     f"líneas de otro archivo ({e})")
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+            finally:
+                conn.execute('DETACH DATABASE origen')
+    except BaseException:
+        conn.close()
+        os.remove(parcial)
+        raise
+    conn.close()
+    os.replace(parcial, destino)
+    for _, ruta in juntar:
+        _borrar_si_se_puede(ruta)
+    return destino
+
+def _borrar_si_se_puede(ruta):
+    # En Windows no se puede borrar un archivo que otra aplicación tiene adjunto; como
+    # ya está dentro del agrupado, listar_archivos lo ignora y se borra la próxima vez.
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+# --- Vista unificada (base + archivos) ---
+
+def _esquema(periodo):
+    return f"archivo_{periodo.replace('-', '_')}"
+
+def _columnas_faltantes(conn, esquema):
+    columnas = {fila[1] for fila in conn.execute(f'PRAGMA {esquema}.table_info(importaciones)')}
+    return [c for c in COLUMNAS_TEXTO if c not in columnas]
+
+def _columnas_de(conn, esquema):
+    # COLUMNAS, con NULL en lugar de las que un archivo anterior no tiene.
+    faltantes = _columnas_faltantes(conn, esquema)
+    return ", ".join(f"NULL AS {c}" if c in faltantes else c for c in COLUMNAS.split(", "))
+
+def _abridor(archivos):
+    def abrir(ruta):
+        conn = datos.conectar(ruta, uri=True)
+        try:
+            for periodo, archivo in archivos:
+                conn.execute(f'ATTACH DATABASE ? AS {_esquema(periodo)}',
+                             ("file:" + pathname2url(os.path.abspath(archivo)) + "?mode=ro",))
+        except sqlite3.OperationalError as e:
+            conn.close()
+            if len(archivos) > MAX_ADJUNTOS:
+                raise ValueError(f"Hay {len(archivos)} archivos de importaciones y SQLite adjunta como mucho "
+                                 f"{MAX_ADJUNTOS}: agrúpalos con `python cli.py mantenimiento --agrupar-archivos`")
+            raise ValueError(f"No se pudieron adjuntar los {len(archivos)} archivos de importaciones: {e}")
+        partes = [f"SELECT {COLUMNAS} FROM main.importaciones"]
+        partes += [f"SELECT {_columnas_de(conn, _esquema(periodo))} FROM {_esquema(periodo)}.importaciones"
+                   for periodo, _ in archivos]
+        conn.execute(f'CREATE TEMP VIEW importaciones_todas AS {" UNION ALL ".join(partes)}')
+        # Misma forma que importaciones_detalle.
+        conn.execute('''
+            CREATE TEMP VIEW importaciones_detalle_todas AS
+            SELECT i.id AS id, i.importacion_no AS importacion_no,
+                   coalesce(i.sku_linea, p.sku, '') AS sku, coalesce(i.marca_linea, p.marca, '') AS marca,
+                   coalesce(i.producto_linea, p.producto, '') AS producto,
+                   i.codebar AS codebar, i.lote AS lote,
+                   coalesce(strftime('%d/%m/%Y', i.fecha_expira), '') AS fecha_expira,
+                   i.cant_recibida AS cant_recibida, i.cant_rechazada AS cant_rechazada,
+                   i.cant_aceptada AS cant_aceptada, i.observaciones AS observaciones,
+                   i.fecha_expira AS fecha_expira_iso
+            FROM importaciones_todas i LEFT JOIN main.productos p ON p.codebar = i.codebar
+        ''')
+        return conn
+    return abrir
+
+def conexion_unificada():
+    # Conexión por hilo con los archivos adjuntos en solo lectura y las vistas
+    # temporales importaciones_todas e importaciones_detalle_todas. Si aparece un
+    # archivo nuevo se abre otra conexión con él.
+    archivos = tuple(listar_archivos())
+    return datos.obtener_conexion(("archivo",) + archivos, _abridor(archivos))
+
+class FuenteConArchivo:
+    # Las funciones de lectura de datos que usan ModeloImportaciones y
+    # BuscadorImportaciones, sobre la base más los archivos. Con `busqueda` se
+    # consulta el índice de texto de cada uno (el de un archivo se arma al archivar).
+    def _esquemas(self):
+        return ["main"] + [_esquema(periodo) for periodo, _ in listar_archivos()]
+
+    def _coincidentes(self, busqueda, despues_de_rowid):
+        esquemas = self._esquemas()
+        sql = " UNION ALL ".join(
+            f"SELECT rowid FROM {e}.importaciones_fts WHERE importaciones_fts MATCH ? AND rowid > ?" for e in esquemas)
+        return sql, (busqueda, despues_de_rowid) * len(esquemas)
+
+    def contar_importaciones(self, despues_de_rowid=0, busqueda=None):
+        conn = conexion_unificada()
+        if busqueda:
+            sql, params = self._coincidentes(busqueda, despues_de_rowid)
+            return conn.execute(f'SELECT count(*) FROM ({sql})', params).fetchone()[0]
+        return conn.execute('SELECT count(*) FROM importaciones_todas WHERE id > ?', (despues_de_rowid,)).fetchone()[0]
+
+    def max_rowid_importaciones(self):
+        return conexion_unificada().execute('SELECT coalesce(max(id), 0) FROM importaciones_todas').fetchone()[0]
+
+    def buscar_importaciones_pagina(self, despues_de_rowid, limite, busqueda=None):
+        conn = conexion_unificada()
+        if busqueda:
+            sql, params = self._coincidentes(busqueda, despues_de_rowid)
+            return conn.execute(
+                f'SELECT {datos.COLUMNAS_IMPORTACION} FROM importaciones_detalle_todas '
+                f'WHERE id IN (SELECT rowid FROM ({sql}) ORDER BY rowid LIMIT ?) ORDER BY id', (*params, limite)
+            ).fetchall()
+        return conn.execute(
+            f'SELECT {datos.COLUMNAS_IMPORTACION} FROM importaciones_detalle_todas WHERE id > ? ORDER BY id LIMIT ?',
+            (despues_de_rowid, limite)
+        ).fetchall()
+
+    def rowid_importacion_en_posicion(self, despues_de_rowid, desplazamiento, busqueda=None):
+        conn = conexion_unificada()
+        if busqueda:
+            sql, params = self._coincidentes(busqueda, despues_de_rowid)
+            row = conn.execute(f'SELECT rowid FROM ({sql}) ORDER BY rowid LIMIT 1 OFFSET ?', (*params, desplazamiento)).fetchone()
+        else:
+            row = conn.execute('SELECT id FROM importaciones_todas WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?',
+                               (despues_de_rowid, desplazamiento)).fetchone()
+        return row[0] if row else None
+
+    def buscar_importacion_por_rowid(self, rowid, busqueda=None):
+        conn = conexion_unificada()
+        if busqueda:
+            sql, params = self._coincidentes(busqueda, rowid - 1)
+            return conn.execute(
+                f'SELECT {datos.COLUMNAS_IMPORTACION} FROM importaciones_detalle_todas '
+                f'WHERE id = ? AND id IN (SELECT rowid FROM ({sql}))', (rowid, *params)
+            ).fetchone()
+        return conn.execute(f'SELECT {datos.COLUMNAS_IMPORTACION} FROM importaciones_detalle_todas WHERE id = ?',
+                            (rowid,)).fetchone()
+
+    def archivada(self, rowid):
+        # Las líneas archivadas son de solo lectura.
+        return datos.obtener_conexion().execute('SELECT 1 FROM importaciones WHERE id = ?', (rowid,)).fetchone() is None
+
+@medido
+def reconstruir_stock():
+    # Para bases que se editaron por fuera de la aplicación (sin los disparadores): el
+    # resumen se recalcula con las líneas de la base y las archivadas. Antes se agrupan
+    # los archivos que no entrarían en la vista unificada.
+    agrupar_archivos()
+    conn = conexion_unificada()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM main.stock')
+        conn.execute(LLENAR_STOCK.format(origen="importaciones_todas"))
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return datos.contar_stock()
+
+# --- Respaldos ---
+
+def _copiar_base(origen, destino):
+    # La API de respaldo en un solo paso copia una instantánea coherente. Con WAL la
+    # lectura no bloquea a quien escribe mientras dura la copia (y la copia no se
+    # reinicia por esas escrituras, como pasaría copiando por partes).
+    fuente = sqlite3.connect(origen, timeout=5)
+    copia = sqlite3.connect(destino)
+    try:
+        fuente.backup(copia)
+    finally:
+        copia.close()
+        fuente.close()
+
+def _base_del_respaldo(carpeta):
+    bases = [n for n in os.listdir(carpeta) if n.endswith(".db")]
+    if len(bases) != 1:
+        raise ValueError(f"{carpeta} no es un respaldo: debe contener una base .db y la carpeta {CARPETA_ARCHIVO}/")
+    return os.path.join(carpeta, bases[0])
+
+@medido
+def respaldar(destino=None, progreso=None):
+    # Carpeta con la base y los archivos; se crea con otro nombre y se renombra al
+    # terminar, así que una carpeta de respaldo nunca queda a medias.
+    with _lock:
+        return _respaldar(destino, progreso)
+
+def _respaldar(destino, progreso):
+    if not destino:
+        # Dos respaldos en el mismo segundo (p. ej. restaurar justo después de
+        # respaldar) no deben chocar.
+        base = os.path.join(carpeta_junto_a_base(CARPETA_RESPALDOS), datetime.now().strftime("%Y%m%d-%H%M%S"))
+        destino, n = base, 1
+        while os.path.exists(destino):
+            n += 1
+            destino = f"{base}-{n}"
+    if os.path.exists(destino):
+        raise ValueError(f"Ya existe {destino}")
+    archivos = listar_archivos()
+    temporal = destino + ".parcial"
+    shutil.rmtree(temporal, ignore_errors=True)
+    os.makedirs(os.path.join(temporal, CARPETA_ARCHIVO))
+    try:
+        _copiar_base(datos.DB_NAME, os.path.join(temporal, os.path.basename(datos.DB_NAME)))
+        if progreso:
+            progreso(1, len(archivos) + 1)
+        for i, (_, ruta) in enumerate(archivos, 2):
+            _copiar_base(ruta, os.path.join(temporal, CARPETA_ARCHIVO, os.path.basename(ruta)))
+            if progreso:
+                progreso(i, len(archivos) + 1)
+        os.replace(temporal, destino)
+    except BaseException:
+        shutil.rmtree(temporal, ignore_errors=True)
+        raise
+    return destino
+
+def verificar_respaldo(carpeta):
+    # Lista de (archivo, resultado de integrity_check) de cada base del respaldo.
+    rutas = [_base_del_respaldo(carpeta)] + [ruta for _, ruta in listar_archivos(os.path.join(carpeta, CARPETA_ARCHIVO))]
+    resultados = []
+    for ruta in rutas:
+        conn = sqlite3.connect("file:" + pathname2url(os.path.abspath(ruta)) + "?mode=ro", uri=True)
+        try:
+            resultados.append((ruta, "; ".join(r[0] for r in conn.execute('PRAGMA integrity_check'))))
+        finally:
+            conn.close()
+    return resultados
+
+@medido
+def restaurar(carpeta):
+    # Vuelve la base y los archivos al estado del respaldo. Antes se respalda el estado
+    # actual (devuelve esa carpeta), por si hay que deshacer la restauración. La base se
+    # sobrescribe con la API de respaldo, que respeta los bloqueos de SQLite; las
+    # aplicaciones abiertas deben reiniciarse para no usar datos en memoria viejos.
+    for ruta, resultado in verificar_respaldo(carpeta):
+        if resultado != "ok":
+            raise ValueError(f"El respaldo está dañado ({os.path.basename(ruta)}: {resultado})")
+    with _lock:
+        anterior = _respaldar(None, None)
+        datos.cerrar_conexiones()
+        _copiar_base(_base_del_respaldo(carpeta), datos.DB_NAME)
+        del_respaldo = {periodo: ruta for periodo, ruta in listar_archivos(os.path.join(carpeta, CARPETA_ARCHIVO))}
+        for periodo, ruta in _todos_los_archivos(carpeta_junto_a_base(CARPETA_ARCHIVO)):
+            if periodo not in del_respaldo:
+                # Creado después del respaldo; queda guardado en `anterior`.
+                os.remove(ruta)
+        if del_respaldo:
+            os.makedirs(carpeta_junto_a_base(CARPETA_ARCHIVO), exist_ok=True)
+        for periodo, ruta in del_respaldo.items():
+            _copiar_base(ruta, ruta_archivo(periodo))
+        # Un respaldo de una versión anterior puede traer más archivos de los que se
+        # pueden adjuntar.
+        _agrupar(MAX_ADJUNTOS)
+    datos.init_db()
+    return anterior
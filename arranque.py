@@ -0,0 +1,36 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Módulos que se importan recién al usar la cámara o Excel.
+MODULOS_DIFERIDOS = ("cv2", "pyzbar.pyzbar", "openpyxl", "PIL.ImageTk")
+PRECALENTAR = os.environ.get("INVENTARIO_PRECALENTAR", "1") != "0"
+
+tiempos_precarga = {}
+
+def precalentar(modulos=MODULOS_DIFERIDOS):
+    for nombre in modulos:
+        if nombre in sys.modules:
+            continue
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(nombre)
+        except ImportError:
+            # Si falta una dependencia el error se mostrará al usarla, no aquí.
+            continue
+        tiempos_precarga[nombre] = time.perf_counter() - inicio
+
+def precalentar_en_segundo_plano():
+    if PRECALENTAR:
+        threading.Thread(target=precalentar, daemon=True).start()
+
+def informar_primera_ventana(ventana):
+    # Con INVENTARIO_MEDIR_ARRANQUE=1 la ventana se dibuja, se avisa por stdout y
+    # la aplicación se cierra; benchmarks/bench_arranque.py mide el tiempo hasta ese aviso.
+    if not os.environ.get("INVENTARIO_MEDIR_ARRANQUE"):
+        return
+    ventana.update()
+    print("PRIMERA_VENTANA", flush=True)
+    ventana.after_idle(ventana.destroy)
@@ -0,0 +1,110 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import archivo
+import datos
+import generador
+
+class Escaner(threading.Thread):
+    # Una estación que guarda una línea cada `intervalo` segundos y anota cuánto
+    # tardó cada guardado, para ver si archivar o respaldar la frenan.
+    def __init__(self, codebars, intervalo):
+        super().__init__(daemon=True)
+        self.codebars = codebars
+        self.intervalo = intervalo
+        self.tiempos = []
+        self.detener = threading.Event()
+
+    def run(self):
+        i = 0
+        while not self.detener.is_set():
+            inicio = time.perf_counter()
+            datos.agregar_importacion("IMP-ESCANEO", "", "", "", self.codebars[i % len(self.codebars)], "L1", "",
+                                      1, 0, 1, "")
+            self.tiempos.append(time.perf_counter() - inicio)
+            i += 1
+            time.sleep(self.intervalo)
+        datos.cerrar_conexion_hilo()
+
+    def tomar(self):
+        tiempos, self.tiempos = sorted(self.tiempos), []
+        if not tiempos:
+            return "sin guardados"
+        p = lambda q: tiempos[min(len(tiempos) - 1, int(len(tiempos) * q))] * 1000
+        return f"{len(tiempos)} guardados, p50 {p(0.5):.1f} ms, p99 {p(0.99):.1f} ms, máx {tiempos[-1] * 1000:.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivado y respaldo en línea mientras una estación sigue guardando líneas.")
+    parser.add_argument("--lineas", type=int, default=300000)
+    parser.add_argument("--productos", type=int, default=20000)
+    parser.add_argument("--intervalo", type=float, default=0.01, help="segundos entre guardados de la estación")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "productos.db")
+        datos.init_db()
+        codebars = generador.poblar(args.productos, args.lineas)
+        # El 80 % de las importaciones pasa a tener su última actividad en 2024 o 2025.
+        conn = datos.obtener_conexion()
+        numeros = [n for n, in conn.execute('SELECT importacion_no FROM importaciones_actividad ORDER BY 1')]
+        corte = numeros[int(len(numeros) * 0.8)]
+        conn.execute('''
+            UPDATE importaciones_actividad SET ultima_actividad = CASE WHEN importacion_no < ? THEN '2024-06-30' ELSE '2025-06-30' END
+            WHERE importacion_no < ?
+        ''', (numeros[int(len(numeros) * 0.5)], corte))
+        antes = conn.execute('SELECT count(*) FROM importaciones').fetchone()[0]
+
+        escaner = Escaner(codebars, args.intervalo)
+        escaner.start()
+        correcto = True
+        time.sleep(1)
+        print(f"Sin tareas:  {escaner.tomar()}")
+
+        inicio = time.perf_counter()
+        archivadas = archivo.archivar(date(2026, 1, 1))
+        duracion = time.perf_counter() - inicio
+        print(f"Archivando:  {escaner.tomar()}")
+        print(f"  {sum(archivadas.values()):,} líneas en {duracion:.2f} s ({sum(archivadas.values()) / duracion:,.0f} líneas/s): {archivadas}")
+
+        inicio = time.perf_counter()
+        respaldo = archivo.respaldar()
+        duracion = time.perf_counter() - inicio
+        print(f"Respaldando: {escaner.tomar()}")
+        print(f"  {respaldo} en {duracion:.2f} s")
+        escaner.detener.set()
+        escaner.join()
+
+        escaneadas = conn.execute("SELECT count(*) FROM importaciones WHERE importacion_no = 'IMP-ESCANEO'").fetchone()[0]
+        unificadas = archivo.FuenteConArchivo().contar_importaciones()
+        print(f"Líneas: {antes:,} iniciales + {escaneadas:,} escaneadas; vista unificada: {unificadas:,}")
+        if unificadas != antes + escaneadas:
+            print("  ERROR: la vista unificada no suma lo mismo")
+            correcto = False
+        # Archivar no es dar de baja: el resumen de stock sigue sumando lo archivado.
+        en_stock = conn.execute('SELECT total(cant_recibida), sum(lineas) FROM stock').fetchone()
+        recibido = archivo.conexion_unificada().execute('SELECT total(cant_recibida), count(*) FROM importaciones_todas').fetchone()
+        print(f"Stock: {en_stock[0]:,.0f} unidades en {en_stock[1]:,} líneas; base + archivo: {recibido[0]:,.0f} en {recibido[1]:,}")
+        if tuple(en_stock) != tuple(recibido):
+            print("  ERROR: el resumen de stock no coincide con las líneas de la base y el archivo")
+            correcto = False
+        if archivo.reconstruir_stock() != conn.execute('SELECT count(*) FROM stock').fetchone()[0] or \
+                tuple(conn.execute('SELECT total(cant_recibida), sum(lineas) FROM stock').fetchone()) != tuple(recibido):
+            print("  ERROR: reconstruir el stock no da lo mismo que los disparadores")
+            correcto = False
+        for ruta, resultado in archivo.verificar_respaldo(respaldo):
+            if resultado != "ok":
+                print(f"  ERROR: {ruta}: {resultado}")
+                correcto = False
+        datos.cerrar_conexiones()
+    print("OK" if correcto else "FALLÓ")
+    return 0 if correcto else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(RAIZ, "inventario_tkintercustom.py")
+PESADOS = ("cv2", "pyzbar", "openpyxl")
+# Segundos hasta la primera ventana (mediana) y de importar el módulo principal.
+PRESUPUESTO = 2.0
+PRESUPUESTO_IMPORTACION = 1.0
+
+def entorno(**extra):
+    env = dict(os.environ, INVENTARIO_PRECALENTAR="0")
+    env.update(extra)
+    return env
+
+def tiempos_importacion():
+    # -X importtime informa cada importación; nos quedamos con las de primer nivel.
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import inventario_tkintercustom"],
+                          cwd=RAIZ, env=entorno(), capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    modulos = []
+    for linea in proc.stderr.splitlines():
+        if not linea.startswith("import time:"):
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        # Las importaciones anidadas vienen con más sangría que las de primer nivel.
+        if acumulado.strip().isdigit() and not nombre.startswith("  "):
+            modulos.append((int(acumulado) / 1e6, nombre.strip()))
+    return sorted(modulos, reverse=True)
+
+def tiempo_importacion(modulo="inventario_tkintercustom"):
+    return dict((nombre, segundos) for segundos, nombre in tiempos_importacion())[modulo]
+
+def pesados_cargados():
+    codigo = f"import sys, inventario_tkintercustom; print(' '.join(m for m in {PESADOS!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", codigo], cwd=RAIZ, env=entorno(), capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    return proc.stdout.split()
+
+def tiempo_primera_ventana(directorio):
+    inicio = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, APP], cwd=directorio, env=entorno(INVENTARIO_MEDIR_ARRANQUE="1"),
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for linea in proc.stdout:
+        if linea.strip() == "PRIMERA_VENTANA":
+            duracion = time.perf_counter() - inicio
+            proc.wait()
+            return duracion
+    proc.wait()
+    raise RuntimeError(proc.stderr.read().strip().splitlines()[-1] if proc.returncode else "la ventana no se mostró")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tiempo de arranque: importación por módulo y tiempo hasta la primera ventana. "
+                    "Sale con código 1 si se supera el presupuesto o si se cargan módulos pesados al iniciar."
+    )
+    parser.add_argument("--presupuesto", type=float, default=PRESUPUESTO, help="segundos hasta la primera ventana (mediana)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--modulos", type=int, default=15, help="cuántos módulos mostrar")
+    args = parser.parse_args()
+
+    print("Importación de inventario_tkintercustom (acumulado por módulo de primer nivel):")
+    for segundos, nombre in tiempos_importacion()[:args.modulos]:
+        print(f"  {segundos * 1000:9.1f} ms  {nombre}")
+
+    fallas = []
+    cargados = pesados_cargados()
+    if cargados:
+        fallas.append(f"se importan al iniciar: {', '.join(cargados)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tiempos = [tiempo_primera_ventana(tmp) for _ in range(args.repeticiones)]
+    mediana = statistics.median(tiempos)
+    print(f"Primera ventana: mediana {mediana:.2f} s, primera ejecución {tiempos[0]:.2f} s, "
+          f"mínimo {min(tiempos):.2f} s (presupuesto {args.presupuesto:.2f} s)")
+    if mediana > args.presupuesto:
+        fallas.append(f"arranque de {mediana:.2f} s supera el presupuesto de {args.presupuesto:.2f} s")
+
+    for falla in fallas:
+        print(f"FALLA: {falla}")
+    return 1 if fallas else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
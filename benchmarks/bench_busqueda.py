@@ -0,0 +1,70 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+
+def poblar_productos(n, semilla=1):
+    rnd = random.Random(semilla)
+    codigos = [f"{rnd.randrange(10**12, 10**13)}" for _ in range(n)]
+    with datos.transaccion() as conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO productos VALUES (?,?,?,?)',
+            ((c, f"SKU{i}", f"Marca{i % 50}", f"Producto {i}") for i, c in enumerate(codigos))
+        )
+    return codigos
+
+def buscar_sin_cache(codebar):
+    return datos.obtener_conexion().execute(
+        'SELECT sku, marca, producto, codebar FROM productos WHERE codebar=?', (codebar,)
+    ).fetchone()
+
+def buscar_sin_pool(codebar):
+    # Comportamiento anterior: una conexión nueva por consulta.
+    conn = sqlite3.connect(datos.DB_NAME)
+    c = conn.cursor()
+    c.execute('SELECT sku, marca, producto, codebar FROM productos WHERE codebar=?', (codebar,))
+    result = c.fetchone()
+    conn.close()
+    return result
+
+def medir(funcion, codigos):
+    inicio = time.perf_counter()
+    for codebar in codigos:
+        funcion(codebar)
+    return len(codigos) / (time.perf_counter() - inicio)
+
+def main():
+    parser = argparse.ArgumentParser(description="Búsquedas por CodeBar por segundo: conexión por consulta, conexión persistente y caché en memoria.")
+    parser.add_argument("--productos", type=int, default=10000)
+    parser.add_argument("--busquedas", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "bench.db")
+        datos.init_db()
+        codigos = poblar_productos(args.productos)
+        rnd = random.Random(2)
+        muestra = [rnd.choice(codigos) for _ in range(args.busquedas)]
+
+        antes = medir(buscar_sin_pool, muestra)
+        despues = medir(buscar_sin_cache, muestra)
+        inicio = time.perf_counter()
+        datos.cache_productos.precargar()
+        precarga = time.perf_counter() - inicio
+        con_cache = medir(datos.buscar_producto_por_codebar, muestra)
+        datos.cerrar_conexiones()
+
+    print(f"Conexión por consulta: {antes:12.0f} búsquedas/s")
+    print(f"Conexión persistente:  {despues:12.0f} búsquedas/s  (x{despues / antes:.1f})")
+    print(f"Caché en memoria:      {con_cache:12.0f} búsquedas/s  (x{con_cache / antes:.1f}, "
+          f"{1e9 / con_cache:.0f} ns/búsqueda, precarga {precarga * 1000:.1f} ms)")
+
+if __name__ == '__main__':
+    main()
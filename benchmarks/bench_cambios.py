@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cambios
+import datos
+import generador
+
+COLUMNAS_IMPORTACION = ("importacion_no", "codebar", "lote", "fecha_expira", "cant_recibida", "cant_rechazada",
+                        "cant_aceptada", "observaciones")
+
+def aplicar(replica, ruta):
+    # Lo que haría el otro sistema con el archivo: altas y cambios se escriben, bajas se borran.
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            fila = json.loads(linea)
+            if fila["tabla"] == "productos":
+                clave, valores = fila["codebar"], (fila["sku"], fila["marca"], fila["producto"])
+            else:
+                clave, valores = fila["id"], tuple(fila[c] for c in COLUMNAS_IMPORTACION)
+            if fila["operacion"] == "D":
+                replica[fila["tabla"]].pop(clave, None)
+            else:
+                replica[fila["tabla"]][clave] = valores
+
+def estado_actual():
+    conn = datos.obtener_conexion()
+    return {
+        "productos": {c: (s, m, p) for c, s, m, p in conn.execute('SELECT codebar, sku, marca, producto FROM productos')},
+        "importaciones": {fila[0]: fila[1:] for fila in conn.execute(
+            'SELECT id, importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones FROM importaciones')},
+    }
+
+def cambiar(rnd, codebars, n):
+    # Mezcla de lo que pasa en un día: líneas nuevas, corregidas y borradas, productos
+    # nuevos y renombrados, y un catálogo reimportado sin cambios (no debe anotarse).
+    conn = datos.obtener_conexion()
+    max_id = datos.max_rowid_importaciones()
+    for i in range(n):
+        caso = rnd.random()
+        codebar = rnd.choice(codebars)
+        if caso < 0.4:
+            datos.agregar_importacion("IMP-DIA", "", "", "", codebar, f"L{i}", "31/12/2027", 10, 1, 9, "nueva")
+        elif caso < 0.75:
+            rowid = rnd.randint(1, max_id)
+            if conn.execute('SELECT 1 FROM importaciones WHERE id = ?', (rowid,)).fetchone():
+                if caso < 0.6:
+                    datos.actualizar_importacion(rowid, "IMP-CORR", "", "", "", codebar, "LC", "", 5, 0, 5, "corregida")
+                else:
+                    datos.eliminar_importacion_por_rowid(rowid)
+        elif caso < 0.85:
+            datos.agregar_producto(f"N{i:012d}", f"SKU-N{i}", "Nueva", f"Producto nuevo {i}")
+        elif caso < 0.95:
+            fila = datos.buscar_producto_por_codebar(codebar)
+            datos.editar_producto(codebar, fila[0], fila[1], f"{fila[2]} v{i}")
+        else:
+            fila = datos.buscar_producto_por_codebar(codebar)
+            datos.editar_producto(codebar, fila[0], fila[1], fila[2])
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportación de cambios: el costo depende de lo cambiado y no del tamaño de la tabla.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=[10000, 300000], help="líneas de importación")
+    parser.add_argument("--productos", type=int, default=20000)
+    parser.add_argument("--cambios", type=int, default=2000, help="cambios entre exportaciones")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    correcto = True
+    for lineas in args.escalas:
+        with tempfile.TemporaryDirectory() as tmp:
+            datos.DB_NAME = os.path.join(tmp, "productos.db")
+            datos.init_db()
+            rnd = random.Random(args.semilla)
+            codebars = generador.poblar(args.productos, lineas, args.semilla)
+            replica = {"productos": {}, "importaciones": {}}
+            print(f"{lineas:,} líneas, {args.productos:,} productos")
+
+            inicio = time.perf_counter()
+            filas, _, hasta = cambios.exportar_cambios(os.path.join(tmp, "completa.jsonl"))
+            print(f"  completa:  {filas:,} filas en {time.perf_counter() - inicio:.2f} s")
+            aplicar(replica, os.path.join(tmp, "completa.jsonl"))
+
+            for ronda in range(1, 4):
+                cambiar(rnd, codebars, args.cambios)
+                inicio = time.perf_counter()
+                ruta = os.path.join(tmp, f"cambios{ronda}.jsonl")
+                filas, desde, hasta = cambios.exportar_cambios(ruta)
+                duracion = time.perf_counter() - inicio
+                diario = datos.obtener_conexion().execute('SELECT count(*) FROM cambios').fetchone()[0]
+                print(f"  ronda {ronda}:   {filas:,} cambios netos ({desde}..{hasta}) en {duracion * 1000:,.0f} ms; "
+                      f"diario tras compactar: {diario} entradas")
+                aplicar(replica, ruta)
+                if diario:
+                    print("  ERROR: el diario no quedó compactado")
+                    correcto = False
+
+            if replica != estado_actual():
+                print("  ERROR: la réplica armada con las exportaciones no coincide con la base")
+                correcto = False
+            datos.cerrar_conexiones()
+    print("OK" if correcto else "FALLÓ")
+    return 0 if correcto else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+import generador
+from conciliacion import COINCIDE, FALTANTE, SOBRANTE, INESPERADO, cruzar, leer_manifiesto, recibido_de_importacion, ResultadoConciliacion
+from exportador import crear_escritor
+from importador import abrir_lector
+
+IMPORTACION = "IMP-CONCILIAR"
+
+def preparar(lineas, productos, semilla):
+    # Una importación con `lineas` claves (codebar, lote) escaneadas y un manifiesto
+    # que las difiere a propósito: de cada 10 claves, 1 falta, 1 sobra, 1 llegó sin
+    # estar en el manifiesto, 1 no llegó y el resto coincide.
+    rnd = random.Random(semilla)
+    codebars = generador.poblar(productos, 0, semilla)
+    esperados = {COINCIDE: 0, FALTANTE: 0, SOBRANTE: 0, INESPERADO: 0}
+    escaneadas, manifiesto = [], []
+    for i in range(lineas):
+        codebar, lote, cantidad = rnd.choice(codebars), f"L{i:07d}", rnd.randrange(2, 120)
+        caso = i % 10
+        if caso == 0:
+            manifiesto.append((codebar, lote, cantidad))
+            escaneadas.append((codebar, lote, cantidad - 1))
+            esperados[FALTANTE] += 1
+        elif caso == 1:
+            manifiesto.append((codebar, lote, cantidad))
+            escaneadas.append((codebar, lote, cantidad + 1))
+            esperados[SOBRANTE] += 1
+        elif caso == 2:
+            escaneadas.append((codebar, lote, cantidad))
+            esperados[INESPERADO] += 1
+        elif caso == 3:
+            manifiesto.append((codebar, lote, cantidad))
+            esperados[FALTANTE] += 1
+        else:
+            # El proveedor reparte el lote en dos filas (dos tarimas).
+            manifiesto.append((codebar, lote, cantidad // 2))
+            manifiesto.append((codebar, lote, cantidad - cantidad // 2))
+            escaneadas.append((codebar, lote, cantidad))
+            esperados[COINCIDE] += 1
+    with datos.transaccion() as conn:
+        conn.executemany('''
+            INSERT INTO importaciones (importacion_no, codebar, lote, cant_recibida, cant_rechazada, cant_aceptada, observaciones)
+            VALUES (?, ?, ?, ?, 0, ?, '')
+        ''', ((IMPORTACION, c, l, q, q) for c, l, q in escaneadas))
+    return manifiesto, esperados
+
+def escribir_manifiesto(ruta, manifiesto):
+    escritor = crear_escritor(ruta, "Manifiesto")
+    escritor.escribir(("codebar", "lote", "cantidad", "descripcion"))
+    for codebar, lote, cantidad in manifiesto:
+        escritor.escribir((codebar, lote, cantidad, "caja x12"))
+    escritor.cerrar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de conciliación de un manifiesto grande contra una importación escaneada.")
+    parser.add_argument("--lineas", type=int, default=60000, help="claves (codebar, lote); el manifiesto tiene ~1.7 filas por clave")
+    parser.add_argument("--productos", type=int, default=20000)
+    parser.add_argument("--excel", action="store_true", help="además, el mismo manifiesto en .xlsx")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "conciliacion.db")
+        datos.init_db()
+        manifiesto, esperados = preparar(args.lineas, args.productos, args.semilla)
+        formatos = (".csv", ".xlsx") if args.excel else (".csv",)
+        correcto = True
+        for extension in formatos:
+            ruta = os.path.join(tmp, "manifiesto" + extension)
+            escribir_manifiesto(ruta, manifiesto)
+            inicio = time.perf_counter()
+            with abrir_lector(ruta) as lector:
+                esperado, filas, _ = leer_manifiesto(lector)
+            leido = time.perf_counter()
+            recibido = recibido_de_importacion(IMPORTACION)
+            consultado = time.perf_counter()
+            resultado = cruzar(esperado, recibido, ResultadoConciliacion(IMPORTACION))
+            fin = time.perf_counter()
+            print(f"{extension}: {filas:,} filas de manifiesto, {len(recibido):,} claves escaneadas")
+            print(f"  lectura {(leido - inicio) * 1000:,.0f} ms  consulta {(consultado - leido) * 1000:,.0f} ms  "
+                  f"cruce {(fin - consultado) * 1000:,.0f} ms  total {(fin - inicio) * 1000:,.0f} ms")
+            print("  " + "  ".join(f"{estado}: {resultado.conteos[estado]}" for estado in esperados))
+            if resultado.conteos != esperados:
+                print(f"  ERROR: se esperaba {esperados}")
+                correcto = False
+        datos.cerrar_conexiones()
+    print("OK" if correcto else "FALLÓ")
+    return 0 if correcto else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generador
+from escaner import CapturaEscaner, DetectorEscaner
+
+def flujo(lecturas, cada, semilla):
+    # Teclas sintéticas (caracter, instante en s): una lectura EAN-13 + Enter cada
+    # `cada` segundos a 3-15 ms por tecla y, en cada intervalo entre lecturas, una
+    # cantidad escrita a mano a 120-250 ms por tecla (las cifras que quepan). La
+    # primera puede caer a pocos ms del Enter anterior y la última a 35 ms de la
+    # lectura siguiente, dentro de INTERVALO_MAX.
+    rnd = random.Random(semilla)
+    codigos = generador.codigos(lecturas, semilla)
+    teclas, escrito = [], []
+    for i, codigo in enumerate(codigos):
+        instante = i * cada
+        for caracter in codigo + "\n":
+            teclas.append((caracter, instante))
+            instante += rnd.uniform(0.003, 0.015)
+        siguiente = (i + 1) * cada
+        instante += rnd.uniform(0.005, 0.05)
+        for caracter in str(rnd.randrange(1, 99)):
+            if instante > siguiente - 0.035:
+                break
+            teclas.append((caracter, instante))
+            escrito.append(caracter)
+            instante += rnd.uniform(0.12, 0.25)
+    return codigos, teclas, escrito
+
+def probar_detector(codigos, teclas, escrito):
+    detector = DetectorEscaner()
+    texto = []
+    inicio = time.perf_counter()
+    for caracter, instante in teclas:
+        humano, _ = detector.tecla(caracter, instante)
+        texto.append(humano)
+    texto.append(detector.cerrar())
+    duracion = time.perf_counter() - inicio
+    leidas = list(detector.lecturas)
+    print(f"detector: {len(teclas)} teclas en {duracion * 1000:.1f} ms ({duracion / len(teclas) * 1e6:.1f} µs/tecla)")
+    return leidas == codigos and "".join(texto) == "".join(escrito)
+
+def leer_en_ventana(root, teclas, esperadas):
+    # Eventos de teclado reales (event_generate con la hora de cada tecla) sobre un
+    # Entry, como los recibe InventarioApp. Devuelve (lecturas, texto del campo).
+    import tkinter as tk
+    campo = tk.Entry(root)
+    campo.pack()
+    root.update()
+    campo.focus_force()
+    leidas = []
+    captura = CapturaEscaner(root, leidas.append)
+    captura.activar()
+    base = 1_000_000
+    for caracter, instante in teclas:
+        keysym = "Return" if caracter == "\n" else caracter
+        campo.event_generate("<KeyPress>", keysym=keysym, time=base + int(instante * 1000), when="tail")
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < 5 and len(leidas) < esperadas:
+        root.update()
+    root.after(200, root.quit)
+    root.mainloop()
+    return leidas, campo.get()
+
+def probar_ventana(codigos, teclas, escrito):
+    # Necesita pantalla; en un servidor, xvfb-run. Sin ella devuelve None (omitida).
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"ventana: se omite ({e})")
+        return None
+    leidas, escrito_en_campo = leer_en_ventana(root, teclas, len(codigos))
+    root.destroy()
+    print(f"ventana: {len(leidas)}/{len(codigos)} lecturas, campo = {escrito_en_campo[:30]!r}")
+    return leidas == codigos and escrito_en_campo == "".join(escrito)
+
+def main():
+    parser = argparse.ArgumentParser(description="Modo lector: inyecta ráfagas de teclado sintéticas y verifica que no se pierda ninguna lectura.")
+    parser.add_argument("--lecturas", type=int, default=300)
+    parser.add_argument("--cada", type=float, default=0.2, help="segundos entre lecturas")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    correcto = True
+    for cada in (args.cada, 1.0):
+        codigos, teclas, escrito = flujo(args.lecturas, cada, args.semilla)
+        print(f"Una lectura cada {cada * 1000:.0f} ms, {len(escrito)} teclas escritas a mano:")
+        for prueba in (probar_detector, probar_ventana):
+            if prueba(codigos, teclas, escrito) is False:
+                print(f"  ERROR en {prueba.__name__}")
+                correcto = False
+    print("OK" if correcto else "FALLÓ")
+    return 0 if correcto else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+from busqueda import expresion_fts
+
+MARCAS = ("Nestlé", "Unilever", "Colgate", "Bimbo", "Kellogg", "Danone", "Pepsico", "Mars")
+PALABRAS = ("aceite", "oliva", "arroz", "leche", "galleta", "chocolate", "jabón", "cereal", "atún", "café",
+            "harina", "azúcar", "pasta", "salsa", "yogur", "queso")
+
+def poblar(n, productos=2000, semilla=7):
+    rnd = random.Random(semilla)
+    catalogo = [
+        (f"{7400000000000 + i}", f"SKU-{i:05d}", rnd.choice(MARCAS), " ".join(rnd.sample(PALABRAS, 3)))
+        for i in range(productos)
+    ]
+    with datos.transaccion() as conn:
+        conn.executemany('INSERT INTO productos VALUES (?,?,?,?)', catalogo)
+        conn.executemany('''
+            INSERT INTO importaciones (importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones)
+            VALUES (?, ?, ?, '2030-12-31', 12, 0, 12, ?)
+        ''', ((f"IMP{i // 500}", catalogo[rnd.randrange(productos)][0], f"L{rnd.randrange(5000)}",
+               "caja dañada" if rnd.random() < 0.01 else "") for i in range(n)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia del filtro de texto (conteo + primera página) sobre importaciones.")
+    parser.add_argument("--filas", type=int, default=1000000)
+    parser.add_argument("--consultas", nargs="+", default=["colgate", "aceite oliva", "L123", "dañada", "caf", "xyz"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "bench.db")
+        datos.init_db()
+        inicio = time.perf_counter()
+        poblar(args.filas)
+        print(f"{args.filas} filas cargadas (con índice FTS) en {time.perf_counter() - inicio:.1f} s")
+        print(f"{'consulta':>16} {'coincidencias':>14} {'conteo (ms)':>12} {'1a página (ms)':>15}")
+        for consulta in args.consultas:
+            expresion = expresion_fts(consulta)
+            inicio = time.perf_counter()
+            total = datos.contar_importaciones(busqueda=expresion)
+            conteo = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            datos.buscar_importaciones_pagina(0, 200, busqueda=expresion)
+            pagina = time.perf_counter() - inicio
+            print(f"{consulta:>16} {total:>14} {conteo * 1000:>12.1f} {pagina * 1000:>15.1f}")
+        datos.cerrar_conexiones()
+
+if __name__ == '__main__':
+    main()
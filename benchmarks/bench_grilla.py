@@ -0,0 +1,56 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+from tabla_virtual import ModeloImportaciones
+
+def fila(i):
+    return (f"IMP{i // 500}", f"SKU{i % 300}", "Marca", f"Producto {i % 300}", f"{7400000000000 + i % 300}",
+            f"L{i % 40}", "31/12/2030", 10, i % 3, 10 - i % 3, "")
+
+def poblar(n):
+    with datos.transaccion() as conn:
+        conn.executemany('INSERT OR IGNORE INTO productos VALUES (?,?,?,?)', ((f[4], f[1], f[2], f[3]) for f in map(fila, range(300))))
+        conn.executemany('''
+            INSERT INTO importaciones (importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones)
+            VALUES (?, ?, ?, '2030-12-31', ?, ?, ?, ?)
+        ''', ((f[0], f[4], f[5], f[7], f[8], f[9], f[10]) for f in map(fila, range(n))))
+
+def ms(funcion):
+    inicio = time.perf_counter()
+    funcion()
+    return (time.perf_counter() - inicio) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de apertura y desplazamiento de la grilla virtual de importaciones.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--visibles", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'filas':>10} {'apertura (ms)':>14} {'ir al medio (ms)':>17} {'ir al final (ms)':>17} {'página sig. (ms)':>17}")
+    for n in args.tamanos:
+        with tempfile.TemporaryDirectory() as tmp:
+            datos.DB_NAME = os.path.join(tmp, "bench.db")
+            datos.init_db()
+            poblar(n)
+            datos.cerrar_conexiones()
+
+            modelo = None
+            def abrir():
+                nonlocal modelo
+                modelo = ModeloImportaciones()
+                modelo.filas(0, args.visibles)
+            apertura = ms(abrir)
+            medio = ms(lambda: modelo.filas(n // 2, args.visibles))
+            final = ms(lambda: modelo.filas(n - args.visibles, args.visibles))
+            siguiente = ms(lambda: modelo.filas(n // 2 + modelo.tamano_pagina, args.visibles))
+            datos.cerrar_conexiones()
+        print(f"{n:>10} {apertura:>14.2f} {medio:>17.2f} {final:>17.2f} {siguiente:>17.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generador
+from lote_codigos import leer_lote
+
+def main():
+    parser = argparse.ArgumentParser(description="Imágenes/s de la decodificación por lote según la cantidad de procesos.")
+    parser.add_argument("--codigos", type=int, default=100, help="códigos del corpus (3 imágenes por código)")
+    parser.add_argument("--procesos", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--video", help="además, medir sobre este archivo de video")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = generador.corpus_codigos(tmp, n=args.codigos)
+        esperados = {codigo for imagenes in corpus.values() for _, codigo in imagenes}
+        print(f"{'procesos':>8} {'imágenes/s':>11} {'aceleración':>12} {'códigos leídos':>15}")
+        base = None
+        for procesos in args.procesos:
+            inicio = time.perf_counter()
+            resultado = leer_lote(tmp, procesos=procesos)
+            velocidad = resultado.procesados / (time.perf_counter() - inicio)
+            base = base or velocidad
+            leidos = len(esperados & set(resultado.conteos))
+            print(f"{procesos:>8} {velocidad:>11,.1f} {velocidad / base:>11.2f}x {leidos:>8}/{len(esperados)}")
+        if args.video:
+            for procesos in args.procesos:
+                inicio = time.perf_counter()
+                resultado = leer_lote(args.video, procesos=procesos)
+                velocidad = resultado.procesados / (time.perf_counter() - inicio)
+                print(f"video {procesos:>2} procesos: {velocidad:,.1f} cuadros/s, {len(resultado.conteos)} códigos distintos")
+
+if __name__ == '__main__':
+    main()
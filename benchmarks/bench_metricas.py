@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+import metricas
+
+def ns_por_llamada(funcion, n):
+    inicio = time.perf_counter()
+    for _ in range(n):
+        funcion("7400000000000")
+    return (time.perf_counter() - inicio) / n * 1e9
+
+def main():
+    parser = argparse.ArgumentParser(description="Costo de la instrumentación sobre la búsqueda de producto (la llamada más frecuente).")
+    parser.add_argument("--llamadas", type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "bench.db")
+        datos.init_db()
+        datos.agregar_producto("7400000000000", "SKU", "Marca", "Producto")
+        original = datos.buscar_producto_por_codebar.__wrapped__
+        sin_envoltura = ns_por_llamada(original, args.llamadas)
+        metricas.activar(False)
+        apagada = ns_por_llamada(datos.buscar_producto_por_codebar, args.llamadas)
+        metricas.activar(True)
+        encendida = ns_por_llamada(datos.buscar_producto_por_codebar, args.llamadas)
+        metricas.activar(False)
+        datos.cerrar_conexiones()
+
+    print(f"Sin instrumentar:   {sin_envoltura:8.0f} ns/llamada")
+    print(f"Medición apagada:   {apagada:8.0f} ns/llamada (+{apagada - sin_envoltura:.0f} ns)")
+    print(f"Medición encendida: {encendida:8.0f} ns/llamada (+{encendida - sin_envoltura:.0f} ns)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+from migraciones import migrar
+
+def crear_base_antigua(ruta, n, productos=5000):
+    # Esquema previo a las migraciones: texto duplicado y fecha dd/mm/aaaa, sin índices.
+    conn = sqlite3.connect(ruta)
+    conn.execute('CREATE TABLE productos (codebar TEXT PRIMARY KEY, sku TEXT, marca TEXT, producto TEXT)')
+    conn.execute('''
+        CREATE TABLE importaciones (
+            importacion_no TEXT, sku TEXT, marca TEXT, producto TEXT, codebar TEXT, lote TEXT, fecha_expira TEXT,
+            cant_recibida INTEGER, cant_rechazada INTEGER, cant_aceptada INTEGER, observaciones TEXT
+        )
+    ''')
+    conn.executemany('INSERT INTO productos VALUES (?,?,?,?)',
+                     ((f"{7400000000000 + i}", f"SKU{i}", f"Marca{i % 40}", f"Producto {i}") for i in range(productos)))
+    conn.executemany('INSERT INTO importaciones VALUES (?,?,?,?,?,?,?,?,?,?,?)', (
+        (f"IMP{i // 500}", f"SKU{i % productos}", f"Marca{i % productos % 40}", f"Producto {i % productos}",
+         f"{7400000000000 + i % productos}", f"L{i % 97}", f"{1 + i % 28:02d}/{1 + i % 12:02d}/{2025 + i % 8}",
+         12, i % 3, 12 - i % 3, "")
+        for i in range(n)
+    ))
+    conn.commit()
+    conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de migración de un productos.db antiguo al esquema actual.")
+    parser.add_argument("--filas", type=int, default=2000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "antigua.db")
+        crear_base_antigua(ruta, args.filas)
+        tamano_antes = os.path.getsize(ruta)
+        datos.DB_NAME = ruta
+        inicio = time.perf_counter()
+        aplicadas = migrar(datos.obtener_conexion())
+        duracion = time.perf_counter() - inicio
+        datos.obtener_conexion().execute('VACUUM')
+        datos.cerrar_conexiones()
+        tamano_despues = os.path.getsize(ruta)
+
+    print(f"Migraciones aplicadas: {aplicadas}")
+    print(f"{args.filas} filas en {duracion:.2f} s ({args.filas / duracion:,.0f} filas/s)")
+    print(f"Tamaño: {tamano_antes / 1e6:.1f} MB -> {tamano_despues / 1e6:.1f} MB (con índices)")
+
+if __name__ == '__main__':
+    main()
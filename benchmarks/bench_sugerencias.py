@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+import generador
+import sugerencias
+from sugerencias import EQUIVALENTE, NOMBRE, PARECIDO, PREFIJO, SIN_VERIFICADOR
+
+def con_error(rnd, palabra):
+    # Una letra cambiada, quitada o duplicada, lejos de los bordes.
+    i = rnd.randrange(1, len(palabra) - 1)
+    return rnd.choice((palabra[:i] + "x" + palabra[i + 1:], palabra[:i] + palabra[i + 1:], palabra[:i] + palabra[i] + palabra[i:]))
+
+def casos(rnd, catalogo, upc, n):
+    # (nombre del caso, texto escrito, motivo esperado, comprobación sobre el producto sugerido)
+    for _ in range(n):
+        codebar, _, _, producto = rnd.choice(catalogo)
+        i = rnd.randrange(len(codebar))
+        mal_leido = codebar[:i] + str((int(codebar[i]) + rnd.randrange(1, 10)) % 10) + codebar[i + 1:]
+        yield "dígito mal leído", mal_leido, PARECIDO, lambda fila, c=codebar: fila[3] == c
+        j = rnd.randrange(len(codebar) - 1)
+        if codebar[j] != codebar[j + 1]:
+            invertido = codebar[:j] + codebar[j + 1] + codebar[j] + codebar[j + 2:]
+            yield "dígitos invertidos", invertido, PARECIDO, lambda fila, c=codebar: fila[3] == c
+        yield "sin verificador", codebar[:-1], SIN_VERIFICADOR, lambda fila, c=codebar: fila[3] == c
+        yield "prefijo", codebar[:8], PREFIJO, lambda fila, p=codebar[:8]: fila[3].startswith(p)
+        ean = rnd.choice(upc)
+        yield "UPC-A contra EAN-13", ean[1:], EQUIVALENTE, lambda fila, c=ean: fila[3] == c
+        palabras = producto.split()
+        k = rnd.randrange(len(palabras))
+        if len(palabras[k]) >= 5:
+            palabras[k] = con_error(rnd, palabras[k])
+        escrito = " ".join(palabras).translate(str.maketrans("áéíóú", "aeiou"))
+        yield "nombre con error", escrito, NOMBRE, lambda fila, p=producto: fila[2] == p
+
+def main():
+    parser = argparse.ArgumentParser(description="Sugerencias de productos para CodeBars inexistentes en un catálogo grande.")
+    parser.add_argument("--productos", type=int, default=1000000)
+    parser.add_argument("--consultas", type=int, default=300, help="consultas por tipo de error")
+    parser.add_argument("--presupuesto", type=float, default=20.0, help="p99 máximo en ms")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "productos.db")
+        datos.init_db()
+        inicio = time.perf_counter()
+        generador.poblar(args.productos, 0, args.semilla)
+        # Productos UPC-A guardados como EAN-13 (con 0 adelante).
+        upc = [f"0{x:011d}" for x in random.Random(args.semilla).sample(range(10 ** 11), 1000)]
+        upc = [c + sugerencias.digito_verificador(c) for c in upc]
+        with datos.transaccion() as conn:
+            conn.executemany('INSERT INTO productos VALUES (?, ?, ?, ?)', ((c, f"UPC-{c}", "Importado", "producto importado") for c in upc))
+        datos.indexar_trigramas()
+        print(f"{args.productos:,} productos cargados (con índice de trigramas) en {time.perf_counter() - inicio:.1f} s")
+
+        conn = datos.obtener_conexion()
+        catalogo = conn.execute('SELECT codebar, sku, marca, producto FROM productos WHERE codebar LIKE ? ORDER BY random() LIMIT ?',
+                                ("740%", args.consultas)).fetchall()
+        rnd = random.Random(args.semilla)
+        tiempos, aciertos, totales = {}, {}, {}
+        for caso, texto, motivo, correcto in casos(rnd, catalogo, upc, args.consultas):
+            inicio = time.perf_counter()
+            resultado = datos.sugerir_productos(texto)
+            tiempos.setdefault(caso, []).append(time.perf_counter() - inicio)
+            totales[caso] = totales.get(caso, 0) + 1
+            if any(m == motivo and correcto(fila) for m, fila in resultado):
+                aciertos[caso] = aciertos.get(caso, 0) + 1
+
+        ok = True
+        for caso, lista in tiempos.items():
+            lista.sort()
+            p = lambda q: lista[min(len(lista) - 1, int(len(lista) * q))] * 1000
+            tasa = aciertos.get(caso, 0) / totales[caso]
+            print(f"  {caso:<20} encontrado {tasa:6.1%}  p50 {p(0.5):5.1f} ms  p99 {p(0.99):5.1f} ms  máx {lista[-1] * 1000:5.1f} ms")
+            if p(0.99) > args.presupuesto:
+                print(f"  ERROR: p99 por encima de {args.presupuesto} ms")
+                ok = False
+            if tasa < 0.95:
+                print("  ERROR: menos del 95 % de los productos buscados aparece en las sugerencias")
+                ok = False
+        datos.cerrar_conexiones()
+    print("OK" if ok else "FALLÓ")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
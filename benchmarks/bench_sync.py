@@ -0,0 +1,74 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+import generador
+from cliente_sync import ClienteSync
+from servidor_sync import ServidorSync
+
+def estacion(url, numero, lineas, codebars, pendientes, latencias, tmp):
+    # Una estación de recepción: busca el producto leído y agrega la línea, una por lectura.
+    cliente = ClienteSync(url, archivo_pendientes=os.path.join(tmp, f"pendientes_{numero}.jsonl"))
+    rnd = random.Random(numero)
+    propias = []
+    for i in range(lineas):
+        codebar = rnd.choice(codebars)
+        inicio = time.perf_counter()
+        sku, marca, producto, _ = cliente.buscar_producto_por_codebar(codebar)
+        cliente.agregar_importacion(f"IMP-{numero:03d}", sku, marca, producto, codebar, f"L{i % 50:03d}",
+                                    "31/12/2027", 12, 0, 12, "")
+        propias.append(time.perf_counter() - inicio)
+    latencias.extend(propias)
+    pendientes.append(cliente.pendientes)
+
+def main():
+    parser = argparse.ArgumentParser(description="Varias estaciones escaneando a la vez contra servidor_sync en localhost.")
+    parser.add_argument("--estaciones", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--lineas", type=int, default=500, help="líneas escaneadas por estación")
+    parser.add_argument("--productos", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        datos.DB_NAME = os.path.join(tmp, "servidor.db")
+        datos.init_db()
+        codebars = generador.poblar(args.productos, 0)
+        servidor = ServidorSync(("127.0.0.1", 0))
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_address[1]}"
+        print(f"{'estaciones':>10} {'líneas/s':>10} {'p50 (ms)':>9} {'p95 (ms)':>9} {'ops/transacción':>16}")
+        for n in args.estaciones:
+            antes = datos.max_rowid_importaciones()
+            transacciones, operaciones = servidor.escritor.transacciones, servidor.escritor.operaciones
+            latencias, pendientes = [], []
+            hilos = [threading.Thread(target=estacion, args=(url, i, args.lineas, codebars, pendientes, latencias, tmp))
+                     for i in range(n)]
+            inicio = time.perf_counter()
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            duracion = time.perf_counter() - inicio
+            agregadas = datos.contar_importaciones(antes)
+            esperadas = n * args.lineas
+            if agregadas != esperadas or any(pendientes):
+                print(f"ERROR: se esperaban {esperadas} líneas y el servidor tiene {agregadas}")
+                return 1
+            latencias.sort()
+            por_transaccion = (servidor.escritor.operaciones - operaciones) / (servidor.escritor.transacciones - transacciones)
+            print(f"{n:>10} {esperadas / duracion:>10,.0f} {statistics.median(latencias) * 1000:>9.2f} "
+                  f"{latencias[int(len(latencias) * 0.95)] * 1000:>9.2f} {por_transaccion:>16.1f}")
+        servidor.shutdown()
+        servidor.server_close()
+        datos.cerrar_conexiones()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
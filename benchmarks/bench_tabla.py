@@ -0,0 +1,100 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tkinter as tk
+import tkinter.ttk as ttk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+
+COLUMNAS = (
+    "importacion_no", "sku", "marca", "producto", "codebar",
+    "lote", "fecha_expira",
+    "cant_recibida", "cant_rechazada", "cant_aceptada", "observaciones"
+)
+
+class Tabla:
+    # Reproduce la lógica de InventarioApp sobre un ttk.Treeview sin el resto de la ventana.
+    def __init__(self, root):
+        self.tree = ttk.Treeview(root, columns=COLUMNAS, show="headings")
+        self.rowid_map = {}
+        self.item_por_rowid = {}
+
+    def cargar_importaciones(self):
+        self.tree.delete(*self.tree.get_children())
+        self.rowid_map.clear()
+        self.item_por_rowid.clear()
+        for row in datos.buscar_importaciones():
+            self.insertar_fila(row)
+
+    def insertar_fila(self, row):
+        item_id = self.tree.insert("", "end", values=row[1:])
+        self.rowid_map[item_id] = row[0]
+        self.item_por_rowid[row[0]] = item_id
+
+    def refrescar_fila(self, rowid):
+        row = datos.buscar_importacion_por_rowid(rowid)
+        item_id = self.item_por_rowid.get(rowid)
+        if row is None:
+            if item_id is not None:
+                self.tree.delete(item_id)
+                del self.rowid_map[item_id]
+                del self.item_por_rowid[rowid]
+        elif item_id is None:
+            self.insertar_fila(row)
+        else:
+            self.tree.item(item_id, values=row[1:])
+
+def fila(i):
+    return (f"IMP{i // 500}", f"SKU{i % 300}", "Marca", f"Producto {i % 300}", f"{7400000000000 + i % 300}",
+            f"L{i % 40}", "31/12/2030", 10, i % 3, 10 - i % 3, "")
+
+def poblar(n):
+    with datos.transaccion() as conn:
+        conn.executemany('INSERT OR IGNORE INTO productos VALUES (?,?,?,?)', ((f[4], f[1], f[2], f[3]) for f in map(fila, range(300))))
+        conn.executemany('''
+            INSERT INTO importaciones (importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones)
+            VALUES (?, ?, ?, '2030-12-31', ?, ?, ?, ?)
+        ''', ((f[0], f[4], f[5], f[7], f[8], f[9], f[10]) for f in map(fila, range(n))))
+
+def medir_guardado(tabla, incremental, repeticiones):
+    tiempos = []
+    for i in range(repeticiones):
+        inicio = time.perf_counter()
+        rowid = datos.agregar_importacion(*fila(i))
+        if incremental:
+            tabla.refrescar_fila(rowid)
+        else:
+            tabla.cargar_importaciones()
+        tabla.tree.update_idletasks()
+        tiempos.append(time.perf_counter() - inicio)
+    return sorted(tiempos)[len(tiempos) // 2] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por guardado: recarga completa vs actualización incremental del Treeview.")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tk.Tk()
+    root.withdraw()
+    print(f"{'filas':>10} {'recarga (ms)':>14} {'incremental (ms)':>18}")
+    for n in args.tamanos:
+        with tempfile.TemporaryDirectory() as tmp:
+            datos.DB_NAME = os.path.join(tmp, "bench.db")
+            datos.init_db()
+            poblar(n)
+            tabla = Tabla(root)
+            tabla.cargar_importaciones()
+            recarga = medir_guardado(tabla, False, args.repeticiones)
+            incremental = medir_guardado(tabla, True, args.repeticiones)
+            tabla.tree.destroy()
+            datos.cerrar_conexiones()
+        print(f"{n:>10} {recarga:>14.2f} {incremental:>18.2f}")
+    root.destroy()
+
+if __name__ == '__main__':
+    main()
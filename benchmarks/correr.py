@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+import generador
+from busqueda import expresion_fts
+from exportador import exportar_importaciones
+from importador import importar_productos_archivo
+from tabla_virtual import ModeloImportaciones, TablaVirtual
+
+SEMILLA = 1
+
+class Resultados:
+    def __init__(self):
+        self.filas = []
+
+    def agregar(self, suite, escala, metrica, valor, unidad, mayor_es_mejor=True):
+        self.filas.append({"suite": suite, "escala": escala, "metrica": metrica, "valor": round(valor, 3),
+                           "unidad": unidad, "mayor_es_mejor": mayor_es_mejor})
+        print(f"  {suite:<14} {escala:>9} {metrica:<28} {valor:>14,.1f} {unidad}")
+
+def cronometrar(funcion, *args, **kwargs):
+    inicio = time.perf_counter()
+    resultado = funcion(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+def base_temporal(tmp, nombre):
+    datos.cerrar_conexiones()
+    datos.DB_NAME = os.path.join(tmp, nombre)
+    datos.init_db()
+
+def suite_busquedas(res, escala, tmp):
+    base_temporal(tmp, f"busquedas_{escala}.db")
+    codebars = generador.poblar(escala, 0, SEMILLA)
+    rnd = random.Random(SEMILLA)
+    # Una de cada diez búsquedas es de un código inexistente (lecturas erróneas).
+    muestra = [rnd.choice(codebars) if rnd.random() < 0.9 else f"999{rnd.randrange(10 ** 10)}" for _ in range(20000)]
+    conn = datos.obtener_conexion()
+    _, duracion = cronometrar(lambda: [conn.execute('SELECT sku, marca, producto, codebar FROM productos WHERE codebar=?',
+                                                    (c,)).fetchone() for c in muestra])
+    res.agregar("busquedas", escala, "sqlite", len(muestra) / duracion, "búsquedas/s")
+    _, duracion = cronometrar(datos.cache_productos.precargar)
+    res.agregar("busquedas", escala, "precarga_cache", duracion * 1000, "ms", False)
+    _, duracion = cronometrar(lambda: [datos.buscar_producto_por_codebar(c) for c in muestra])
+    res.agregar("busquedas", escala, "cache", len(muestra) / duracion, "búsquedas/s")
+
+def suite_inserciones(res, escala, tmp):
+    base_temporal(tmp, f"inserciones_{escala}.db")
+    _, duracion = cronometrar(generador.poblar, min(escala, 50000), escala, SEMILLA)
+    res.agregar("inserciones", escala, "bloque", escala / duracion, "filas/s")
+    # Línea a línea, como al escanear: una transacción por agregar_importacion.
+    codebars = generador.codigos(min(escala, 50000), SEMILLA)
+    lineas = list(generador.historial(min(escala, 5000), codebars, SEMILLA + 7))
+    _, duracion = cronometrar(lambda: [datos.agregar_importacion(*f) for f in lineas])
+    res.agregar("inserciones", escala, "agregar_importacion", len(lineas) / duracion, "filas/s")
+    # Las mismas líneas como una sesión de recepción: una sola transacción.
+    _, duracion = cronometrar(datos.agregar_importaciones, lineas, sesion=f"bench-{escala}")
+    res.agregar("inserciones", escala, "sesion_recepcion", len(lineas) / duracion, "filas/s")
+
+def suite_importacion(res, escala, tmp):
+    for extension in ("csv", "xlsx"):
+        ruta = generador.escribir_catalogo(os.path.join(tmp, f"catalogo_{escala}.{extension}"), escala, SEMILLA)
+        base_temporal(tmp, f"importacion_{escala}_{extension}.db")
+        conteo, duracion = cronometrar(importar_productos_archivo, ruta)
+        res.agregar("importacion", escala, f"{extension}_nuevos", conteo["agregados"] / duracion, "filas/s")
+        conteo, duracion = cronometrar(importar_productos_archivo, ruta)
+        res.agregar("importacion", escala, f"{extension}_actualizados", conteo["actualizados"] / duracion, "filas/s")
+        os.remove(ruta)
+
+def suite_exportacion(res, escala, tmp):
+    base_temporal(tmp, f"exportacion_{escala}.db")
+    generador.poblar(min(escala, 50000), escala, SEMILLA)
+    for extension in ("csv", "xlsx"):
+        ruta = os.path.join(tmp, f"exportacion_{escala}.{extension}")
+        filas, duracion = cronometrar(exportar_importaciones, ruta)
+        res.agregar("exportacion", escala, extension, filas / duracion, "filas/s")
+        os.remove(ruta)
+
+def suite_grilla(res, escala, tmp):
+    base_temporal(tmp, f"grilla_{escala}.db")
+    generador.poblar(min(escala, 50000), escala, SEMILLA)
+    visibles = 30
+    modelo, duracion = cronometrar(ModeloImportaciones)
+    _, duracion_filas = cronometrar(modelo.filas, 0, visibles)
+    res.agregar("grilla", escala, "apertura", (duracion + duracion_filas) * 1000, "ms", False)
+    _, duracion = cronometrar(modelo.filas, escala // 2, visibles)
+    res.agregar("grilla", escala, "ir_al_medio", duracion * 1000, "ms", False)
+    _, duracion = cronometrar(modelo.filas, escala - visibles, visibles)
+    res.agregar("grilla", escala, "ir_al_final", duracion * 1000, "ms", False)
+    expresion = expresion_fts("aceite")
+    _, duracion = cronometrar(lambda: (datos.contar_importaciones(busqueda=expresion),
+                                       datos.buscar_importaciones_pagina(0, 200, busqueda=expresion)))
+    res.agregar("grilla", escala, "filtro_texto", duracion * 1000, "ms", False)
+
+    # El Treeview real necesita pantalla; en un servidor se puede usar `xvfb-run`.
+    try:
+        import tkinter as tk
+        import tkinter.ttk as ttk
+        root = tk.Tk()
+    except Exception as e:
+        print(f"  grilla: se omite el Treeview ({e})")
+        return
+    root.withdraw()
+    columnas = tuple(f"c{i}" for i in range(11))
+    tree = ttk.Treeview(root, columns=columnas, show="headings", height=visibles)
+    scrollbar = ttk.Scrollbar(root, orient="vertical")
+
+    def abrir():
+        tabla = TablaVirtual(tree, scrollbar, ModeloImportaciones(), {}, lambda fila: "")
+        tabla.renderizar()
+        root.update_idletasks()
+        return tabla
+    tabla, duracion = cronometrar(abrir)
+    res.agregar("grilla", escala, "treeview_apertura", duracion * 1000, "ms", False)
+
+    def desplazar():
+        tabla.desplazar("moveto", "0.5")
+        root.update_idletasks()
+    _, duracion = cronometrar(desplazar)
+    res.agregar("grilla", escala, "treeview_desplazar", duracion * 1000, "ms", False)
+    root.destroy()
+
+def suite_decodificacion(res, escala, tmp, segundos=2.0):
+    # La escala no aplica: se usa el mismo corpus de imágenes en cada corrida.
+    try:
+        import cv2
+        from camara import preparar_para_decodificar, decodificar
+        corpus = generador.corpus_codigos(os.path.join(tmp, "corpus"), semilla=SEMILLA)
+    except ImportError as e:
+        print(f"  decodificacion: se omite ({e})")
+        return
+    for variante, imagenes in corpus.items():
+        cuadros = [(cv2.cvtColor(cv2.imread(ruta, cv2.IMREAD_GRAYSCALE), cv2.COLOR_GRAY2BGR), codigo)
+                   for ruta, codigo in imagenes]
+        leidos = sum(codigo in decodificar(preparar_para_decodificar(cuadro)) for cuadro, codigo in cuadros)
+        res.agregar("decodificacion", 0, f"{variante}_aciertos", 100 * leidos / len(cuadros), "%")
+        procesados = 0
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < segundos:
+            cuadro, _ = cuadros[procesados % len(cuadros)]
+            decodificar(preparar_para_decodificar(cuadro))
+            procesados += 1
+        res.agregar("decodificacion", 0, f"{variante}_fps", procesados / (time.perf_counter() - inicio), "cuadros/s")
+
+SUITES = {
+    "busquedas": suite_busquedas,
+    "inserciones": suite_inserciones,
+    "importacion": suite_importacion,
+    "exportacion": suite_exportacion,
+    "grilla": suite_grilla,
+    "decodificacion": suite_decodificacion,
+}
+SIN_ESCALA = ("decodificacion",)
+
+def comparar(resultados, ruta_base, tolerancia):
+    with open(ruta_base, encoding="utf-8") as f:
+        base = {(r["suite"], r["escala"], r["metrica"]): r for r in json.load(f)["resultados"]}
+    regresiones = []
+    print(f"\nComparación con {ruta_base} (tolerancia {tolerancia:.0%}):")
+    for r in resultados:
+        anterior = base.get((r["suite"], r["escala"], r["metrica"]))
+        if not anterior or not anterior["valor"]:
+            continue
+        cambio = (r["valor"] - anterior["valor"]) / anterior["valor"]
+        mejora = cambio if r["mayor_es_mejor"] else -cambio
+        marca = "REGRESIÓN" if mejora < -tolerancia else ("mejora" if mejora > tolerancia else "")
+        print(f"  {r['suite']:<14} {r['escala']:>9} {r['metrica']:<28} {anterior['valor']:>12,.1f} -> "
+              f"{r['valor']:>12,.1f} {r['unidad']:<12} {cambio:+7.1%} {marca}")
+        if marca == "REGRESIÓN":
+            regresiones.append(r)
+    return regresiones
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Corre las mediciones con datos sintéticos reproducibles y guarda los resultados en JSON. "
+                    "Con --base compara contra una corrida guardada y sale con código 1 si hay regresiones."
+    )
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000, 100000], help="filas por escala (p. ej. 1000 100000 1000000)")
+    parser.add_argument("--suites", nargs="+", choices=sorted(SUITES), default=list(SUITES))
+    parser.add_argument("--salida", default="resultados_bench.json")
+    parser.add_argument("--base", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="cambio relativo tolerado antes de marcar regresión")
+    args = parser.parse_args()
+
+    res = Resultados()
+    with tempfile.TemporaryDirectory() as tmp:
+        for nombre in args.suites:
+            for escala in ([0] if nombre in SIN_ESCALA else args.escalas):
+                SUITES[nombre](res, escala, tmp)
+        datos.cerrar_conexiones()
+
+    salida = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "semilla": SEMILLA,
+        "resultados": res.filas,
+    }
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados guardados en {args.salida}")
+
+    if args.base and comparar(res.filas, args.base, args.tolerancia):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datos
+from exportador import crear_escritor
+from importador import COLUMNAS_PRODUCTOS
+
+# Todo sale de random.Random(semilla) y de una fecha fija: la misma semilla
+# produce exactamente los mismos datos en cualquier máquina.
+FECHA_BASE = date(2026, 1, 1)
+MARCAS = ("Nestlé", "Unilever", "Colgate", "Bimbo", "Kellogg", "Danone", "Pepsico", "Mars", "Alpina", "Diana")
+PALABRAS = ("aceite", "oliva", "arroz", "leche", "galleta", "chocolate", "jabón", "cereal", "atún", "café",
+            "harina", "azúcar", "pasta", "salsa", "yogur", "queso", "frijol", "avena", "té", "mantequilla")
+
+def digito_control(doce):
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(doce))
+    return str((10 - suma % 10) % 10)
+
+def codigos(n, semilla=1):
+    # EAN-13 válidos y distintos, con prefijo 740.
+    rnd = random.Random(semilla)
+    return [f"740{x:09d}" + digito_control(f"740{x:09d}") for x in rnd.sample(range(10 ** 9), n)]
+
+def catalogo(n, semilla=1):
+    rnd = random.Random(semilla + 1000)
+    for i, codebar in enumerate(codigos(n, semilla)):
+        yield (codebar, f"SKU-{i:07d}", rnd.choice(MARCAS), " ".join(rnd.sample(PALABRAS, 3)))
+
+def historial(n, codebars, semilla=2, lineas_por_importacion=200):
+    # Líneas de recepción con la misma forma que los argumentos de agregar_importacion.
+    rnd = random.Random(semilla)
+    for i in range(n):
+        recibida = rnd.randrange(1, 120)
+        rechazada = rnd.randrange(0, 4) if rnd.random() < 0.2 else 0
+        expira = FECHA_BASE + timedelta(days=rnd.randrange(-180, 900))
+        yield (f"IMP-{i // lineas_por_importacion:06d}", "", "", "", rnd.choice(codebars), f"L{rnd.randrange(10000):05d}",
+               expira.strftime("%d/%m/%Y"), recibida, rechazada, recibida - rechazada,
+               "caja dañada" if rechazada else "")
+
+def escribir_catalogo(ruta, n, semilla=1):
+    # .xlsx o .csv según la extensión, con los encabezados que espera el importador.
+    escritor = crear_escritor(ruta, "Productos")
+    escritor.escribir(COLUMNAS_PRODUCTOS)
+    for fila in catalogo(n, semilla):
+        escritor.escribir(fila)
+    escritor.cerrar()
+    return ruta
+
+def poblar(productos, lineas, semilla=1):
+    # Carga directa en bloque (sin pasar por agregar_importacion) para preparar bases grandes rápido.
+    codebars = [fila[0] for fila in catalogo(productos, semilla)]
+    with datos.transaccion() as conn:
+        conn.executemany('INSERT INTO productos VALUES (?,?,?,?)', catalogo(productos, semilla))
+        conn.executemany('''
+            INSERT INTO importaciones (importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((f[0], f[4], f[5], datos.fecha_a_iso(f[6]), f[7], f[8], f[9], f[10])
+              for f in historial(lineas, codebars, semilla + 1)))
+    datos.cache_productos.invalidar()
+    return codebars
+
+# --- Corpus de imágenes de códigos de barras (requiere numpy y OpenCV) ---
+
+_L = ("0001101", "0011001", "0010011", "0111101", "0100011", "0110001", "0101111", "0111011", "0110111", "0001011")
+_R = tuple("".join("1" if b == "0" else "0" for b in patron) for patron in _L)
+_G = tuple(patron[::-1] for patron in _R)
+_PARIDAD = ("LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG", "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL")
+
+def modulos_ean13(codigo):
+    # 95 módulos: guarda, 6 dígitos L/G según el primero, guarda central, 6 dígitos R, guarda.
+    izquierda = "".join((_L if p == "L" else _G)[int(d)] for p, d in zip(_PARIDAD[int(codigo[0])], codigo[1:7]))
+    derecha = "".join(_R[int(d)] for d in codigo[7:])
+    return "101" + izquierda + "01010" + derecha + "101"
+
+def imagen_ean13(codigo, modulo=3, alto=120, margen=12):
+    import numpy as np
+    fila = np.array([0 if b == "1" else 255 for b in modulos_ean13(codigo)], dtype=np.uint8)
+    fila = np.repeat(np.pad(fila, margen, constant_values=255), modulo)
+    imagen = np.tile(fila, (alto, 1))
+    return np.pad(imagen, ((margen * modulo, margen * modulo), (0, 0)), constant_values=255)
+
+def variantes(imagen, rnd):
+    import cv2
+    alto, ancho = imagen.shape[:2]
+    borrosa = cv2.GaussianBlur(imagen, (0, 0), rnd.uniform(1.2, 2.0))
+    angulo = rnd.uniform(8, 25) * rnd.choice((-1, 1))
+    matriz = cv2.getRotationMatrix2D((ancho / 2, alto / 2), angulo, 1.0)
+    rotada = cv2.warpAffine(imagen, matriz, (ancho, alto), borderValue=255)
+    return {"limpia": imagen, "borrosa": borrosa, "rotada": rotada}
+
+def corpus_codigos(directorio, n=30, semilla=3):
+    # Devuelve {variante: [(ruta, codigo), ...]} y deja las imágenes PNG en `directorio`.
+    import cv2
+    rnd = random.Random(semilla)
+    corpus = {}
+    for codigo in codigos(n, semilla):
+        for variante, imagen in variantes(imagen_ean13(codigo), rnd).items():
+            carpeta = os.path.join(directorio, variante)
+            os.makedirs(carpeta, exist_ok=True)
+            ruta = os.path.join(carpeta, f"{codigo}.png")
+            cv2.imwrite(ruta, imagen)
+            corpus.setdefault(variante, []).append((ruta, codigo))
+    return corpus
@@ -0,0 +1,77 @@
+import queue
+import re
+import sqlite3
+import threading
+
+import datos
+
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+def expresion_fts(texto):
+    # Cada palabra escrita se busca como prefijo y todas deben aparecer:
+    # "acei oliv" -> "acei"* "oliv"*. Así el texto del usuario nunca se
+    # interpreta como sintaxis FTS5.
+    palabras = _PALABRA.findall(texto or "")
+    return " ".join(f'"{p}"*' for p in palabras) or None
+
+class BuscadorImportaciones:
+    # Hilo dedicado que ejecuta siempre la última búsqueda pedida. Si llega otra
+    # mientras una consulta corre, esa consulta se interrumpe y su resultado se
+    # descarta. Los resultados salen por la cola `resultados` como
+    # (generacion, expresion, total, primera_pagina, max_rowid). Con un ClienteSync como
+    # `fuente` la consulta no se puede interrumpir, pero su resultado igual se descarta.
+    def __init__(self, tamano_pagina=200, fuente=datos):
+        self.tamano_pagina = tamano_pagina
+        self.fuente = fuente
+        self.resultados = queue.Queue()
+        self.generacion = 0
+        self._cond = threading.Condition()
+        self._pendiente = None
+        self._conn = None
+        self._ocupado = False
+        self._detener = False
+        threading.Thread(target=self._trabajar, daemon=True).start()
+
+    def buscar(self, texto, despues_de_rowid=0):
+        with self._cond:
+            self.generacion += 1
+            self._pendiente = (self.generacion, expresion_fts(texto), despues_de_rowid)
+            self._cond.notify()
+            if self._ocupado and self._conn is not None:
+                self._conn.interrupt()
+        return self.generacion
+
+    def detener(self):
+        with self._cond:
+            self._detener = True
+            self._cond.notify()
+
+    def _trabajar(self):
+        try:
+            self._atender()
+        finally:
+            datos.cerrar_conexion_hilo()
+
+    def _atender(self):
+        while True:
+            with self._cond:
+                while self._pendiente is None and not self._detener:
+                    self._cond.wait()
+                if self._detener:
+                    return
+                generacion, expresion, despues_de_rowid = self._pendiente
+                self._pendiente = None
+                if self.fuente is datos:
+                    self._conn = datos.obtener_conexion()
+                self._ocupado = True
+            try:
+                total = self.fuente.contar_importaciones(despues_de_rowid, busqueda=expresion)
+                pagina = self.fuente.buscar_importaciones_pagina(despues_de_rowid, self.tamano_pagina, busqueda=expresion)
+                max_rowid = self.fuente.max_rowid_importaciones()
+            except (sqlite3.OperationalError, ConnectionError):
+                # Interrumpida por una búsqueda más nueva (o expresión inválida, o sin servidor).
+                continue
+            finally:
+                with self._cond:
+                    self._ocupado = False
+            self.resultados.put((generacion, expresion, total, pagina, max_rowid))
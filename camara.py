@@ -0,0 +1,195 @@
+import queue
+import threading
+import time
+
+from metricas import medido
+
+# cv2 y pyzbar se importan al usarse por primera vez: cargarlos cuesta
+# varios segundos y la aplicación puede abrirse sin llegar a usar la cámara.
+
+ANCHO_DECODIFICACION = 640
+SEGUNDOS_REBOTE = 1.5
+
+class UltimoValor:
+    # Cola de un solo lugar: el productor siempre reemplaza el valor anterior, así
+    # un consumidor lento nunca procesa cuadros atrasados (gana el último cuadro).
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._valor = None
+
+    def poner(self, valor):
+        with self._cond:
+            self._valor = valor
+            self._cond.notify()
+
+    def tomar(self, timeout=None):
+        with self._cond:
+            if self._valor is None:
+                self._cond.wait(timeout)
+            valor, self._valor = self._valor, None
+            return valor
+
+class Medidor:
+    # Cuadros por segundo en ventanas de un segundo y latencia promedio exponencial.
+    def __init__(self):
+        self.por_segundo = 0.0
+        self.latencia_ms = 0.0
+        self._cuenta = 0
+        self._inicio = time.perf_counter()
+
+    def registrar(self, latencia=None):
+        self._cuenta += 1
+        if latencia is not None:
+            self.latencia_ms = latencia * 1000 if not self.latencia_ms else self.latencia_ms * 0.9 + latencia * 100
+        ahora = time.perf_counter()
+        if ahora - self._inicio >= 1:
+            self.por_segundo = self._cuenta / (ahora - self._inicio)
+            self._cuenta = 0
+            self._inicio = ahora
+
+class Antirrebote:
+    # Un código que sigue frente al lente renueva su marca de tiempo en cada cuadro,
+    # así que solo vuelve a contarse después de desaparecer `segundos`.
+    def __init__(self, segundos=SEGUNDOS_REBOTE):
+        self.segundos = segundos
+        self._visto = {}
+
+    def aceptar(self, codigo, ahora=None):
+        ahora = time.monotonic() if ahora is None else ahora
+        anterior = self._visto.get(codigo)
+        self._visto[codigo] = ahora
+        if len(self._visto) > 1000:
+            self._visto = {c: t for c, t in self._visto.items() if ahora - t <= self.segundos}
+        return anterior is None or ahora - anterior > self.segundos
+
+    def reiniciar(self):
+        self._visto = {}
+
+def preparar_para_decodificar(frame, ancho_max=ANCHO_DECODIFICACION, roi=None):
+    # pyzbar trabaja en escala de grises; reducir la imagen baja mucho el costo por cuadro.
+    import cv2
+    if roi:
+        x, y, ancho, alto = roi
+        frame = frame[y:y + alto, x:x + ancho]
+    gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    alto, ancho = gris.shape[:2]
+    if ancho_max and ancho > ancho_max:
+        gris = cv2.resize(gris, (ancho_max, int(alto * ancho_max / ancho)), interpolation=cv2.INTER_AREA)
+    return gris
+
+@medido
+def decodificar(imagen):
+    from pyzbar import pyzbar
+    return [barcode.data.decode('utf-8') for barcode in pyzbar.decode(imagen)]
+
+class PipelineCamara:
+    # Hilo de captura -> hilo de decodificación -> consumidor de la interfaz.
+    # Captura y vista previa se comunican con UltimoValor; los códigos detectados
+    # salen por la cola `detecciones`.
+    def __init__(self, camera_index=0, ancho_decodificacion=ANCHO_DECODIFICACION, roi=None):
+        self.camera_index = camera_index
+        self.ancho_decodificacion = ancho_decodificacion
+        self.roi = roi
+        self.cuadros = UltimoValor()
+        self.vista_previa = UltimoValor()
+        self.detecciones = queue.Queue()
+        self.antirrebote = Antirrebote()
+        self.captura = Medidor()
+        self.decodificacion = Medidor()
+        self.error = None
+        self.abierta = threading.Event()
+        self._decodificar_activo = threading.Event()
+        self._decodificar_activo.set()
+        self._detener = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        self._detener.clear()
+        self._hilos = [
+            threading.Thread(target=self._capturar, daemon=True),
+            threading.Thread(target=self._decodificar, daemon=True),
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def detener(self):
+        self._detener.set()
+
+    def pausar(self):
+        # La cámara sigue abierta (y ajustada) pero no se gasta CPU decodificando.
+        self._decodificar_activo.clear()
+
+    def reanudar(self):
+        self.vaciar()
+        self._decodificar_activo.set()
+
+    def vaciar(self):
+        self.antirrebote.reiniciar()
+        while True:
+            try:
+                self.detecciones.get_nowait()
+            except queue.Empty:
+                return
+
+    @property
+    def activa(self):
+        return any(hilo.is_alive() for hilo in self._hilos)
+
+    def _capturar(self):
+        import cv2
+        cap = cv2.VideoCapture(self.camera_index)
+        try:
+            if not cap.isOpened():
+                self.error = "No se pudo abrir la cámara."
+                self._detener.set()
+                return
+            self.abierta.set()
+            while not self._detener.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    time.sleep(0.01)
+                    continue
+                self.captura.registrar()
+                self.cuadros.poner(frame)
+                self.vista_previa.poner(frame)
+        finally:
+            cap.release()
+
+    def _decodificar(self):
+        while not self._detener.is_set():
+            if not self._decodificar_activo.wait(timeout=0.1):
+                continue
+            frame = self.cuadros.tomar(timeout=0.1)
+            if frame is None:
+                continue
+            inicio = time.perf_counter()
+            codigos = decodificar(preparar_para_decodificar(frame, self.ancho_decodificacion, self.roi))
+            self.decodificacion.registrar(time.perf_counter() - inicio)
+            for codigo in codigos:
+                if self.antirrebote.aceptar(codigo):
+                    self.detecciones.put(codigo)
+
+    def estadisticas(self):
+        return {
+            "captura_fps": self.captura.por_segundo,
+            "decodificacion_fps": self.decodificacion.por_segundo,
+            "latencia_ms": self.decodificacion.latencia_ms,
+        }
+
+_camaras = {}
+_lock_camaras = threading.Lock()
+
+def obtener_camara(camera_index=0):
+    # Abrir la cámara tarda 1-2 s, así que se abre una vez y se reutiliza entre escaneos.
+    with _lock_camaras:
+        pipeline = _camaras.get(camera_index)
+        if pipeline is None or pipeline.error or not pipeline.activa:
+            pipeline = _camaras[camera_index] = PipelineCamara(camera_index)
+            pipeline.iniciar()
+        return pipeline
+
+def cerrar_camaras():
+    with _lock_camaras:
+        for pipeline in _camaras.values():
+            pipeline.detener()
+        _camaras.clear()
@@ -0,0 +1,140 @@
+import datos
+from exportador import exportar_consulta
+from metricas import medido
+
+# Exportación incremental para otros sistemas (ERP): cada consumidor tiene un punto
+# de control (el último seq que recibió) y cada exportación lleva solo lo anotado en
+# el diario `cambios` después de ese punto (ver migraciones._v9_diario_cambios).
+
+CONSUMIDOR = "erp"
+TAMANO_LOTE = 5000
+# Columnas de productos e importaciones en una sola fila; las que no corresponden a
+# la tabla de la fila quedan vacías. fecha_expira va en aaaa-mm-dd.
+ENCABEZADOS_CAMBIOS = ("seq", "tabla", "operacion", "id", "importacion_no", "codebar", "sku", "marca", "producto",
+                       "lote", "fecha_expira", "cant_recibida", "cant_rechazada", "cant_aceptada", "observaciones")
+
+# Un cambio neto por fila entre dos seq: vale la última operación, pero si la primera
+# del tramo fue un alta sigue siendo un alta, y una fila dada de alta y de baja dentro
+# del tramo no sale. Agrupa solo las entradas del tramo (rango de la clave primaria) y
+# busca cada fila por su clave; con la vista importaciones_detalle SQLite la
+# materializaría entera.
+_CAMBIOS_NETOS = '''
+    WITH netos AS (
+        SELECT u.seq AS seq, ultima.tabla AS tabla, ultima.clave AS clave,
+               CASE WHEN ultima.operacion = 'D' THEN 'D' WHEN primera.operacion = 'I' THEN 'I' ELSE 'U' END AS operacion
+        FROM (SELECT min(seq) AS primero, max(seq) AS seq FROM cambios
+              WHERE seq > ? AND seq <= ? GROUP BY tabla, clave) u
+        JOIN cambios ultima ON ultima.seq = u.seq
+        JOIN cambios primera ON primera.seq = u.primero
+        WHERE NOT (ultima.operacion = 'D' AND primera.operacion = 'I')
+    )
+    SELECT n.seq, n.tabla, n.operacion,
+           CASE WHEN n.tabla = 'importaciones' THEN n.clave END, i.importacion_no,
+           CASE WHEN n.tabla = 'productos' THEN n.clave ELSE i.codebar END,
+           coalesce(i.sku_linea, p.sku), coalesce(i.marca_linea, p.marca), coalesce(i.producto_linea, p.producto),
+           i.lote, i.fecha_expira, i.cant_recibida, i.cant_rechazada, i.cant_aceptada, i.observaciones
+    FROM netos n
+    LEFT JOIN importaciones i ON n.tabla = 'importaciones' AND i.id = n.clave
+    LEFT JOIN productos p ON n.operacion != 'D' AND p.codebar = CASE WHEN n.tabla = 'productos' THEN n.clave ELSE i.codebar END
+    ORDER BY n.seq
+'''
+
+# Primera exportación de un consumidor: todo lo que hay, como altas.
+_COMPLETA = '''
+    SELECT ?, 'productos', 'I', NULL, NULL, codebar, sku, marca, producto,
+           NULL, NULL, NULL, NULL, NULL, NULL
+    FROM productos
+    UNION ALL
+    SELECT ?, 'importaciones', 'I', id, importacion_no, codebar, sku, marca, producto,
+           lote, fecha_expira_iso, cant_recibida, cant_rechazada, cant_aceptada, observaciones
+    FROM importaciones_detalle
+'''
+
+def ultimo_seq(conn):
+    # sqlite_sequence guarda el seq más alto asignado, aunque ya se haya compactado.
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'cambios'").fetchone()
+    return row[0] if row else 0
+
+def punto_de_control(consumidor=CONSUMIDOR):
+    # None si el consumidor no está registrado; -1 si le falta la exportación completa.
+    row = datos.obtener_conexion().execute(
+        'SELECT seq FROM cambios_consumidores WHERE consumidor = ?', (consumidor,)).fetchone()
+    return row[0] if row else None
+
+def consumidores():
+    # [(consumidor, punto de control, entradas del diario pendientes de exportar)]
+    conn = datos.obtener_conexion()
+    return [(consumidor, seq, conn.execute('SELECT count(*) FROM cambios WHERE seq > ?', (seq,)).fetchone()[0])
+            for consumidor, seq in conn.execute('SELECT consumidor, seq FROM cambios_consumidores ORDER BY consumidor').fetchall()]
+
+def reiniciar_consumidor(consumidor=CONSUMIDOR):
+    # La próxima exportación vuelve a ser completa (p. ej. después de restaurar un respaldo).
+    with datos.transaccion() as conn:
+        conn.execute('''
+            INSERT INTO cambios_consumidores VALUES (?, -1)
+            ON CONFLICT (consumidor) DO UPDATE SET seq = -1
+        ''', (consumidor,))
+
+def quitar_consumidor(consumidor=CONSUMIDOR):
+    with datos.transaccion() as conn:
+        quitado = conn.execute('DELETE FROM cambios_consumidores WHERE consumidor = ?', (consumidor,)).rowcount
+        if not conn.execute('SELECT 1 FROM cambios_consumidores').fetchone():
+            conn.execute('DELETE FROM cambios')
+    return bool(quitado)
+
+def compactar(tamano_lote=TAMANO_LOTE):
+    # Borra lo que ya recibieron todos los consumidores, por lotes para no frenar a
+    # quien esté escaneando. Devuelve cuántas entradas se borraron.
+    conn = datos.obtener_conexion()
+    borradas = 0
+    while True:
+        with datos.transaccion():
+            n = conn.execute('''
+                DELETE FROM cambios WHERE seq IN (
+                    SELECT seq FROM cambios WHERE seq <= (SELECT min(seq) FROM cambios_consumidores)
+                    ORDER BY seq LIMIT ?)
+            ''', (tamano_lote,)).rowcount
+        borradas += n
+        if n < tamano_lote:
+            return borradas
+
+@medido
+def exportar_cambios(ruta, consumidor=CONSUMIDOR, desde=None, avanzar=True, progreso=None):
+    # Escribe los cambios posteriores al punto de control del consumidor (o a `desde`)
+    # y, si el archivo quedó completo y `avanzar`, mueve el punto de control y compacta
+    # el diario. La primera vez (o tras reiniciar_consumidor) exporta todo. Devuelve
+    # (filas, desde, hasta); `desde` es None en una exportación completa.
+    conn = datos.obtener_conexion()
+    punto = punto_de_control(consumidor)
+    if desde is None:
+        if punto is None:
+            if avanzar:
+                # Desde aquí los disparadores anotan; lo anterior va en la exportación completa.
+                reiniciar_consumidor(consumidor)
+            punto = -1
+        desde = punto if punto >= 0 else None
+    else:
+        if punto is None:
+            raise ValueError(f"El consumidor {consumidor} no está registrado: su primera exportación (sin desde) es completa")
+        minimo = conn.execute('SELECT min(seq) FROM cambios_consumidores').fetchone()[0]
+        if desde < minimo:
+            raise ValueError(f"Los cambios hasta el {minimo} ya se compactaron; exporte desde {minimo} o después")
+
+    # Una transacción de lectura: el diario y las filas se leen de la misma instantánea.
+    conn.execute('BEGIN')
+    try:
+        hasta = ultimo_seq(conn)
+        if desde is None:
+            consulta, params = _COMPLETA, (hasta, hasta)
+        else:
+            consulta, params = _CAMBIOS_NETOS, (desde, hasta)
+        filas = exportar_consulta(ruta, ENCABEZADOS_CAMBIOS, consulta, params, progreso=progreso,
+                                  titulo="Cambios", conn=conn)
+    finally:
+        conn.execute('COMMIT')
+
+    if avanzar:
+        with datos.transaccion() as c:
+            c.execute('UPDATE cambios_consumidores SET seq = max(seq, ?) WHERE consumidor = ?', (hasta, consumidor))
+        compactar()
+    return filas, desde, hasta
@@ -0,0 +1,275 @@
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Solo la capa de datos: nada de customtkinter, y cv2/pyzbar solo si se usa
+# decodificar-lote, para poder ejecutarse en un servidor sin pantalla ni cámara.
+import datos
+from archivo import agrupar_archivos, archivar, archivo_de, reconstruir_stock, respaldar, restaurar
+import cambios
+from conciliacion import conciliar_manifiesto, exportar_conciliacion, ESTADOS
+from importador import importar_productos_archivo, FormatoIncorrecto
+from exportador import exportar_importaciones
+from migraciones import version_esquema
+from reportes import exportar_stock, exportar_vencimientos
+
+class Avance:
+    # Imprime en stderr filas procesadas y filas/s, como mucho una vez por `intervalo`.
+    def __init__(self, intervalo=1.0, unidad="filas"):
+        self.intervalo = intervalo
+        self.unidad = unidad
+        self.inicio = time.perf_counter()
+        self.ultimo = 0
+        self.filas = 0
+
+    def __call__(self, procesadas, total=None, *extra):
+        self.filas = procesadas
+        ahora = time.perf_counter()
+        if ahora - self.ultimo < self.intervalo:
+            return
+        self.ultimo = ahora
+        de_total = f"/{total}" if total else ""
+        print(f"\r{procesadas}{de_total} {self.unidad}  {self.velocidad():,.0f} {self.unidad}/s", end="", file=sys.stderr, flush=True)
+
+    def duracion(self):
+        return time.perf_counter() - self.inicio
+
+    def velocidad(self):
+        return self.filas / max(self.duracion(), 1e-9)
+
+    def resumen(self, filas):
+        self.filas = filas
+        if self.ultimo:
+            print(file=sys.stderr)
+        return f"{filas} {self.unidad} en {self.duracion():.2f} s ({self.velocidad():,.0f} {self.unidad}/s)"
+
+def fecha(texto):
+    try:
+        return datetime.strptime(texto, "%d/%m/%Y").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"fecha inválida '{texto}', use dd/mm/aaaa")
+
+def cmd_importar_productos(args):
+    avance = Avance()
+    conteo = importar_productos_archivo(args.archivo, progreso=avance)
+    procesadas = sum(conteo.values())
+    print(avance.resumen(procesadas))
+    print(f"Agregados: {conteo['agregados']}  Actualizados: {conteo['actualizados']}  Omitidos: {conteo['omitidos']}")
+
+def cmd_exportar_importaciones(args):
+    filtros = {
+        "importacion_no": args.importacion,
+        "codebar": args.codebar,
+        "fecha_desde": args.desde,
+        "fecha_hasta": args.hasta,
+    }
+    avance = Avance()
+    exportadas = exportar_importaciones(args.archivo, filtros, progreso=avance, con_archivo=args.con_archivo)
+    if not exportadas:
+        print("No hay importaciones que coincidan con los filtros; no se creó el archivo.")
+        return
+    print(avance.resumen(exportadas))
+
+def cmd_exportar_cambios(args):
+    avance = Avance()
+    filas, desde, hasta = cambios.exportar_cambios(args.archivo, args.consumidor, args.desde,
+                                                   avanzar=not args.sin_avanzar, progreso=avance)
+    print(avance.resumen(filas))
+    tramo = "exportación completa" if desde is None else f"cambios {desde + 1}..{hasta}"
+    print(f"{args.consumidor}: {tramo}")
+    if not args.sin_avanzar:
+        print(f"Punto de control: {hasta}")
+
+def cmd_cambios(args):
+    if args.reiniciar:
+        cambios.reiniciar_consumidor(args.reiniciar)
+        print(f"La próxima exportación de {args.reiniciar} será completa.")
+    if args.quitar and not cambios.quitar_consumidor(args.quitar):
+        raise ValueError(f"No hay un consumidor {args.quitar}")
+    registrados = cambios.consumidores()
+    if not registrados:
+        print("No hay consumidores registrados: el diario de cambios está apagado.")
+    for consumidor, seq, pendientes in registrados:
+        estado = "pendiente de exportación completa" if seq < 0 else f"punto de control {seq}"
+        print(f"{consumidor}: {estado}, {pendientes} cambios sin exportar")
+
+def cmd_reporte_stock(args):
+    avance = Avance()
+    print(avance.resumen(exportar_stock(args.archivo, progreso=avance)))
+
+def cmd_reporte_vencimientos(args):
+    avance = Avance()
+    print(avance.resumen(exportar_vencimientos(args.archivo, args.dias, progreso=avance)))
+
+def cmd_decodificar_lote(args):
+    from lote_codigos import leer_lote, cargar_en_importacion
+    avance = Avance(unidad="cuadros")
+    resultado = leer_lote(args.ruta, procesos=args.procesos, por_segundo=args.cuadros_por_segundo, progreso=avance)
+    print(avance.resumen(resultado.procesados))
+    for codigo, cantidad in sorted(resultado.conteos.items()):
+        cuadros = resultado.cuadros[codigo]
+        print(f"{codigo}\t{cantidad}\t{', '.join(cuadros[:3])}{' ...' if len(cuadros) > 3 else ''}")
+    if resultado.sin_codigo:
+        print(f"{len(resultado.sin_codigo)} imágenes sin códigos legibles")
+    if args.importacion:
+        fecha_expira = args.expira.strftime("%d/%m/%Y") if args.expira else ""
+        ids, desconocidos = cargar_en_importacion(resultado, args.importacion, args.lote, fecha_expira)
+        print(f"{len(ids)} líneas agregadas a la importación {args.importacion}")
+        if desconocidos:
+            print(f"Códigos sin producto registrado (no se agregaron): {', '.join(desconocidos)}")
+
+def cmd_conciliar(args):
+    avance = Avance()
+    resultado = conciliar_manifiesto(args.manifiesto, args.importacion, progreso=avance)
+    print(avance.resumen(resultado.filas_manifiesto))
+    if resultado.omitidas:
+        print(f"{resultado.omitidas} filas del manifiesto omitidas (sin codebar o con cantidad inválida)")
+    print("  ".join(f"{estado.capitalize()}: {resultado.conteos[estado]}" for estado in ESTADOS))
+    if args.salida:
+        escritas = exportar_conciliacion(args.salida, resultado, solo_diferencias=args.solo_diferencias)
+        print(f"{escritas} líneas escritas en {args.salida}")
+    else:
+        for estado, codebar, lote, esperada, recibida, diferencia in resultado.diferencias:
+            print(f"{estado}\t{codebar}\t{lote}\t{esperada}\t{recibida}\t{diferencia:+d}")
+    return 1 if resultado.diferencias else 0
+
+def cmd_archivar(args):
+    corte = args.antes_de or date.today() - timedelta(days=args.dias)
+    avance = Avance()
+    archivadas = archivar(corte, progreso=avance)
+    if not archivadas:
+        print(f"No hay importaciones sin actividad desde el {corte:%d/%m/%Y}.")
+        return
+    print(avance.resumen(sum(archivadas.values())))
+    for periodo, lineas in sorted(archivadas.items()):
+        print(f"{periodo}: {lineas} líneas en {archivo_de(periodo)}")
+
+def cmd_respaldar(args):
+    inicio = time.perf_counter()
+    carpeta = respaldar(args.destino)
+    print(f"Respaldo en {carpeta} ({time.perf_counter() - inicio:.2f} s)")
+
+def cmd_restaurar(args):
+    anterior = restaurar(args.carpeta)
+    print(f"Restaurado desde {args.carpeta}. El estado anterior quedó en {anterior}.")
+
+def cmd_mantenimiento(args):
+    print(f"Esquema en versión {version_esquema(datos.obtener_conexion())}")
+    if args.integridad:
+        resultado = datos.verificar_integridad()
+        print("Integridad: " + "; ".join(resultado))
+        if resultado != ["ok"]:
+            return 1
+    if args.agrupar_archivos is not None:
+        agrupado = agrupar_archivos(args.agrupar_archivos)
+        print(f"Archivos agrupados en {agrupado}" if agrupado else "No hace falta agrupar archivos")
+    if args.reconstruir_stock:
+        inicio = time.perf_counter()
+        filas = reconstruir_stock()
+        print(f"Resumen de stock reconstruido: {filas} lotes en {time.perf_counter() - inicio:.2f} s")
+    if args.optimizar:
+        inicio = time.perf_counter()
+        datos.optimizar_base()
+        print(f"Estadísticas e índices optimizados en {time.perf_counter() - inicio:.2f} s")
+    if args.compactar:
+        inicio = time.perf_counter()
+        datos.compactar_base()
+        print(f"Base compactada en {time.perf_counter() - inicio:.2f} s")
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Inventario sin interfaz gráfica.")
+    parser.add_argument("--db", default=datos.DB_NAME, help=f"archivo SQLite (por defecto {datos.DB_NAME})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("importar-productos", help="importa o actualiza productos desde .xlsx o .csv")
+    p.add_argument("archivo")
+    p.set_defaults(funcion=cmd_importar_productos)
+
+    p = sub.add_parser("exportar-importaciones", help="exporta importaciones a .xlsx o .csv")
+    p.add_argument("archivo")
+    p.add_argument("--importacion", help="solo este No. de importación")
+    p.add_argument("--codebar", help="solo este CodeBar")
+    p.add_argument("--desde", type=fecha, help="fecha de expiración desde (dd/mm/aaaa)")
+    p.add_argument("--hasta", type=fecha, help="fecha de expiración hasta (dd/mm/aaaa)")
+    p.add_argument("--con-archivo", action="store_true", help="incluye las importaciones archivadas")
+    p.set_defaults(funcion=cmd_exportar_importaciones)
+
+    p = sub.add_parser("exportar-cambios", help="exporta solo lo cambiado desde el punto de control (.xlsx, .csv o .jsonl)")
+    p.add_argument("archivo")
+    p.add_argument("--consumidor", default=cambios.CONSUMIDOR, help=f"sistema que recibe los cambios (por defecto {cambios.CONSUMIDOR})")
+    p.add_argument("--desde", type=int, help="seq desde el que exportar, en lugar del punto de control")
+    p.add_argument("--sin-avanzar", action="store_true", help="no mueve el punto de control ni compacta el diario")
+    p.set_defaults(funcion=cmd_exportar_cambios)
+
+    p = sub.add_parser("cambios", help="consumidores del diario de cambios")
+    p.add_argument("--reiniciar", metavar="CONSUMIDOR", help="la próxima exportación de ese consumidor será completa")
+    p.add_argument("--quitar", metavar="CONSUMIDOR", help="deja de anotar cambios para ese consumidor")
+    p.set_defaults(funcion=cmd_cambios)
+
+    p = sub.add_parser("reporte-stock", help="existencias por producto y lote a .xlsx o .csv")
+    p.add_argument("archivo")
+    p.set_defaults(funcion=cmd_reporte_stock)
+
+    p = sub.add_parser("reporte-vencimientos", help="lotes que vencen en los próximos días a .xlsx o .csv")
+    p.add_argument("archivo")
+    p.add_argument("--dias", type=int, default=30, help="ventana en días desde hoy (por defecto 30)")
+    p.set_defaults(funcion=cmd_reporte_vencimientos)
+
+    p = sub.add_parser("decodificar-lote", help="lee códigos de una carpeta de fotos o de un video, en paralelo")
+    p.add_argument("ruta", help="carpeta de imágenes o archivo de video")
+    p.add_argument("--procesos", type=int, help="procesos de decodificación (por defecto, uno por núcleo)")
+    p.add_argument("--cuadros-por-segundo", type=float, default=5, help="cuadros de video analizados por segundo")
+    p.add_argument("--importacion", help="agrega una línea por código leído a este No. de importación")
+    p.add_argument("--lote", default="", help="lote de las líneas agregadas")
+    p.add_argument("--expira", type=fecha, help="fecha de expiración de las líneas agregadas (dd/mm/aaaa)")
+    p.set_defaults(funcion=cmd_decodificar_lote)
+
+    p = sub.add_parser("conciliar", help="compara el manifiesto del proveedor con lo escaneado; sale con 1 si hay diferencias")
+    p.add_argument("manifiesto", help=".xlsx o .csv con columnas codebar, lote, cantidad")
+    p.add_argument("importacion", help="No. de importación")
+    p.add_argument("--salida", help="escribe el resultado en este .xlsx o .csv en lugar de mostrar las diferencias")
+    p.add_argument("--solo-diferencias", action="store_true", help="en --salida, omite las líneas que coinciden")
+    p.set_defaults(funcion=cmd_conciliar)
+
+    p = sub.add_parser("archivar", help="mueve las importaciones sin actividad reciente a archivos por año")
+    corte = p.add_mutually_exclusive_group()
+    corte.add_argument("--dias", type=int, default=365, help="sin actividad en los últimos N días (por defecto 365)")
+    corte.add_argument("--antes-de", type=fecha, help="sin actividad desde esta fecha (dd/mm/aaaa)")
+    p.set_defaults(funcion=cmd_archivar)
+
+    p = sub.add_parser("respaldar", help="copia coherente de la base y los archivos sin detener a las estaciones")
+    p.add_argument("--destino", help="carpeta a crear (por defecto respaldos/AAAAMMDD-HHMMSS junto a la base)")
+    p.set_defaults(funcion=cmd_respaldar)
+
+    p = sub.add_parser("restaurar", help="vuelve la base y los archivos al estado de un respaldo")
+    p.add_argument("carpeta", help="carpeta creada por respaldar")
+    p.set_defaults(funcion=cmd_restaurar)
+
+    p = sub.add_parser("mantenimiento", help="migra el esquema y opcionalmente verifica, optimiza o compacta")
+    p.add_argument("--integridad", action="store_true", help="ejecuta PRAGMA integrity_check")
+    p.add_argument("--agrupar-archivos", type=int, nargs="?", const=0, metavar="MAXIMO",
+                   help="junta los archivos más antiguos en uno hasta que queden MAXIMO (por defecto, los que se pueden adjuntar)")
+    p.add_argument("--reconstruir-stock", action="store_true", help="recalcula el resumen de stock por producto y lote")
+    p.add_argument("--optimizar", action="store_true", help="actualiza estadísticas y optimiza el índice de texto")
+    p.add_argument("--compactar", action="store_true", help="VACUUM y vaciado del WAL")
+    p.set_defaults(funcion=cmd_mantenimiento)
+    return parser
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    datos.DB_NAME = args.db
+    try:
+        datos.init_db()
+        return args.funcion(args) or 0
+    except (FormatoIncorrecto, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("\nCancelado.", file=sys.stderr)
+        return 130
+    finally:
+        datos.cerrar_conexiones()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import quote, urlencode, urlsplit
+
+import datos
+
+# Cliente de servidor_sync.py con las mismas funciones (y argumentos) que datos.py
+# usa la interfaz, para que InventarioApp y AgregarProducto trabajen igual contra
+# la base local o contra el servidor compartido.
+ARCHIVO_PENDIENTES = "pendientes_sync.jsonl"
+# Envíos que el servidor rechazó por su contenido: salen de la cola para no frenar a
+# los siguientes y quedan acá para revisarlos a mano.
+ARCHIVO_RECHAZADOS = "rechazados_sync.jsonl"
+# Estados con los que el servidor rechaza el pedido en sí (ver servidor_sync.py);
+# reenviarlo igual daría lo mismo. Cualquier otro error puede ser pasajero.
+ESTADOS_RECHAZO = (400, 422)
+
+class ErrorSincronizacion(ConnectionError):
+    pass
+
+class ErrorServidor(Exception):
+    def __init__(self, mensaje, estado=None):
+        super().__init__(mensaje)
+        self.estado = estado
+
+    @property
+    def rechazo(self):
+        return self.estado in ESTADOS_RECHAZO
+
+class ClienteSync:
+    def __init__(self, url, clave=None, timeout=5, reintentos=2, archivo_pendientes=ARCHIVO_PENDIENTES,
+                 intervalo_reintento=5, archivo_rechazados=ARCHIVO_RECHAZADOS):
+        partes = urlsplit(url)
+        self.url = url
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.clave = clave
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.archivo_pendientes = archivo_pendientes
+        self.intervalo_reintento = intervalo_reintento
+        self.archivo_rechazados = archivo_rechazados
+        # Una conexión HTTP/1.1 persistente por hilo (la interfaz y el ejecutor de escrituras).
+        self._local = threading.local()
+        # Caché de productos: se vacía cuando el servidor informa otra versión de productos.
+        self._productos = {}
+        self._version = None
+        self._lock = threading.Lock()
+        # Envíos de líneas que no llegaron al servidor, en orden; sobreviven a un reinicio.
+        self._pendientes = self._leer_pendientes()
+        self._rechazados = sum(len(envio["lineas"]) for envio in self._leer_rechazados())
+        self._despertar = threading.Event()
+        threading.Thread(target=self._reintentar, name="reintentos_sync", daemon=True).start()
+
+    @property
+    def pendientes(self):
+        with self._lock:
+            return sum(len(lineas) for _, lineas in self._pendientes)
+
+    @property
+    def rechazados(self):
+        with self._lock:
+            return self._rechazados
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+        return conn
+
+    def _cerrar_conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _pedir(self, metodo, ruta, params=None, cuerpo=None, reintentable=None):
+        # Solo se reintenta lo que se puede repetir sin efecto: lecturas, PUT y DELETE,
+        # y los envíos de líneas (el servidor recuerda su id_envio). Un POST sin reintento
+        # va por una conexión nueva, que el servidor no puede haber cerrado por inactiva.
+        if reintentable is None:
+            reintentable = metodo != "POST"
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        if params:
+            ruta = f"{ruta}?{urlencode(params)}"
+        encabezados = {"Content-Type": "application/json"}
+        if self.clave:
+            encabezados["X-Clave"] = self.clave
+        crudo = None if cuerpo is None else json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        intentos = self.reintentos + 1 if reintentable else 1
+        if not reintentable:
+            self._cerrar_conexion()
+        for intento in range(intentos):
+            conn = self._conexion()
+            try:
+                conn.request(metodo, ruta, body=crudo, headers=encabezados)
+                respuesta = conn.getresponse()
+                contenido = respuesta.read()
+            except (OSError, http.client.HTTPException) as e:
+                # El servidor pudo cerrar la conexión persistente: se abre otra y se reintenta.
+                self._cerrar_conexion()
+                if intento == intentos - 1:
+                    raise ErrorSincronizacion(f"No se pudo conectar con {self.url}: {e}") from e
+                time.sleep(0.2 * 2 ** intento)
+                continue
+            self._ver_version(respuesta.getheader("X-Version-Productos"))
+            resultado = json.loads(contenido) if contenido else {}
+            if respuesta.status != 200:
+                raise ErrorServidor(resultado.get("error", respuesta.reason), respuesta.status)
+            return resultado
+
+    def _ver_version(self, version):
+        with self._lock:
+            if version != self._version:
+                self._productos.clear()
+                self._version = version
+
+    def buscar_producto_por_codebar(self, codebar):
+        producto = self._productos.get(codebar)
+        if producto is not None:
+            return producto
+        producto = self._pedir("GET", f"/productos/{quote(codebar, safe='')}")["producto"]
+        if producto is None:
+            return None
+        producto = tuple(producto)
+        with self._lock:
+            self._productos[codebar] = producto
+        return producto
+
+    def sugerir_productos(self, texto, limite=8):
+        sugerencias = self._pedir("GET", f"/productos?sugerir={quote(texto, safe='')}&limite={limite}")["sugerencias"]
+        return [(motivo, tuple(producto)) for motivo, producto in sugerencias]
+
+    def agregar_producto(self, codebar, sku, marca, producto):
+        return self._pedir("POST", "/productos", cuerpo={"producto": [codebar, sku, marca, producto]})["agregado"]
+
+    def editar_producto(self, codebar, sku, marca, producto):
+        self._pedir("PUT", f"/productos/{quote(codebar, safe='')}", cuerpo={"producto": [sku, marca, producto]})
+
+    def agregar_importacion(self, *linea):
+        # Devuelve el rowid, o None si la línea quedó en la cola de reintentos.
+        ids = self.agregar_importaciones([linea])
+        return ids[0] if ids else None
+
+    def agregar_importaciones(self, lineas, sesion=None):
+        # La sesión de recepción, si la hay, sirve de id_envio: confirmarla otra vez no duplica.
+        envio = (sesion or uuid.uuid4().hex, [list(linea) for linea in lineas])
+        with self._lock:
+            en_espera = bool(self._pendientes)
+        # Con envíos en espera, los nuevos van detrás para conservar el orden de llegada.
+        # Un rechazo se informa en el momento; cualquier otro error deja el envío en cola.
+        if not en_espera:
+            try:
+                return self._enviar(*envio)
+            except ErrorSincronizacion:
+                pass
+            except ErrorServidor as e:
+                if e.rechazo:
+                    raise
+        with self._lock:
+            self._pendientes.append(envio)
+            with open(self.archivo_pendientes, "a", encoding="utf-8") as f:
+                f.write(json.dumps(envio, ensure_ascii=False) + "\n")
+        self._despertar.set()
+        return None
+
+    def recepcion_confirmada(self, sesion):
+        # También si la sesión todavía espera en la cola: ya no hay que volver a guardarla.
+        with self._lock:
+            if any(id_envio == sesion for id_envio, _ in self._pendientes):
+                return True
+        return self._pedir("GET", f"/recepciones/{quote(sesion, safe='')}")["confirmada"]
+
+    def _enviar(self, id_envio, lineas):
+        # El servidor recuerda id_envio: reenviar algo que sí llegó no duplica las líneas.
+        return self._pedir("POST", "/importaciones", cuerpo={"id_envio": id_envio, "lineas": lineas},
+                           reintentable=True)["ids"]
+
+    def _leer_pendientes(self):
+        if not os.path.exists(self.archivo_pendientes):
+            return []
+        with open(self.archivo_pendientes, encoding="utf-8") as f:
+            return [tuple(json.loads(linea)) for linea in f if linea.strip()]
+
+    def _leer_rechazados(self):
+        if not os.path.exists(self.archivo_rechazados):
+            return []
+        with open(self.archivo_rechazados, encoding="utf-8") as f:
+            return [json.loads(linea) for linea in f if linea.strip()]
+
+    def _rechazar(self, envio, error):
+        # Con el lock tomado.
+        registro = {"id_envio": envio[0], "lineas": envio[1], "error": str(error), "estado": error.estado,
+                    "fecha": datetime.now().isoformat(timespec="seconds")}
+        with open(self.archivo_rechazados, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self._rechazados += len(envio[1])
+
+    def _guardar_pendientes(self):
+        temporal = self.archivo_pendientes + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            for envio in self._pendientes:
+                f.write(json.dumps(envio, ensure_ascii=False) + "\n")
+        os.replace(temporal, self.archivo_pendientes)
+
+    def _reintentar(self):
+        while True:
+            self._despertar.wait(self.intervalo_reintento)
+            self._despertar.clear()
+            while True:
+                with self._lock:
+                    if not self._pendientes:
+                        break
+                    envio = self._pendientes[0]
+                rechazo = None
+                try:
+                    self._enviar(*envio)
+                except ErrorSincronizacion:
+                    time.sleep(self.intervalo_reintento)
+                    continue
+                except ErrorServidor as e:
+                    if not e.rechazo:
+                        # Error del servidor (p. ej. base bloqueada): el envío sigue primero en la cola.
+                        time.sleep(self.intervalo_reintento)
+                        continue
+                    rechazo = e
+                with self._lock:
+                    if rechazo is not None:
+                        self._rechazar(envio, rechazo)
+                    self._pendientes.pop(0)
+                    self._guardar_pendientes()
+
+    def actualizar_importacion(self, rowid, *linea):
+        self._pedir("PUT", f"/importaciones/{rowid}", cuerpo={"linea": list(linea)})
+
+    def eliminar_importacion_por_rowid(self, rowid):
+        self._pedir("DELETE", f"/importaciones/{rowid}")
+
+    def contar_importaciones(self, despues_de_rowid=0, busqueda=None):
+        return self._pedir("GET", "/importaciones/conteo", {"despues_de": despues_de_rowid, "busqueda": busqueda})["total"]
+
+    def max_rowid_importaciones(self):
+        return self._pedir("GET", "/importaciones/max_rowid")["max_rowid"]
+
+    def buscar_importaciones_pagina(self, despues_de_rowid, limite, busqueda=None):
+        filas = self._pedir("GET", "/importaciones", {"despues_de": despues_de_rowid, "limite": limite,
+                                                      "busqueda": busqueda})["filas"]
+        return [tuple(fila) for fila in filas]
+
+    def rowid_importacion_en_posicion(self, despues_de_rowid, desplazamiento, busqueda=None):
+        return self._pedir("GET", "/importaciones/posicion", {"despues_de": despues_de_rowid,
+                                                              "desplazamiento": desplazamiento,
+                                                              "busqueda": busqueda})["rowid"]
+
+    def buscar_importacion_por_rowid(self, rowid, busqueda=None):
+        fila = self._pedir("GET", f"/importaciones/{rowid}", {"busqueda": busqueda})["fila"]
+        return None if fila is None else tuple(fila)
+
+def fuente_de_datos():
+    # Con INVENTARIO_SERVIDOR=http://host:puerto la estación trabaja contra el
+    # servidor de sincronización; sin ella, contra productos.db local.
+    url = os.environ.get("INVENTARIO_SERVIDOR")
+    if not url:
+        return datos
+    return ClienteSync(url, clave=os.environ.get("INVENTARIO_CLAVE_SYNC"))
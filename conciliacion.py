@@ -0,0 +1,169 @@
+import os
+from operator import itemgetter
+
+import datos
+from exportador import crear_escritor
+from importador import FormatoIncorrecto, abrir_lector
+from metricas import medido, contar
+
+# Conciliación del manifiesto (packing list) del proveedor contra lo escaneado en
+# una importación. Las dos partes se cruzan por (codebar, lote) con diccionarios
+# en memoria: una pasada por el archivo, una consulta agrupada y una pasada por
+# cada diccionario, sin SQL por línea.
+
+COLUMNAS_MANIFIESTO = ("codebar", "lote", "cantidad")
+COINCIDE, FALTANTE, SOBRANTE, INESPERADO = "coincide", "faltante", "sobrante", "inesperado"
+ESTADOS = (FALTANTE, SOBRANTE, INESPERADO, COINCIDE)
+ENCABEZADOS_CONCILIACION = ("Estado", "CodeBar", "SKU", "Marca", "Producto", "Lote",
+                            "Cantidad Manifiesto", "Cantidad Recibida", "Diferencia")
+AVISO_CADA = 5000
+
+class ResultadoConciliacion:
+    def __init__(self, importacion_no):
+        self.importacion_no = importacion_no
+        # (estado, codebar, lote, esperada, recibida, diferencia); diferencia = recibida - esperada.
+        self.lineas = []
+        self.conteos = dict.fromkeys(ESTADOS, 0)
+        self.filas_manifiesto = 0
+        self.omitidas = 0
+        # {codebar: (sku, marca, producto, codebar)}, ver resolver_productos.
+        self.productos = None
+
+    @property
+    def diferencias(self):
+        return [linea for linea in self.lineas if linea[0] != COINCIDE]
+
+def _texto(valor):
+    # Excel entrega los códigos y lotes numéricos como int o float (7401234567890.0).
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+def _cantidad(valor):
+    if isinstance(valor, int):
+        numero = valor
+    else:
+        numero = float(str(valor).strip().replace(",", ""))
+        if not numero.is_integer():
+            raise ValueError(valor)
+        numero = int(numero)
+    if numero < 0:
+        raise ValueError(valor)
+    return numero
+
+def leer_manifiesto(lector, progreso=None):
+    # Suma las cantidades por (codebar, lote); un mismo lote puede venir repartido en
+    # varias filas (una por tarima o caja). Devuelve (esperado, filas, omitidas).
+    filas = iter(lector)
+    headers = [_texto(h).lower() for h in next(filas, None) or ()]
+    try:
+        i_codebar, i_lote, i_cantidad = (headers.index(col) for col in COLUMNAS_MANIFIESTO)
+    except ValueError:
+        raise FormatoIncorrecto("El manifiesto debe tener columnas: codebar, lote, cantidad (en la primera fila)")
+    total = (lector.total or 1) - 1 or None
+    esperado = {}
+    procesadas = omitidas = 0
+    for fila in filas:
+        procesadas += 1
+        try:
+            codebar, lote, cantidad = fila[i_codebar], fila[i_lote], fila[i_cantidad]
+            # Camino rápido para el CSV, donde todo llega como texto.
+            codebar = codebar.strip() if codebar.__class__ is str else _texto(codebar)
+            lote = lote.strip() if lote.__class__ is str else _texto(lote)
+            cantidad = int(cantidad) if cantidad.__class__ is str and cantidad.isdigit() else _cantidad(cantidad)
+        except (IndexError, ValueError, TypeError):
+            omitidas += 1
+            continue
+        if not codebar:
+            omitidas += 1
+            continue
+        clave = (codebar, lote)
+        esperado[clave] = esperado.get(clave, 0) + cantidad
+        if progreso and procesadas % AVISO_CADA == 0:
+            progreso(procesadas, total)
+    if progreso:
+        progreso(procesadas, total)
+    return esperado, procesadas, omitidas
+
+def cruzar(esperado, recibido, resultado):
+    # Ambos lados son diccionarios (codebar, lote) -> cantidad. Cada clave recibida se
+    # busca en `esperado`; las de `esperado` que no se recibieron salen de la
+    # diferencia de claves. Cada estado se ordena por separado.
+    grupos = {estado: [] for estado in ESTADOS}
+    coincide, faltante, sobrante, inesperado = (grupos[e].append for e in (COINCIDE, FALTANTE, SOBRANTE, INESPERADO))
+    for clave, cantidad in recibido.items():
+        esperada = esperado.get(clave)
+        codebar, lote = clave
+        if esperada is None:
+            inesperado((INESPERADO, codebar, lote, 0, cantidad, cantidad))
+        elif cantidad == esperada:
+            coincide((COINCIDE, codebar, lote, esperada, cantidad, 0))
+        elif cantidad > esperada:
+            sobrante((SOBRANTE, codebar, lote, esperada, cantidad, cantidad - esperada))
+        else:
+            faltante((FALTANTE, codebar, lote, esperada, cantidad, cantidad - esperada))
+    for clave in esperado.keys() - recibido.keys():
+        esperada = esperado[clave]
+        faltante((FALTANTE, clave[0], clave[1], esperada, 0, -esperada))
+    for estado in ESTADOS:
+        lineas = grupos[estado]
+        lineas.sort(key=itemgetter(1, 2))
+        resultado.conteos[estado] = len(lineas)
+        resultado.lineas.extend(lineas)
+    return resultado
+
+def recibido_de_importacion(importacion_no, pendientes=()):
+    # Lo guardado en la base más las líneas de una sesión de recepción todavía sin
+    # confirmar (con la forma de los argumentos de agregar_importacion).
+    recibido = {}
+    for codebar, lote, cantidad in datos.recibido_por_lote(importacion_no):
+        # NULL y '' agrupan por separado en SQL pero aquí son la misma clave.
+        clave = (codebar or "", lote or "")
+        recibido[clave] = recibido.get(clave, 0) + int(cantidad)
+    for linea in pendientes:
+        if linea[0] == importacion_no:
+            clave = (linea[4] or "", linea[5] or "")
+            recibido[clave] = recibido.get(clave, 0) + int(linea[7])
+    return recibido
+
+@medido
+def conciliar_manifiesto(ruta, importacion_no, pendientes=(), progreso=None):
+    resultado = ResultadoConciliacion(importacion_no)
+    with abrir_lector(ruta) as lector:
+        esperado, resultado.filas_manifiesto, resultado.omitidas = leer_manifiesto(lector, progreso)
+    cruzar(esperado, recibido_de_importacion(importacion_no, pendientes), resultado)
+    resolver_productos(resultado)
+    contar("conciliacion.filas", resultado.filas_manifiesto)
+    return resultado
+
+def resolver_productos(resultado):
+    # Los productos de todas las líneas de una vez, en el mismo hilo que concilia: quien
+    # muestra o exporta el resultado ya no consulta la base por cada línea.
+    resultado.productos = datos.buscar_productos_por_codebars({linea[1] for linea in resultado.lineas})
+    return resultado
+
+def fila_con_producto(linea, productos):
+    # Agrega sku, marca y producto de `productos` (ver resolver_productos), en el orden de ENCABEZADOS_CONCILIACION.
+    estado, codebar, lote, esperada, recibida, diferencia = linea
+    sku, marca, producto, _ = productos.get(codebar) or ("", "", "", codebar)
+    return (estado, codebar, sku, marca, producto, lote, esperada, recibida, diferencia)
+
+@medido
+def exportar_conciliacion(ruta, resultado, solo_diferencias=False):
+    lineas = resultado.diferencias if solo_diferencias else resultado.lineas
+    if resultado.productos is None:
+        resolver_productos(resultado)
+    escritor = crear_escritor(ruta, "Conciliación")
+    try:
+        escritor.escribir(ENCABEZADOS_CONCILIACION)
+        for linea in lineas:
+            escritor.escribir(fila_con_producto(linea, resultado.productos))
+        escritor.cerrar()
+    except BaseException:
+        escritor.descartar()
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+    return len(lineas)
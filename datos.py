@@ -0,0 +1,501 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from time import monotonic
+
+from metricas import medido
+from migraciones import migrar, agregar_vocabulario, INDEXAR_PENDIENTES, LLENAR_TRIGRAMAS
+import sugerencias
+
+DB_NAME = 'productos.db'
+DELETE_PASSWORD = 'admin123'
+DIAS_ALERTA_VENCIMIENTO = 30
+
+# WAL permite lecturas concurrentes mientras se escribe; con WAL, synchronous=NORMAL
+# sigue siendo seguro ante caídas de la aplicación y evita un fsync por commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()
+_conexiones = []
+_lock_conexiones = threading.Lock()
+
+def conectar(ruta=None, uri=False):
+    # isolation_level=None: las transacciones se abren explícitamente con transaccion().
+    conn = sqlite3.connect(ruta or DB_NAME, isolation_level=None, check_same_thread=False, cached_statements=256, uri=uri)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def obtener_conexion(variante=None, abrir=conectar):
+    # Una conexión persistente por hilo y por archivo de base de datos. `variante`
+    # distingue conexiones al mismo archivo que `abrir` prepara de otra forma (p. ej.
+    # con los archivos históricos adjuntos, ver archivo.py).
+    conexiones = getattr(_local, 'conexiones', None)
+    if conexiones is None:
+        conexiones = _local.conexiones = {}
+    clave = DB_NAME if variante is None else (DB_NAME, variante)
+    conn = conexiones.get(clave)
+    if conn is None:
+        conn = conexiones[clave] = abrir(DB_NAME)
+        with _lock_conexiones:
+            _conexiones.append(conn)
+    return conn
+
+def cerrar_conexiones():
+    with _lock_conexiones:
+        for conn in _conexiones:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _conexiones.clear()
+    _local.__dict__.clear()
+
+def cerrar_conexion_hilo():
+    # Para hilos de corta vida (p. ej. uno por cliente en servidor_sync).
+    conexiones = getattr(_local, 'conexiones', None) or {}
+    with _lock_conexiones:
+        for conn in conexiones.values():
+            if conn in _conexiones:
+                _conexiones.remove(conn)
+            conn.close()
+    conexiones.clear()
+
+@contextmanager
+def transaccion():
+    conn = obtener_conexion()
+    if conn.in_transaction:
+        # Transacción anidada: la confirma o revierte el bloque exterior.
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.execute('ROLLBACK')
+        # Lo escrito en la caché durante la transacción ya no es válido.
+        cache_productos.invalidar()
+        raise
+    else:
+        conn.execute('COMMIT')
+
+class CacheProductos:
+    # Índice en memoria de productos por codebar. Si el catálogo cabe en
+    # `max_precarga` se carga completo con una sola consulta y toda búsqueda se
+    # responde sin leer la tabla (incluso las de códigos inexistentes); si no, funciona
+    # como LRU acotado. Las escrituras de este módulo la mantienen al día. Como mucho
+    # cada `intervalo_revision` segundos una búsqueda lee productos_version (una fila):
+    # si otro proceso cambió productos, lo guardado se descarta y se vuelve a cargar.
+    # Entre revisiones un acierto es solo una consulta al diccionario.
+    def __init__(self, max_precarga=300000, max_lru=50000, intervalo_revision=0.5):
+        self.max_precarga = max_precarga
+        self.max_lru = max_lru
+        self.intervalo_revision = intervalo_revision
+        self._proxima_revision = 0.0
+        self.aciertos = 0
+        self.fallos = 0
+        self.recargas = 0
+        self._productos = None
+        self._completo = False
+        self._version = 0
+        # Valor de productos_version con el que coincide lo guardado.
+        self._version_bd = None
+        self._lock = threading.Lock()
+
+    def _version_en_bd(self, conn):
+        return conn.execute('SELECT version FROM productos_version').fetchone()[0]
+
+    def precargar(self):
+        with self._lock:
+            version = self._version
+        conn = obtener_conexion()
+        # Se lee antes que las filas: si alguien escribe entre medio, la próxima
+        # búsqueda vuelve a cargar.
+        version_bd = self._version_en_bd(conn)
+        self._proxima_revision = monotonic() + self.intervalo_revision
+        total = conn.execute('SELECT count(*) FROM productos').fetchone()[0]
+        completo = total <= self.max_precarga
+        if completo:
+            productos = {row[3]: row for row in conn.execute('SELECT sku, marca, producto, codebar FROM productos')}
+        else:
+            productos = OrderedDict()
+        with self._lock:
+            # Si hubo una escritura mientras se leía, esta copia puede estar vieja.
+            if self._version == version:
+                self._productos = productos
+                self._completo = completo
+                self._version_bd = version_bd
+                self.recargas += 1
+        return productos, completo
+
+    def buscar(self, codebar):
+        productos, completo = self._productos, self._completo
+        if productos is not None and monotonic() >= self._proxima_revision:
+            self._proxima_revision = monotonic() + self.intervalo_revision
+            if self._version_en_bd(obtener_conexion()) != self._version_bd:
+                self.invalidar()
+                productos = None
+        if productos is None:
+            productos, completo = self.precargar()
+        if completo:
+            self.aciertos += 1
+            return productos.get(codebar)
+        with self._lock:
+            if codebar in productos:
+                productos.move_to_end(codebar)
+                self.aciertos += 1
+                return productos[codebar]
+        self.fallos += 1
+        producto = obtener_conexion().execute(
+            'SELECT sku, marca, producto, codebar FROM productos WHERE codebar=?', (codebar,)
+        ).fetchone()
+        with self._lock:
+            if self._productos is productos:
+                productos[codebar] = producto
+                if len(productos) > self.max_lru:
+                    productos.popitem(last=False)
+        return producto
+
+    def actualizar(self, codebar, producto):
+        # Después de una escritura propia, que sumó uno a productos_version. Si sumó más,
+        # también escribió otro proceso (u otro hilo): la próxima búsqueda recarga.
+        version_bd = self._version_en_bd(obtener_conexion())
+        with self._lock:
+            self._version += 1
+            if self._productos is not None:
+                self._productos[codebar] = producto
+                if self._version_bd == version_bd - 1:
+                    self._version_bd = version_bd
+
+    def invalidar(self):
+        with self._lock:
+            self._version += 1
+            self._productos = None
+
+    def estadisticas(self):
+        productos = self._productos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "recargas": self.recargas,
+            "en_memoria": len(productos) if productos is not None else 0,
+            "completo": self._completo,
+        }
+
+cache_productos = CacheProductos()
+
+# Columnas de importaciones_detalle en el orden que usan la tabla y las exportaciones.
+COLUMNAS_IMPORTACION = ("id, importacion_no, sku, marca, producto, codebar, lote, fecha_expira, "
+                        "cant_recibida, cant_rechazada, cant_aceptada, observaciones")
+
+def init_db():
+    migrar(obtener_conexion())
+    # Lo que quedó pendiente si una importación se cortó antes de indexar.
+    indexar_trigramas()
+    cache_productos.invalidar()
+
+def fecha_a_iso(fecha_expira):
+    # La interfaz trabaja con dd/mm/aaaa; en la base se guarda aaaa-mm-dd o NULL.
+    if not fecha_expira:
+        return None
+    return datetime.strptime(fecha_expira, '%d/%m/%Y').date().isoformat()
+
+@medido
+def buscar_producto_por_codebar(codebar):
+    return cache_productos.buscar(codebar)
+
+@medido
+def buscar_productos_por_codebars(codebars):
+    # {codebar: (sku, marca, producto, codebar)} de los que existen: una consulta IN por
+    # tanda de códigos en lugar de una búsqueda por código.
+    claves = list(codebars)
+    conn = obtener_conexion()
+    productos = {}
+    for i in range(0, len(claves), sugerencias.TAMANO_LOTE_CLAVES):
+        lote = claves[i:i + sugerencias.TAMANO_LOTE_CLAVES]
+        for fila in conn.execute(
+                f'SELECT sku, marca, producto, codebar FROM productos WHERE codebar IN ({",".join("?" * len(lote))})', lote):
+            productos[fila[3]] = fila
+    return productos
+
+def indexar_trigramas():
+    # Pasa al índice de trigramas los productos agregados, editados o borrados desde la
+    # última vez (ver migraciones._v10_trigramas_productos).
+    conn = obtener_conexion()
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_trigramas_pendientes'").fetchone() is None:
+        return
+    if conn.execute('SELECT 1 FROM productos_trigramas_pendientes LIMIT 1').fetchone():
+        with transaccion():
+            agregar_vocabulario(conn, conn.execute('''
+                SELECT p.producto, p.marca FROM productos_trigramas_pendientes x JOIN productos p ON p.rowid = x.id
+            ''').fetchall())
+            for sentencia in INDEXAR_PENDIENTES:
+                conn.execute(sentencia)
+
+@medido
+def sugerir_productos(texto, limite=sugerencias.LIMITE):
+    # Para un CodeBar que no existe tal cual (ver sugerencias.py). Solo lee: el índice
+    # de trigramas lo ponen al día las escrituras de productos.
+    return sugerencias.sugerir(obtener_conexion(), texto, limite)
+
+@medido
+def agregar_producto(codebar, sku, marca, producto):
+    with transaccion() as conn:
+        try:
+            conn.execute('INSERT INTO productos VALUES (?,?,?,?)', (codebar, sku, marca, producto))
+        except sqlite3.IntegrityError:
+            return False
+        indexar_trigramas()
+    cache_productos.actualizar(codebar, (sku, marca, producto, codebar))
+    return True
+
+@medido
+def editar_producto(codebar, sku, marca, producto):
+    with transaccion() as conn:
+        cur = conn.execute('UPDATE productos SET sku=?, marca=?, producto=? WHERE codebar=?', (sku, marca, producto, codebar))
+        indexar_trigramas()
+    if cur.rowcount:
+        cache_productos.actualizar(codebar, (sku, marca, producto, codebar))
+
+def _asegurar_producto(codebar, sku, marca, producto):
+    # Las líneas de importación referencian productos por codebar; si llega una
+    # línea de un producto desconocido, se registra con los datos de la línea.
+    if codebar and buscar_producto_por_codebar(codebar) is None:
+        agregar_producto(codebar, sku, marca, producto)
+
+def _texto_linea(codebar, sku, marca, producto):
+    # Una línea sin codebar guarda su propio texto; las demás lo leen del producto.
+    if codebar:
+        return None, None, None
+    return sku or '', marca or '', producto or ''
+
+@medido
+def agregar_importacion(importacion_no, sku, marca, producto, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones):
+    with transaccion() as conn:
+        _asegurar_producto(codebar, sku, marca, producto)
+        cur = conn.execute('''
+            INSERT INTO importaciones (
+                importacion_no, codebar, lote, fecha_expira,
+                cant_recibida, cant_rechazada, cant_aceptada, observaciones,
+                sku_linea, marca_linea, producto_linea
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (importacion_no, codebar, lote, fecha_a_iso(fecha_expira), cant_recibida, cant_rechazada, cant_aceptada, observaciones,
+              *_texto_linea(codebar, sku, marca, producto)))
+        return cur.lastrowid
+
+@medido
+def agregar_importaciones(lineas, sesion=None):
+    # Todas las líneas en una sola transacción. Con `sesion` la confirmación queda
+    # registrada en recepciones: confirmar dos veces la misma sesión no duplica líneas
+    # y devuelve los ids de la primera vez.
+    with transaccion() as conn:
+        if sesion is not None:
+            previa = conn.execute('SELECT primer_id, lineas FROM recepciones WHERE sesion=?', (sesion,)).fetchone()
+            if previa:
+                primer_id, cuantas = previa
+                # Sin primer_id si se confirmó antes de migraciones._v14_ids_de_recepcion.
+                return list(range(primer_id, primer_id + cuantas)) if primer_id is not None else []
+        ids = [agregar_importacion(*linea) for linea in lineas]
+        if sesion is not None:
+            # Dentro de la transacción nadie más inserta y los id son AUTOINCREMENT: los de
+            # estas líneas son consecutivos y alcanza con guardar el primero.
+            conn.execute('INSERT INTO recepciones (sesion, lineas, confirmada, primer_id) VALUES (?, ?, ?, ?)',
+                         (sesion, len(lineas), datetime.now().isoformat(timespec='seconds'), ids[0] if ids else None))
+        return ids
+
+def recepcion_confirmada(sesion):
+    return obtener_conexion().execute('SELECT 1 FROM recepciones WHERE sesion=?', (sesion,)).fetchone() is not None
+
+@medido
+def recibido_por_lote(importacion_no):
+    # (codebar, lote, cantidad recibida) de una importación, sumada por codebar y
+    # lote. Agrupa en el orden de idx_importaciones_recepcion: no se lee la tabla.
+    return obtener_conexion().execute('''
+        SELECT codebar, lote, total(cant_recibida)
+        FROM importaciones WHERE importacion_no = ?
+        GROUP BY codebar, lote
+    ''', (importacion_no,)).fetchall()
+
+@medido
+def buscar_importaciones():
+    return obtener_conexion().execute(f'SELECT {COLUMNAS_IMPORTACION} FROM importaciones_detalle ORDER BY id').fetchall()
+
+# Con `busqueda` (una expresión FTS5) las consultas recorren solo las líneas que
+# coinciden, usando el índice importaciones_fts en orden de rowid.
+_IDS_COINCIDENTES = 'SELECT rowid FROM importaciones_fts WHERE importaciones_fts MATCH ? AND rowid > ? ORDER BY rowid'
+
+@medido
+def contar_importaciones(despues_de_rowid=0, busqueda=None):
+    if busqueda:
+        return obtener_conexion().execute(
+            'SELECT count(*) FROM importaciones_fts WHERE importaciones_fts MATCH ? AND rowid > ?', (busqueda, despues_de_rowid)
+        ).fetchone()[0]
+    return obtener_conexion().execute('SELECT count(*) FROM importaciones WHERE id > ?', (despues_de_rowid,)).fetchone()[0]
+
+@medido
+def max_rowid_importaciones():
+    return obtener_conexion().execute('SELECT coalesce(max(id), 0) FROM importaciones').fetchone()[0]
+
+@medido
+def buscar_importaciones_pagina(despues_de_rowid, limite, busqueda=None):
+    # Paginación por clave (keyset): el costo no depende de cuántas filas hay antes.
+    if busqueda:
+        return obtener_conexion().execute(
+            f'SELECT {COLUMNAS_IMPORTACION} FROM importaciones_detalle WHERE id IN ({_IDS_COINCIDENTES} LIMIT ?) ORDER BY id',
+            (busqueda, despues_de_rowid, limite)
+        ).fetchall()
+    return obtener_conexion().execute(
+        f'SELECT {COLUMNAS_IMPORTACION} FROM importaciones_detalle WHERE id > ? ORDER BY id LIMIT ?', (despues_de_rowid, limite)
+    ).fetchall()
+
+@medido
+def rowid_importacion_en_posicion(despues_de_rowid, desplazamiento, busqueda=None):
+    if busqueda:
+        row = obtener_conexion().execute(
+            f'{_IDS_COINCIDENTES} LIMIT 1 OFFSET ?', (busqueda, despues_de_rowid, desplazamiento)
+        ).fetchone()
+    else:
+        row = obtener_conexion().execute(
+            'SELECT id FROM importaciones WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?', (despues_de_rowid, desplazamiento)
+        ).fetchone()
+    return row[0] if row else None
+
+@medido
+def buscar_importacion_por_rowid(rowid, busqueda=None):
+    if busqueda:
+        return obtener_conexion().execute(
+            f'SELECT {COLUMNAS_IMPORTACION} FROM importaciones_detalle WHERE id=? AND id IN '
+            '(SELECT rowid FROM importaciones_fts WHERE importaciones_fts MATCH ? AND rowid = ?)',
+            (rowid, busqueda, rowid)
+        ).fetchone()
+    return obtener_conexion().execute(f'SELECT {COLUMNAS_IMPORTACION} FROM importaciones_detalle WHERE id=?', (rowid,)).fetchone()
+
+@medido
+def actualizar_importacion(rowid, importacion_no, sku, marca, producto, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones):
+    with transaccion() as conn:
+        _asegurar_producto(codebar, sku, marca, producto)
+        texto = _texto_linea(codebar, sku, marca, producto)
+        # Una línea histórica con texto propio lo conserva mientras no cambie su codebar.
+        anterior = conn.execute('SELECT codebar, sku_linea, marca_linea, producto_linea FROM importaciones WHERE id=?',
+                                (rowid,)).fetchone()
+        if codebar and anterior and anterior[0] == codebar:
+            texto = anterior[1:]
+        conn.execute('''
+            UPDATE importaciones SET
+                importacion_no=?, codebar=?, lote=?, fecha_expira=?,
+                cant_recibida=?, cant_rechazada=?, cant_aceptada=?, observaciones=?,
+                sku_linea=?, marca_linea=?, producto_linea=?
+            WHERE id=?
+        ''', (importacion_no, codebar, lote, fecha_a_iso(fecha_expira),
+              cant_recibida, cant_rechazada, cant_aceptada, observaciones,
+              *texto, rowid))
+
+@medido
+def eliminar_importacion_por_rowid(rowid):
+    with transaccion() as conn:
+        conn.execute('DELETE FROM importaciones WHERE id=?', (rowid,))
+
+@medido
+def eliminar_todos_los_datos(password):
+    if password != DELETE_PASSWORD:
+        return False
+    with transaccion() as conn:
+        conn.execute('DELETE FROM productos')
+        conn.execute('DELETE FROM importaciones')
+        conn.execute('DELETE FROM recepciones')
+        conn.execute('DELETE FROM importaciones_actividad')
+    cache_productos.invalidar()
+    return True
+
+@medido
+def buscar_stock(codebar=None, limite=1000):
+    # Lee el resumen mantenido por disparadores (una fila por codebar y lote).
+    consulta = '''
+        SELECT s.codebar, coalesce(p.sku, ''), coalesce(p.marca, ''), coalesce(p.producto, ''), s.lote,
+               s.cant_recibida, s.cant_rechazada, s.cant_aceptada
+        FROM stock s LEFT JOIN productos p ON p.codebar = s.codebar
+    '''
+    if codebar:
+        return obtener_conexion().execute(consulta + ' WHERE s.codebar = ? ORDER BY s.lote', (codebar,)).fetchall()
+    return obtener_conexion().execute(consulta + ' ORDER BY s.codebar, s.lote LIMIT ?', (limite,)).fetchall()
+
+@medido
+def contar_stock():
+    return obtener_conexion().execute('SELECT count(*) FROM stock').fetchone()[0]
+
+def consulta_fefo(desde=None, hasta=None, hoy=None):
+    # Lotes con unidades aceptadas en orden de vencimiento (primero en vencer,
+    # primero en salir). Agrupa en el orden de idx_importaciones_fefo, así que solo
+    # se recorre el rango [desde, hasta] del índice. Devuelve (sql, params).
+    condiciones = ["i.fecha_expira IS NOT NULL"]
+    params = [(hoy or date.today()).isoformat()]
+    if desde:
+        condiciones.append("i.fecha_expira >= ?")
+        params.append(desde.isoformat())
+    if hasta:
+        condiciones.append("i.fecha_expira <= ?")
+        params.append(hasta.isoformat())
+    sql = f'''
+        SELECT strftime('%d/%m/%Y', i.fecha_expira), CAST(julianday(i.fecha_expira) - julianday(?) AS INTEGER),
+               i.codebar, coalesce(p.sku, ''), coalesce(p.marca, ''), coalesce(p.producto, ''), i.lote,
+               sum(i.cant_aceptada), count(*)
+        FROM importaciones i LEFT JOIN productos p ON p.codebar = i.codebar
+        WHERE {" AND ".join(condiciones)}
+        GROUP BY i.fecha_expira, i.codebar, i.lote
+        HAVING sum(i.cant_aceptada) > 0
+        ORDER BY i.fecha_expira, i.codebar, i.lote
+    '''
+    return sql, params
+
+@medido
+def buscar_lotes_fefo(desde=None, hasta=None, limite=1000):
+    sql, params = consulta_fefo(desde, hasta)
+    return obtener_conexion().execute(sql + ' LIMIT ?', (*params, limite)).fetchall()
+
+@medido
+def alerta_vencimientos(dias=DIAS_ALERTA_VENCIMIENTO, hoy=None):
+    # Lotes vencidos en los últimos `dias` días y lotes que vencen en los próximos
+    # `dias`: un solo recorrido acotado del índice de cobertura.
+    hoy = hoy or date.today()
+    vencidos, por_vencer = obtener_conexion().execute('''
+        SELECT total(fecha_expira < ?), total(fecha_expira >= ?)
+        FROM (
+            SELECT fecha_expira FROM importaciones
+            WHERE fecha_expira BETWEEN ? AND ?
+            GROUP BY fecha_expira, codebar, lote
+            HAVING total(cant_aceptada) > 0
+        )
+    ''', (hoy.isoformat(), hoy.isoformat(),
+          (hoy - timedelta(days=dias)).isoformat(), (hoy + timedelta(days=dias)).isoformat())).fetchone()
+    return int(vencidos), int(por_vencer)
+
+def verificar_integridad():
+    return [r[0] for r in obtener_conexion().execute('PRAGMA integrity_check')]
+
+def optimizar_base():
+    conn = obtener_conexion()
+    indexar_trigramas()
+    conn.execute('ANALYZE')
+    conn.execute('PRAGMA optimize')
+    conn.execute("INSERT INTO importaciones_fts(importaciones_fts) VALUES ('optimize')")
+
+def compactar_base():
+    # VACUUM reescribe el archivo completo; luego se vacía el WAL en el archivo principal.
+    # Puede renumerar el rowid de productos, así que el índice de trigramas se rearma.
+    conn = obtener_conexion()
+    conn.execute('VACUUM')
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_trigramas'").fetchone():
+        with transaccion():
+            conn.execute('DELETE FROM productos_trigramas')
+            conn.execute('DELETE FROM productos_trigramas_pendientes')
+            conn.execute(LLENAR_TRIGRAMAS)
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
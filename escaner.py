@@ -0,0 +1,165 @@
+from collections import deque
+
+
+# Lectores USB que se comportan como teclado: escriben el código y Enter, con
+# pocos milisegundos entre teclas. Una persona tarda bastante más entre teclas,
+# así que el intervalo separa las ráfagas del lector de lo que se escribe a mano.
+INTERVALO_MAX = 0.05
+# Una tecla escrita a mano justo antes de una ráfaga puede quedar a menos de
+# INTERVALO_MAX de ella; se separa si el intervalo que la sigue supera este mínimo y
+# el doble del intervalo típico de la ráfaga.
+INTERVALO_HUMANO_MIN = 0.02
+LARGO_MIN = 6
+TERMINADORES = ("Return", "KP_Enter")
+CAMPOS_TEXTO = ("Entry", "TEntry", "Text", "Spinbox", "TSpinbox", "TCombobox")
+
+class DetectorEscaner:
+    # Recibe cada tecla con el instante en que se pulsó (el del evento, no el de
+    # proceso: si la ventana estuvo ocupada las teclas llegan juntas pero con su
+    # hora real). Las lecturas completas quedan en `lecturas`, en orden.
+    def __init__(self, intervalo_max=INTERVALO_MAX, largo_min=LARGO_MIN):
+        self.intervalo_max = intervalo_max
+        self.largo_min = largo_min
+        self.lecturas = deque()
+        self._teclas = []
+        self._instantes = []
+        self._ultima = None
+
+    @property
+    def retenidas(self):
+        return bool(self._teclas)
+
+    def tecla(self, caracter, instante):
+        # Devuelve (texto, consumida): `texto` son teclas retenidas que resultaron ser
+        # de una persona y hay que escribir en el campo; consumida es False para un
+        # Enter escrito a mano, que debe seguir su curso.
+        texto = ""
+        if self._teclas and instante - self._ultima > self.intervalo_max:
+            texto = self.cerrar()
+        if caracter == "\n":
+            if len(self._teclas) >= self.largo_min:
+                return texto + self.cerrar(), True
+            return texto + self.cerrar(), False
+        self._teclas.append(caracter)
+        self._instantes.append(instante)
+        self._ultima = instante
+        return texto, True
+
+    def _teclas_a_mano(self):
+        # Cuántas teclas del principio de la ráfaga son de una persona: las que separa de
+        # la siguiente un intervalo mucho mayor que los del lector.
+        intervalos = [b - a for a, b in zip(self._instantes, self._instantes[1:])]
+        if len(intervalos) < 2:
+            return 0
+        limite = max(2 * sorted(intervalos)[len(intervalos) // 2], INTERVALO_HUMANO_MIN)
+        corte = 0
+        while corte < len(intervalos) and intervalos[corte] > limite:
+            corte += 1
+        return corte if len(self._teclas) - corte >= self.largo_min else 0
+
+    def cerrar(self):
+        # Termina la ráfaga en curso: si fue larga, es una lectura sin Enter al final
+        # (lector configurado sin sufijo); si no, es texto escrito a mano. Devuelve lo
+        # escrito a mano.
+        corte = self._teclas_a_mano()
+        teclas = "".join(self._teclas)
+        self._teclas = []
+        self._instantes = []
+        if len(teclas) - corte >= self.largo_min:
+            self.lecturas.append(teclas[corte:])
+            return teclas[:corte]
+        return teclas
+
+class CapturaEscaner:
+    # Conecta un DetectorEscaner a todos los widgets de una ventana, antes que sus
+    # propios eventos de teclado: las ráfagas del lector no se escriben en el campo
+    # que tenga el foco y lo escrito a mano llega a su campo con un retraso de
+    # `intervalo_max`. Cada lectura se entrega a `al_leer`, en orden. Los widgets que
+    # se crean con el modo activo se conectan al mostrarse (<Map> llega a la ventana
+    # desde cualquiera de sus widgets).
+    def __init__(self, ventana, al_leer, detector=None):
+        self.ventana = ventana
+        self.al_leer = al_leer
+        self.detector = detector or DetectorEscaner()
+        self.etiqueta = f"escaner{id(self)}"
+        self.activa = False
+        self._widget = None
+        self._serie = 0
+        self._pendiente = None
+        ventana.bind_class(self.etiqueta, "<KeyPress>", self._tecla)
+        ventana.bind("<Map>", self._al_mostrar, add="+")
+
+    def _widgets(self, widget):
+        yield widget
+        for hijo in widget.winfo_children():
+            yield from self._widgets(hijo)
+
+    def _conectar(self, raiz):
+        for widget in self._widgets(raiz):
+            etiquetas = widget.bindtags()
+            if self.etiqueta not in etiquetas:
+                widget.bindtags((self.etiqueta,) + etiquetas)
+
+    def activar(self):
+        self._conectar(self.ventana)
+        self.activa = True
+
+    def _al_mostrar(self, event):
+        # Tk entrega el nombre en texto si el widget no se creó desde Python.
+        if self.activa and hasattr(event.widget, "bindtags"):
+            self._conectar(event.widget)
+
+    def desactivar(self):
+        self._soltar()
+        for widget in self._widgets(self.ventana):
+            widget.bindtags(tuple(e for e in widget.bindtags() if e != self.etiqueta))
+        self.activa = False
+
+    def _tecla(self, event):
+        if event.keysym in TERMINADORES:
+            caracter = "\n"
+        elif event.char and event.char.isprintable() and not event.state & 0x4:
+            caracter = event.char
+        else:
+            # Tab, flechas, borrar, atajos con Ctrl: antes de que actúen se escribe lo retenido.
+            self._soltar()
+            return None
+        if self._widget is not None and event.widget is not self._widget and self.detector.retenidas:
+            self._escribir(self.detector.cerrar())
+        texto, consumida = self.detector.tecla(caracter, event.time / 1000)
+        self._escribir(texto)
+        self._widget = event.widget
+        self._entregar()
+        if self._pendiente is not None:
+            self.ventana.after_cancel(self._pendiente)
+            self._pendiente = None
+        if self.detector.retenidas:
+            self._serie += 1
+            serie = self._serie
+            self._pendiente = self.ventana.after(int(self.detector.intervalo_max * 1000) + 10,
+                                                 lambda: self._vencer(serie))
+        return "break" if consumida else None
+
+    def _vencer(self, serie):
+        # Si la ventana estuvo ocupada puede haber teclas en espera más nuevas que este
+        # temporizador. after_idle corre cuando ya no queda ningún evento por atender:
+        # si entre tanto llegó otra tecla, la serie cambió y la ráfaga sigue abierta.
+        self._pendiente = self.ventana.after_idle(lambda: self._cerrar_serie(serie))
+
+    def _cerrar_serie(self, serie):
+        self._pendiente = None
+        if serie == self._serie:
+            self._soltar()
+
+    def _soltar(self):
+        if self.detector.retenidas:
+            self._escribir(self.detector.cerrar())
+            self._entregar()
+
+    def _escribir(self, texto):
+        if texto and self._widget is not None and self._widget.winfo_exists() and self._widget.winfo_class() in CAMPOS_TEXTO:
+            self._widget.insert("insert", texto)
+
+    def _entregar(self):
+        while self.detector.lecturas:
+            self.al_leer(self.detector.lecturas.popleft())
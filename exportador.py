@@ -0,0 +1,136 @@
+import csv
+import json
+import os
+
+from archivo import conexion_unificada
+from datos import obtener_conexion
+from metricas import medido, contar
+
+ENCABEZADOS = ("No. Importación", "SKU", "Marca", "Producto", "CodeBar", "Lote", "Fecha Expira",
+               "Cantidad Recibida", "Cantidad Rechazada", "Cantidad Aceptada", "Observaciones")
+COLUMNAS = ("importacion_no, sku, marca, producto, codebar, lote, fecha_expira, "
+            "cant_recibida, cant_rechazada, cant_aceptada, observaciones")
+TAMANO_BLOQUE = 1000
+
+def construir_filtro(importacion_no=None, codebar=None, fecha_desde=None, fecha_hasta=None, desde_rowid=None):
+    condiciones = []
+    params = []
+    if importacion_no:
+        condiciones.append("importacion_no = ?")
+        params.append(importacion_no)
+    if codebar:
+        condiciones.append("codebar = ?")
+        params.append(codebar)
+    # fecha_expira_iso es la columna indexada aaaa-mm-dd; NULL queda fuera de los rangos.
+    if fecha_desde:
+        condiciones.append("fecha_expira_iso >= ?")
+        params.append(fecha_desde.isoformat())
+    if fecha_hasta:
+        condiciones.append("fecha_expira_iso <= ?")
+        params.append(fecha_hasta.isoformat())
+    if desde_rowid:
+        condiciones.append("id > ?")
+        params.append(desde_rowid)
+    where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+    return where, params
+
+class EscritorCsv:
+    def __init__(self, ruta):
+        # utf-8-sig para que Excel reconozca los acentos al abrir el CSV.
+        self.archivo = open(ruta, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.archivo)
+
+    def escribir(self, fila):
+        self.writer.writerow(fila)
+
+    def cerrar(self):
+        self.archivo.close()
+
+    def descartar(self):
+        self.archivo.close()
+
+class EscritorJsonl:
+    # Un objeto JSON por línea; la primera fila que llega (los encabezados) da las claves.
+    def __init__(self, ruta):
+        self.archivo = open(ruta, "w", encoding="utf-8")
+        self.claves = None
+
+    def escribir(self, fila):
+        if self.claves is None:
+            self.claves = fila
+            return
+        self.archivo.write(json.dumps(dict(zip(self.claves, fila)), ensure_ascii=False))
+        self.archivo.write("\n")
+
+    def cerrar(self):
+        self.archivo.close()
+
+    def descartar(self):
+        self.archivo.close()
+
+class EscritorExcel:
+    # write_only=True va volcando las filas a disco en lugar de mantenerlas en memoria.
+    def __init__(self, ruta, titulo="Importaciones"):
+        import openpyxl
+        self.ruta = ruta
+        self.libro = openpyxl.Workbook(write_only=True)
+        self.hoja = self.libro.create_sheet(titulo)
+
+    def escribir(self, fila):
+        self.hoja.append(fila)
+
+    def cerrar(self):
+        self.libro.save(self.ruta)
+
+    def descartar(self):
+        self.hoja.close()
+
+def crear_escritor(ruta, titulo="Importaciones"):
+    if ruta.lower().endswith(".csv"):
+        return EscritorCsv(ruta)
+    if ruta.lower().endswith(".jsonl"):
+        return EscritorJsonl(ruta)
+    return EscritorExcel(ruta, titulo)
+
+@medido
+def exportar_consulta(ruta, encabezados, consulta, params=(), total=None, progreso=None, titulo="Importaciones", conn=None):
+    # Recorre el cursor por bloques y escribe cada fila en cuanto llega: la memoria
+    # usada no depende del tamaño del resultado. Si algo falla (o se cancela desde
+    # `progreso`) no queda un archivo a medias.
+    cursor = (conn or obtener_conexion()).execute(consulta, params)
+    escritor = crear_escritor(ruta, titulo)
+    exportadas = 0
+    try:
+        escritor.escribir(encabezados)
+        while True:
+            bloque = cursor.fetchmany(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            for fila in bloque:
+                escritor.escribir(fila)
+            exportadas += len(bloque)
+            if progreso:
+                progreso(exportadas, total)
+        escritor.cerrar()
+        contar("exportacion.filas", exportadas)
+    except BaseException:
+        cursor.close()
+        escritor.descartar()
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        raise
+    return exportadas
+
+@medido
+def exportar_importaciones(ruta, filtros=None, progreso=None, con_archivo=False):
+    # Con `con_archivo` también se exportan las líneas archivadas (ver archivo.py).
+    where, params = construir_filtro(**(filtros or {}))
+    if con_archivo:
+        conn, vista = conexion_unificada(), "importaciones_detalle_todas"
+    else:
+        conn, vista = obtener_conexion(), "importaciones_detalle"
+    total = conn.execute(f"SELECT count(*) FROM {vista}{where}", params).fetchone()[0]
+    if not total:
+        return 0
+    return exportar_consulta(ruta, ENCABEZADOS, f"SELECT {COLUMNAS} FROM {vista}{where} ORDER BY id",
+                             params, total, progreso, conn=conn)
@@ -0,0 +1,105 @@
+import csv
+
+from datos import transaccion, cache_productos, indexar_trigramas
+from metricas import medido, contar
+
+COLUMNAS_PRODUCTOS = ("codebar", "sku", "marca", "producto")
+TAMANO_LOTE = 500
+
+class FormatoIncorrecto(ValueError):
+    pass
+
+class LectorExcel:
+    # read_only=True recorre la hoja como flujo sin cargar el libro completo en memoria.
+    def __init__(self, ruta):
+        import openpyxl
+        self.libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        self.hoja = self.libro.active
+        self.total = self.hoja.max_row
+
+    def __iter__(self):
+        return self.hoja.iter_rows(values_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.libro.close()
+
+class LectorCsv:
+    # Se lee línea a línea; no se conoce el total sin recorrer el archivo entero.
+    def __init__(self, ruta):
+        self.archivo = open(ruta, newline="", encoding="utf-8-sig")
+        self.total = None
+
+    def __iter__(self):
+        return csv.reader(self.archivo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.archivo.close()
+
+def abrir_lector(ruta):
+    if ruta.lower().endswith(".csv"):
+        return LectorCsv(ruta)
+    return LectorExcel(ruta)
+
+def _texto(valor):
+    return str(valor).strip() if valor else ""
+
+def _upsert_lote(conn, lote, conteo):
+    codigos = [fila[0] for fila in lote]
+    marcadores = ",".join("?" * len(codigos))
+    existentes = {r[0] for r in conn.execute(f'SELECT codebar FROM productos WHERE codebar IN ({marcadores})', codigos)}
+    for codebar in codigos:
+        if codebar in existentes:
+            conteo["actualizados"] += 1
+        else:
+            conteo["agregados"] += 1
+            existentes.add(codebar)
+    conn.executemany('''
+        INSERT INTO productos (codebar, sku, marca, producto) VALUES (?, ?, ?, ?)
+        ON CONFLICT(codebar) DO UPDATE SET sku=excluded.sku, marca=excluded.marca, producto=excluded.producto
+    ''', lote)
+
+def importar_productos(lector, progreso=None, tamano_lote=TAMANO_LOTE):
+    # Todo el archivo se aplica en una sola transacción: si `progreso` lanza una
+    # excepción (p. ej. al cancelar) no queda ningún producto a medio importar.
+    filas = iter(lector)
+    headers = list(next(filas, None) or ())
+    try:
+        indices = [headers.index(col) for col in COLUMNAS_PRODUCTOS]
+    except ValueError:
+        raise FormatoIncorrecto("El archivo debe tener columnas: codebar, sku, marca, producto (en la primera fila)")
+    total = (lector.total or 1) - 1 or None
+    conteo = {"agregados": 0, "actualizados": 0, "omitidos": 0}
+    procesadas = 0
+    lote = []
+    with transaccion() as conn:
+        for fila in filas:
+            procesadas += 1
+            valores = tuple(_texto(fila[i]) if i < len(fila) else "" for i in indices)
+            if all(valores):
+                lote.append(valores)
+            else:
+                conteo["omitidos"] += 1
+            if len(lote) >= tamano_lote:
+                _upsert_lote(conn, lote, conteo)
+                lote = []
+                if progreso:
+                    progreso(procesadas, total, dict(conteo))
+        if lote:
+            _upsert_lote(conn, lote, conteo)
+        if progreso:
+            progreso(procesadas, total, dict(conteo))
+        indexar_trigramas()
+    cache_productos.invalidar()
+    contar("importacion.filas", procesadas)
+    return conteo
+
+@medido
+def importar_productos_archivo(ruta, progreso=None, tamano_lote=TAMANO_LOTE):
+    with abrir_lector(ruta) as lector:
+        return importar_productos(lector, progreso=progreso, tamano_lote=tamano_lote)
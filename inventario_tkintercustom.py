@@ -1,195 +1,515 @@
 import customtkinter as ctk
 from tkinter import messagebox, filedialog, simpledialog
 import tkinter.ttk as ttk
-import sqlite3
-from datetime import datetime
-import cv2
-from pyzbar import pyzbar
-from PIL import Image, ImageTk
-import openpyxl
-
-DB_NAME = 'productos.db'
-DELETE_PASSWORD = 'admin123'
-
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS productos (
-            codebar TEXT PRIMARY KEY,
-            sku TEXT,
-            marca TEXT,
-            producto TEXT
+from datetime import date, datetime, timedelta
+import queue
+from collections import deque
+import threading
+import time
+
+import datos
+from datos import (
+    init_db, cerrar_conexiones, cache_productos, eliminar_todos_los_datos, buscar_stock, contar_stock,
+    buscar_lotes_fefo, alerta_vencimientos, DIAS_ALERTA_VENCIMIENTO
+)
+from cliente_sync import fuente_de_datos
+from importador import importar_productos_archivo, FormatoIncorrecto
+from exportador import exportar_importaciones
+from archivo import FuenteConArchivo, respaldar
+from conciliacion import (
+    conciliar_manifiesto, exportar_conciliacion, fila_con_producto, ESTADOS as ESTADOS_CONCILIACION,
+    COINCIDE, FALTANTE, SOBRANTE, INESPERADO
+)
+from camara import obtener_camara, cerrar_camaras
+from tareas import TareaEnSegundoPlano, ejecutor_bd, al_completar, IndicadorTrabajos
+from tabla_virtual import ModeloImportaciones, TablaVirtual
+from busqueda import BuscadorImportaciones
+from sesion_recepcion import SesionRecepcion, sesiones_interrumpidas
+from escaner import CapturaEscaner
+from sugerencias import aviso_gtin, EQUIVALENTE, MOTIVOS
+from arranque import precalentar_en_segundo_plano, informar_primera_ventana
+import metricas
+from metricas import medido, contar
+
+# Módulo datos (base local) o un ClienteSync; lo elige fuente_de_datos() al iniciar.
+fuente = datos
+
+class ExportarImportaciones(ctk.CTkToplevel):
+    def __init__(self, master, desde_rowid=0):
+        super().__init__(master)
+        self.title("Exportar Importaciones")
+        self.geometry("470x440")
+        self.resizable(False, False)
+        self.desde_rowid = desde_rowid
+        self.tarea = None
+
+        form = ctk.CTkFrame(self)
+        form.pack(expand=True, fill="both", padx=20, pady=20)
+        ctk.CTkLabel(form, text="Filtros (opcionales):", anchor="w").grid(row=0, column=0, columnspan=2, sticky="w", padx=8, pady=(8, 4))
+        ctk.CTkLabel(form, text="No. de importación:", anchor="w").grid(row=1, column=0, sticky="w", padx=8, pady=6)
+        self.entry_importacion_no = ctk.CTkEntry(form, width=200)
+        self.entry_importacion_no.grid(row=1, column=1, sticky="w", padx=8, pady=6)
+        ctk.CTkLabel(form, text="CodeBar:", anchor="w").grid(row=2, column=0, sticky="w", padx=8, pady=6)
+        self.entry_codebar = ctk.CTkEntry(form, width=200)
+        self.entry_codebar.grid(row=2, column=1, sticky="w", padx=8, pady=6)
+        ctk.CTkLabel(form, text="Expira desde (dd/mm/aaaa):", anchor="w").grid(row=3, column=0, sticky="w", padx=8, pady=6)
+        self.entry_fecha_desde = ctk.CTkEntry(form, width=200)
+        self.entry_fecha_desde.grid(row=3, column=1, sticky="w", padx=8, pady=6)
+        ctk.CTkLabel(form, text="Expira hasta (dd/mm/aaaa):", anchor="w").grid(row=4, column=0, sticky="w", padx=8, pady=6)
+        self.entry_fecha_hasta = ctk.CTkEntry(form, width=200)
+        self.entry_fecha_hasta.grid(row=4, column=1, sticky="w", padx=8, pady=6)
+
+        self.var_con_archivo = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(form, text="Incluir importaciones archivadas", variable=self.var_con_archivo,
+                        state="normal" if fuente is datos else "disabled").grid(row=5, column=0, columnspan=2, sticky="w", padx=8, pady=6)
+
+        self.btn_exportar = ctk.CTkButton(form, text="Exportar (Excel o CSV)", command=self.exportar, width=380)
+        self.btn_exportar.grid(row=6, column=0, columnspan=2, padx=8, pady=(14, 6), sticky="w")
+        self.progreso = ctk.CTkProgressBar(form, width=380)
+        self.progreso.grid(row=7, column=0, columnspan=2, padx=8, pady=(6, 0), sticky="w")
+        self.progreso.set(0)
+        self.lbl_estado = ctk.CTkLabel(form, text="", anchor="w")
+        self.lbl_estado.grid(row=8, column=0, columnspan=2, padx=8, sticky="w")
+        self.btn_cancelar = ctk.CTkButton(form, text="Cancelar", command=self.cancelar, width=180, fg_color="#dc2626", text_color="white", state="disabled")
+        self.btn_cancelar.grid(row=9, column=0, columnspan=2, padx=8, pady=(4, 0), sticky="w")
+
+    def leer_filtros(self):
+        filtros = {
+            "importacion_no": self.entry_importacion_no.get().strip(),
+            "codebar": self.entry_codebar.get().strip(),
+            "desde_rowid": self.desde_rowid,
+        }
+        for clave, entry in (("fecha_desde", self.entry_fecha_desde), ("fecha_hasta", self.entry_fecha_hasta)):
+            texto = entry.get().strip()
+            if not texto:
+                continue
+            try:
+                filtros[clave] = datetime.strptime(texto, '%d/%m/%Y').date()
+            except ValueError:
+                messagebox.showwarning("Fecha inválida", "Las fechas deben tener formato dd/mm/aaaa.", parent=self)
+                return None
+        return filtros
+
+    def exportar(self):
+        if self.tarea and self.tarea.activa:
+            return
+        filtros = self.leer_filtros()
+        if filtros is None:
+            return
+        archivo = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")], parent=self)
+        if not archivo:
+            return
+        self.btn_exportar.configure(state="disabled")
+        self.btn_cancelar.configure(state="normal")
+        self.progreso.set(0)
+        self.lbl_estado.configure(text="Exportando...")
+        self.tarea = TareaEnSegundoPlano(
+            self, exportar_importaciones, archivo, filtros=filtros, con_archivo=self.var_con_archivo.get(),
+            al_progresar=self.al_progresar,
+            al_terminar=self.al_terminar,
+            al_fallar=self.al_fallar,
+            al_cancelar=self.al_cancelar
         )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS importaciones (
-            importacion_no TEXT,
-            sku TEXT,
-            marca TEXT,
-            producto TEXT,
-            codebar TEXT,
-            lote TEXT,
-            fecha_expira TEXT,
-            cant_recibida INTEGER,
-            cant_rechazada INTEGER,
-            cant_aceptada INTEGER,
-            observaciones TEXT
+
+    def cancelar(self):
+        if self.tarea:
+            self.tarea.cancelar()
+            self.lbl_estado.configure(text="Cancelando...")
+
+    def al_progresar(self, exportadas, total):
+        self.progreso.set(min(1, exportadas / total))
+        self.lbl_estado.configure(text=f"Filas exportadas: {exportadas} de {total}")
+
+    def terminar(self, texto=""):
+        self.tarea = None
+        self.btn_exportar.configure(state="normal")
+        self.btn_cancelar.configure(state="disabled")
+        self.lbl_estado.configure(text=texto)
+
+    def al_terminar(self, exportadas):
+        if not exportadas:
+            self.terminar()
+            messagebox.showinfo("Sin datos", "No hay datos para exportar.", parent=self)
+            return
+        self.progreso.set(1)
+        self.terminar(f"Filas exportadas: {exportadas}")
+        messagebox.showinfo("Éxito", "Datos exportados exitosamente.", parent=self)
+
+    def al_fallar(self, error):
+        self.terminar()
+        messagebox.showerror("Error", f"No se pudo guardar el archivo:\n{error}", parent=self)
+
+    def al_cancelar(self):
+        self.progreso.set(0)
+        self.terminar("Exportación cancelada.")
+
+class VistaStock(ctk.CTkToplevel):
+    # Lee la tabla stock (una fila por codebar y lote), no las líneas de importación.
+    LIMITE = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Stock por Producto y Lote")
+        self.geometry("980x520")
+
+        barra = ctk.CTkFrame(self)
+        barra.pack(fill="x", padx=10, pady=(10, 5))
+        ctk.CTkLabel(barra, text="CodeBar:").pack(side="left", padx=7)
+        self.entry_codebar = ctk.CTkEntry(barra, width=220)
+        self.entry_codebar.pack(side="left", padx=7, pady=5)
+        self.entry_codebar.bind("<Return>", lambda e: self.cargar())
+        ctk.CTkButton(barra, text="Buscar", command=self.cargar, width=120).pack(side="left", padx=5)
+        ctk.CTkButton(barra, text="Ver todo", command=self.ver_todo, width=120).pack(side="left", padx=5)
+        self.lbl_estado = ctk.CTkLabel(barra, text="")
+        self.lbl_estado.pack(side="left", padx=7)
+
+        marco = ctk.CTkFrame(self)
+        marco.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        columnas = ("codebar", "sku", "marca", "producto", "lote", "cant_recibida", "cant_rechazada", "cant_aceptada")
+        self.tree = ttk.Treeview(marco, columns=columnas, show="headings")
+        for col in columnas:
+            self.tree.heading(col, text=col.replace("_", " ").title())
+            self.tree.column(col, width=150 if col in ("producto", "codebar") else 100, anchor="center")
+        scrollbar = ttk.Scrollbar(marco, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(fill="both", expand=True, side="left")
+        scrollbar.pack(side="right", fill="y")
+        self.cargar()
+
+    def ver_todo(self):
+        self.entry_codebar.delete(0, "end")
+        self.cargar()
+
+    def cargar(self):
+        codebar = self.entry_codebar.get().strip()
+        self.lbl_estado.configure(text="Cargando...")
+        futuro = ejecutor_bd.enviar(lambda: (buscar_stock(codebar, self.LIMITE), contar_stock()))
+        al_completar(self, futuro, lambda resultado: self.mostrar(codebar, *resultado), self.error_cargar)
+
+    def mostrar(self, codebar, filas, total):
+        self.tree.delete(*self.tree.get_children())
+        for fila in filas:
+            self.tree.insert("", "end", values=fila)
+        if codebar:
+            aceptada = sum(fila[7] for fila in filas)
+            self.lbl_estado.configure(text=f"{len(filas)} lotes, {aceptada} unidades aceptadas")
+        else:
+            self.lbl_estado.configure(text=f"Mostrando {len(filas)} de {total} lotes")
+
+    def error_cargar(self, error):
+        self.lbl_estado.configure(text="")
+        messagebox.showerror("Error", f"No se pudo leer el stock:\n{error}", parent=self)
+
+class VistaVencimientos(ctk.CTkToplevel):
+    # Lotes en orden FEFO dentro de ±N días de hoy; los ya vencidos en rojo.
+    LIMITE = 1000
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Vencimientos por Lote (FEFO)")
+        self.geometry("980x520")
+
+        barra = ctk.CTkFrame(self)
+        barra.pack(fill="x", padx=10, pady=(10, 5))
+        ctk.CTkLabel(barra, text="Días (antes y después de hoy):").pack(side="left", padx=7)
+        self.entry_dias = ctk.CTkEntry(barra, width=80)
+        self.entry_dias.insert(0, str(DIAS_ALERTA_VENCIMIENTO))
+        self.entry_dias.pack(side="left", padx=7, pady=5)
+        self.entry_dias.bind("<Return>", lambda e: self.cargar())
+        ctk.CTkButton(barra, text="Actualizar", command=self.cargar, width=120).pack(side="left", padx=5)
+        self.lbl_estado = ctk.CTkLabel(barra, text="")
+        self.lbl_estado.pack(side="left", padx=7)
+
+        marco = ctk.CTkFrame(self)
+        marco.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        columnas = ("fecha_expira", "dias_restantes", "codebar", "sku", "marca", "producto", "lote", "cant_aceptada", "lineas")
+        self.tree = ttk.Treeview(marco, columns=columnas, show="headings")
+        for col in columnas:
+            self.tree.heading(col, text=col.replace("_", " ").title())
+            self.tree.column(col, width=150 if col in ("producto", "codebar") else 95, anchor="center")
+        self.tree.tag_configure("vencido", background="#f87171")
+        scrollbar = ttk.Scrollbar(marco, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(fill="both", expand=True, side="left")
+        scrollbar.pack(side="right", fill="y")
+        self.cargar()
+
+    def cargar(self):
+        texto = self.entry_dias.get().strip()
+        if not texto.isdigit():
+            messagebox.showwarning("Datos inválidos", "Los días deben ser un número entero.", parent=self)
+            return
+        hoy = date.today()
+        dias = timedelta(days=int(texto))
+        self.lbl_estado.configure(text="Cargando...")
+        futuro = ejecutor_bd.enviar(buscar_lotes_fefo, hoy - dias, hoy + dias, self.LIMITE)
+        al_completar(self, futuro, self.mostrar, self.error_cargar)
+
+    def mostrar(self, filas):
+        self.tree.delete(*self.tree.get_children())
+        for fila in filas:
+            self.tree.insert("", "end", values=fila, tags=("vencido",) if fila[1] < 0 else ())
+        limite = " (primeros)" if len(filas) == self.LIMITE else ""
+        self.lbl_estado.configure(text=f"{len(filas)} lotes{limite}")
+
+    def error_cargar(self, error):
+        self.lbl_estado.configure(text="")
+        messagebox.showerror("Error", f"No se pudieron leer los vencimientos:\n{error}", parent=self)
+
+class VentanaConciliacion(ctk.CTkToplevel):
+    # Manifiesto del proveedor contra lo escaneado en una importación. Se muestran
+    # hasta LIMITE líneas del filtro elegido; la exportación incluye todas.
+    LIMITE = 1000
+    FILTROS = {"Diferencias": (FALTANTE, SOBRANTE, INESPERADO), "Todas": ESTADOS_CONCILIACION,
+               "Faltantes": (FALTANTE,), "Sobrantes": (SOBRANTE,), "Inesperadas": (INESPERADO,), "Coinciden": (COINCIDE,)}
+
+    def __init__(self, master, importacion_no="", pendientes=()):
+        super().__init__(master)
+        self.title("Conciliar Manifiesto del Proveedor")
+        self.pendientes = pendientes
+        self.geometry("1040x560")
+        self.resultado = None
+        self.tarea = None
+
+        barra = ctk.CTkFrame(self)
+        barra.pack(fill="x", padx=10, pady=(10, 5))
+        ctk.CTkLabel(barra, text="No. de importación:").pack(side="left", padx=7)
+        self.entry_importacion_no = ctk.CTkEntry(barra, width=160)
+        self.entry_importacion_no.insert(0, importacion_no)
+        self.entry_importacion_no.pack(side="left", padx=7, pady=5)
+        self.btn_manifiesto = ctk.CTkButton(barra, text="Cargar manifiesto (Excel o CSV)", command=self.cargar, width=220)
+        self.btn_manifiesto.pack(side="left", padx=5)
+        ctk.CTkLabel(barra, text="Mostrar:").pack(side="left", padx=(15, 5))
+        self.var_filtro = ctk.StringVar(value="Diferencias")
+        ctk.CTkOptionMenu(barra, values=list(self.FILTROS), variable=self.var_filtro, command=lambda _: self.mostrar(), width=130).pack(side="left", padx=5)
+        self.btn_exportar = ctk.CTkButton(barra, text="Exportar", command=self.exportar, width=110, state="disabled")
+        self.btn_exportar.pack(side="left", padx=5)
+        self.lbl_estado = ctk.CTkLabel(self, text="", anchor="w")
+        self.lbl_estado.pack(fill="x", padx=17)
+
+        marco = ctk.CTkFrame(self)
+        marco.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        columnas = ("estado", "codebar", "sku", "marca", "producto", "lote", "cant_manifiesto", "cant_recibida", "diferencia")
+        self.tree = ttk.Treeview(marco, columns=columnas, show="headings")
+        for col in columnas:
+            self.tree.heading(col, text=col.replace("_", " ").title())
+            self.tree.column(col, width=150 if col in ("producto", "codebar") else 95, anchor="center")
+        self.tree.tag_configure(FALTANTE, background="#f87171")
+        self.tree.tag_configure(SOBRANTE, background="#fbbf24")
+        self.tree.tag_configure(INESPERADO, background="#c4b5fd")
+        scrollbar = ttk.Scrollbar(marco, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(fill="both", expand=True, side="left")
+        scrollbar.pack(side="right", fill="y")
+
+    def cargar(self):
+        if self.tarea and self.tarea.activa:
+            return
+        importacion_no = self.entry_importacion_no.get().strip()
+        if not importacion_no:
+            messagebox.showwarning("Datos incompletos", "Indique el No. de importación a conciliar.", parent=self)
+            return
+        archivo = filedialog.askopenfilename(filetypes=[("Excel o CSV", "*.xlsx *.csv")], parent=self)
+        if not archivo:
+            return
+        self.btn_manifiesto.configure(state="disabled")
+        self.lbl_estado.configure(text="Leyendo manifiesto...")
+        self.tarea = TareaEnSegundoPlano(
+            self, conciliar_manifiesto, archivo, importacion_no, list(self.pendientes),
+            al_progresar=lambda filas, total: self.lbl_estado.configure(text=f"Filas del manifiesto leídas: {filas}"),
+            al_terminar=self.al_conciliar,
+            al_fallar=self.error_conciliar
         )
-    ''')
-    conn.commit()
-    conn.close()
-
-def buscar_producto_por_codebar(codebar):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT sku, marca, producto, codebar FROM productos WHERE codebar=?', (codebar,))
-    result = c.fetchone()
-    conn.close()
-    return result
-
-def agregar_producto(codebar, sku, marca, producto):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    try:
-        c.execute('INSERT INTO productos VALUES (?,?,?,?)', (codebar, sku, marca, producto))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass
-    conn.close()
-
-def editar_producto(codebar, sku, marca, producto):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('UPDATE productos SET sku=?, marca=?, producto=? WHERE codebar=?', (sku, marca, producto, codebar))
-    conn.commit()
-    conn.close()
-
-def agregar_importacion(importacion_no, sku, marca, producto, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO importaciones (
-            importacion_no, sku, marca, producto, codebar, lote, fecha_expira,
-            cant_recibida, cant_rechazada, cant_aceptada, observaciones
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (importacion_no, sku, marca, producto, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones))
-    conn.commit()
-    conn.close()
-
-def buscar_importaciones():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('SELECT rowid, * FROM importaciones')
-    res = c.fetchall()
-    conn.close()
-    return res
-
-def actualizar_importacion(rowid, importacion_no, sku, marca, producto, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('''
-        UPDATE importaciones SET
-            importacion_no=?, sku=?, marca=?, producto=?, codebar=?, lote=?, fecha_expira=?,
-            cant_recibida=?, cant_rechazada=?, cant_aceptada=?, observaciones=?
-        WHERE rowid=?
-    ''', (importacion_no, sku, marca, producto, codebar, lote, fecha_expira,
-          cant_recibida, cant_rechazada, cant_aceptada, observaciones, rowid))
-    conn.commit()
-    conn.close()
-
-def eliminar_importacion_por_rowid(rowid):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('DELETE FROM importaciones WHERE rowid=?', (rowid,))
-    conn.commit()
-    conn.close()
-
-def eliminar_todos_los_datos(password):
-    if password != DELETE_PASSWORD:
-        return False
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    c.execute('DELETE FROM productos')
-    c.execute('DELETE FROM importaciones')
-    conn.commit()
-    conn.close()
-    return True
 
-def exportar_importaciones_excel(filas, parent=None):
-    if not filas:
-        messagebox.showinfo("Sin datos", "No hay datos para exportar.", parent=parent)
-        return
-    archivo = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")], parent=parent)
-    if archivo:
+    def al_conciliar(self, resultado):
+        self.tarea = None
+        self.resultado = resultado
+        self.btn_manifiesto.configure(state="normal")
+        self.btn_exportar.configure(state="normal")
+        self.mostrar()
+
+    def error_conciliar(self, error):
+        self.tarea = None
+        self.btn_manifiesto.configure(state="normal")
+        self.lbl_estado.configure(text="")
+        if isinstance(error, FormatoIncorrecto):
+            messagebox.showerror("Formato incorrecto", str(error), parent=self)
+        else:
+            messagebox.showerror("Error", f"No se pudo conciliar el manifiesto:\n{error}", parent=self)
+
+    def mostrar(self):
+        if self.resultado is None:
+            return
+        estados = self.FILTROS[self.var_filtro.get()]
+        self.tree.delete(*self.tree.get_children())
+        mostradas = 0
+        for linea in self.resultado.lineas:
+            if linea[0] not in estados:
+                continue
+            self.tree.insert("", "end", values=fila_con_producto(linea, self.resultado.productos), tags=(linea[0],))
+            mostradas += 1
+            if mostradas == self.LIMITE:
+                break
+        r = self.resultado
+        resumen = ", ".join(f"{r.conteos[estado]} {estado}" for estado in ESTADOS_CONCILIACION)
+        omitidas = f", {r.omitidas} filas omitidas" if r.omitidas else ""
+        limite = f" (se muestran las primeras {self.LIMITE}; exporte para ver todas)" if mostradas == self.LIMITE else ""
+        self.lbl_estado.configure(text=f"Importación {r.importacion_no}: {r.filas_manifiesto} filas del manifiesto{omitidas}. {resumen}{limite}")
+
+    def exportar(self):
+        archivo = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")], parent=self)
+        if not archivo:
+            return
+        solo_diferencias = self.var_filtro.get() == "Diferencias"
+        futuro = ejecutor_bd.enviar(exportar_conciliacion, archivo, self.resultado, solo_diferencias)
+        al_completar(self, futuro,
+                     lambda escritas: messagebox.showinfo("Éxito", f"{escritas} líneas exportadas.", parent=self),
+                     lambda error: messagebox.showerror("Error", f"No se pudo guardar el archivo:\n{error}", parent=self))
+
+class VentanaDiagnostico(ctk.CTkToplevel):
+    # Estadísticas en vivo de metricas.py. Se abre con Ctrl+Shift+D desde el menú principal.
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Diagnóstico de rendimiento")
+        self.geometry("900x480")
+
+        barra = ctk.CTkFrame(self)
+        barra.pack(fill="x", padx=10, pady=(10, 5))
+        self.var_activo = ctk.BooleanVar(value=metricas.ACTIVO)
+        ctk.CTkSwitch(barra, text="Medición activa", variable=self.var_activo, command=self.cambiar_activo).pack(side="left", padx=7)
+        ctk.CTkLabel(barra, text="Registrar operaciones de más de (ms):").pack(side="left", padx=7)
+        self.entry_umbral = ctk.CTkEntry(barra, width=70)
+        self.entry_umbral.insert(0, f"{metricas.UMBRAL_LENTO_MS:g}")
+        self.entry_umbral.pack(side="left", padx=5, pady=5)
+        self.entry_umbral.bind("<Return>", self.cambiar_umbral)
+        ctk.CTkButton(barra, text="Reiniciar", command=metricas.reiniciar, width=100).pack(side="left", padx=7)
+
+        marco = ctk.CTkFrame(self)
+        marco.pack(fill="both", expand=True, padx=10)
+        columnas = ("operacion", "llamadas", "total_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+        self.tree = ttk.Treeview(marco, columns=columnas, show="headings")
+        for col in columnas:
+            self.tree.heading(col, text=col.replace("_", " ").title())
+            self.tree.column(col, width=340 if col == "operacion" else 85, anchor="w" if col == "operacion" else "e")
+        self.tree.pack(fill="both", expand=True)
+        self.lbl_contadores = ctk.CTkLabel(self, text="", anchor="w", justify="left")
+        self.lbl_contadores.pack(fill="x", padx=12, pady=(5, 10))
+        self.actualizar()
+
+    def cambiar_activo(self):
+        metricas.activar(self.var_activo.get())
+
+    def cambiar_umbral(self, event=None):
         try:
-            libro = openpyxl.Workbook()
-            hoja = libro.active
-            hoja.append(("No. Importación", "SKU", "Marca", "Producto", "CodeBar", "Lote", "Fecha Expira",
-                         "Cantidad Recibida", "Cantidad Rechazada", "Cantidad Aceptada", "Observaciones"))
-            for fila in filas:
-                hoja.append(fila)
-            libro.save(archivo)
-            messagebox.showinfo("Éxito", "Datos exportados exitosamente.", parent=parent)
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo guardar el archivo:\n{e}", parent=parent)
+            metricas.fijar_umbral(float(self.entry_umbral.get()))
+        except ValueError:
+            messagebox.showwarning("Datos inválidos", "El umbral debe ser un número.", parent=self)
+
+    def actualizar(self):
+        if not self.winfo_exists():
+            return
+        filas, contadores = metricas.estadisticas()
+        self.tree.delete(*self.tree.get_children())
+        for nombre, llamadas, *tiempos in filas:
+            self.tree.insert("", "end", values=(nombre, llamadas, *(f"{t:.2f}" for t in tiempos)))
+        cache = cache_productos.estadisticas()
+        partes = [f"{nombre}: {valor}" for nombre, valor in sorted(contadores.items())]
+        partes.append(f"caché de productos: {cache['aciertos']} aciertos, {cache['fallos']} fallos, {cache['en_memoria']} en memoria")
+        self.lbl_contadores.configure(text="   ".join(partes))
+        self.after(1000, self.actualizar)
 
 class BarcodeCameraReader(ctk.CTkToplevel):
-    def __init__(self, on_detect_callback, camera_index=0):
+    ANCHO_VISTA = 480
+    INTERVALO_VISTA_MS = 66
+
+    def __init__(self, on_detect_callback, camera_index=0, continuo=False):
         super().__init__()
-        self.title("Escanear CodeBar")
-        self.geometry("500x320")
+        self.title("Escanear CodeBar (continuo)" if continuo else "Escanear CodeBar")
+        self.geometry("500x420")
         self.on_detect = on_detect_callback
         self.running = True
         self.camera_index = camera_index
+        self.continuo = continuo
+        self.leidos = 0
+        self.imgtk = None
+        self.ultima_vista = 0
 
-        self.label = ctk.CTkLabel(self, text="")
+        self.label = ctk.CTkLabel(self, text="Abriendo cámara...")
         self.label.pack(pady=8)
         self.info = ctk.CTkLabel(self, text="Presiona ESC para cerrar.")
         self.info.pack()
+        self.stats = ctk.CTkLabel(self, text="")
+        self.stats.pack()
         self.bind("<Destroy>", self.on_destroy)
         self.bind("<Escape>", lambda e: self.cerrar())
-        self.after(10, self.video_loop)
 
+        # La cámara queda abierta entre escaneos; la ventana solo consume sus resultados.
+        self.pipeline = obtener_camara(camera_index)
+        self.pipeline.reanudar()
+        self.after(15, self.video_loop)
+
+    @medido
     def video_loop(self):
-        if not hasattr(self, 'cap'):
-            self.cap = cv2.VideoCapture(self.camera_index)
-            if not self.cap.isOpened():
-                messagebox.showerror("Error", "No se pudo abrir la cámara.", parent=self)
-                self.destroy()
-                return
-        ret, frame = self.cap.read()
-        if ret:
-            barcodes = pyzbar.decode(frame)
-            for barcode in barcodes:
-                barcode_data = barcode.data.decode('utf-8')
-                self.on_detect(barcode_data)
-                self.running = False
-                self.cap.release()
-                self.destroy()
+        # Solo consume resultados: la captura y la decodificación corren en sus hilos.
+        if not self.running:
+            return
+        if self.pipeline.error:
+            messagebox.showerror("Error", self.pipeline.error, parent=self)
+            self.cerrar()
+            return
+        while True:
+            try:
+                barcode_data = self.pipeline.detecciones.get_nowait()
+            except queue.Empty:
+                break
+            contar("camara.codigos_leidos")
+            self.on_detect(barcode_data)
+            if not self.continuo:
+                self.cerrar()
                 return
-            cv2image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA)
-            img = Image.fromarray(cv2image)
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.label.configure(image=imgtk)
-            self.label.image = imgtk
-        if self.running:
-            self.after(10, self.video_loop)
+            self.leidos += 1
+            self.info.configure(text=f"Códigos leídos: {self.leidos}. Presiona ESC para terminar.")
+        ahora = time.perf_counter()
+        if (ahora - self.ultima_vista) * 1000 >= self.INTERVALO_VISTA_MS:
+            frame = self.pipeline.vista_previa.tomar(timeout=0)
+            if frame is not None:
+                self.ultima_vista = ahora
+                self.mostrar_vista(frame)
+                st = self.pipeline.estadisticas()
+                self.stats.configure(text=f"Captura: {st['captura_fps']:.0f} fps | Decodificación: {st['decodificacion_fps']:.0f} fps | Latencia: {st['latencia_ms']:.1f} ms")
+        self.after(15, self.video_loop)
+
+    def mostrar_vista(self, frame):
+        import cv2
+        from PIL import Image, ImageTk
+        alto, ancho = frame.shape[:2]
+        if ancho > self.ANCHO_VISTA:
+            frame = cv2.resize(frame, (self.ANCHO_VISTA, int(alto * self.ANCHO_VISTA / ancho)), interpolation=cv2.INTER_AREA)
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        # Se reutiliza el mismo PhotoImage mientras no cambie el tamaño del cuadro.
+        if self.imgtk is None or (self.imgtk.width(), self.imgtk.height()) != img.size:
+            self.imgtk = ImageTk.PhotoImage(image=img)
+            self.label.configure(image=self.imgtk, text="")
+            self.label.image = self.imgtk
+        else:
+            self.imgtk.paste(img)
 
     def cerrar(self):
+        if not self.running:
+            return
         self.running = False
-        if hasattr(self, 'cap') and self.cap.isOpened():
-            self.cap.release()
+        self.pipeline.pausar()
         self.destroy()
 
     def on_destroy(self, event):
-        self.cerrar()
+        if event.widget is self:
+            self.cerrar()
 
 class MainMenu(ctk.CTk):
     def __init__(self):
         super().__init__()
         self.title("Sistema de Inventario")
-        self.geometry("400x360")
+        self.geometry("420x580")
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         frame = ctk.CTkFrame(self)
@@ -197,10 +517,30 @@ class MainMenu(ctk.CTk):
         ctk.CTkLabel(frame, text="Seleccione una opción:", font=("Arial", 15)).pack(pady=20)
         ctk.CTkButton(frame, text="Agregar nuevo producto", command=self.abrir_agregar_producto, width=220).pack(pady=10)
         ctk.CTkButton(frame, text="Agregar nueva importación", command=self.abrir_importacion, width=220).pack(pady=10)
-        ctk.CTkButton(frame, text="Eliminar TODOS los datos", command=self.eliminar_todo_dialogo, width=220).pack(pady=10)
+        # Stock, vencimientos y el borrado total leen la base local: en una estación
+        # conectada al servidor se usan desde el equipo que la tiene.
+        local = "normal" if fuente is datos else "disabled"
+        ctk.CTkButton(frame, text="Ver stock", command=self.abrir_stock, width=220, state=local).pack(pady=10)
+        ctk.CTkButton(frame, text="Ver vencimientos", command=self.abrir_vencimientos, width=220, state=local).pack(pady=10)
+        self.btn_respaldar = ctk.CTkButton(frame, text="Crear respaldo", command=self.crear_respaldo, width=220, state=local)
+        self.btn_respaldar.pack(pady=10)
+        self.tarea_respaldo = None
+        self.btn_eliminar_todo = ctk.CTkButton(frame, text="Eliminar TODOS los datos", command=self.eliminar_todo_dialogo, width=220, state=local)
+        self.btn_eliminar_todo.pack(pady=10)
+        self.lbl_estado = ctk.CTkLabel(frame, text="")
+        self.lbl_estado.pack()
+        self.trabajos = IndicadorTrabajos(self.lbl_estado, "Eliminando datos...")
+
+        self.lbl_alerta = ctk.CTkLabel(frame, text="", text_color="#f59e0b")
+        self.lbl_alerta.pack()
 
         self.hijas_abiertas = []
         self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.bind("<Control-Shift-D>", lambda e: self.abrir_diagnostico())
+        if fuente is datos:
+            al_completar(self, ejecutor_bd.enviar(alerta_vencimientos), self.mostrar_alerta)
+        else:
+            self.lbl_estado.configure(text=f"Conectado a {fuente.url}")
 
     def abrir_agregar_producto(self):
         win = AgregarProducto(self)
@@ -214,6 +554,33 @@ class MainMenu(ctk.CTk):
         win.protocol("WM_DELETE_WINDOW", lambda w=win: self.cerrar_hija(w))
         win.focus_force()
 
+    def abrir_stock(self):
+        win = VistaStock(self)
+        self.hijas_abiertas.append(win)
+        win.protocol("WM_DELETE_WINDOW", lambda w=win: self.cerrar_hija(w))
+        win.focus_force()
+
+    def abrir_vencimientos(self):
+        win = VistaVencimientos(self)
+        self.hijas_abiertas.append(win)
+        win.protocol("WM_DELETE_WINDOW", lambda w=win: self.cerrar_hija(w))
+        win.focus_force()
+
+    def abrir_diagnostico(self):
+        win = VentanaDiagnostico(self)
+        self.hijas_abiertas.append(win)
+        win.protocol("WM_DELETE_WINDOW", lambda w=win: self.cerrar_hija(w))
+        win.focus_force()
+
+    def mostrar_alerta(self, resultado):
+        vencidos, por_vencer = resultado
+        avisos = []
+        if por_vencer:
+            avisos.append(f"{por_vencer} lotes vencen en los próximos {DIAS_ALERTA_VENCIMIENTO} días")
+        if vencidos:
+            avisos.append(f"{vencidos} lotes vencieron en los últimos {DIAS_ALERTA_VENCIMIENTO} días")
+        self.lbl_alerta.configure(text="\n".join(avisos))
+
     def cerrar_hija(self, ventana):
         try:
             self.hijas_abiertas.remove(ventana)
@@ -221,6 +588,26 @@ class MainMenu(ctk.CTk):
             pass
         ventana.destroy()
 
+    def crear_respaldo(self):
+        # La copia no bloquea a las estaciones que siguen escaneando.
+        self.btn_respaldar.configure(state="disabled")
+        self.lbl_estado.configure(text="Creando respaldo...")
+        self.tarea_respaldo = TareaEnSegundoPlano(
+            self, respaldar,
+            al_terminar=self.fin_respaldo,
+            al_fallar=self.error_respaldo
+        )
+
+    def fin_respaldo(self, carpeta):
+        self.btn_respaldar.configure(state="normal")
+        self.lbl_estado.configure(text="")
+        messagebox.showinfo("Respaldo", f"Respaldo creado en:\n{carpeta}", parent=self)
+
+    def error_respaldo(self, error):
+        self.btn_respaldar.configure(state="normal")
+        self.lbl_estado.configure(text="")
+        messagebox.showerror("Error", f"No se pudo crear el respaldo:\n{error}", parent=self)
+
     def eliminar_todo_dialogo(self):
         password = simpledialog.askstring(
             "Eliminar todos los datos",
@@ -228,23 +615,88 @@ class MainMenu(ctk.CTk):
             show='*', parent=self)
         if password is None:
             return
-        if eliminar_todos_los_datos(password):
+        self.btn_eliminar_todo.configure(state="disabled")
+        futuro = ejecutor_bd.enviar(eliminar_todos_los_datos, password, clave="eliminar_todo")
+        self.trabajos.seguir(futuro, self.fin_eliminar_todo, self.error_eliminar_todo)
+
+    def fin_eliminar_todo(self, eliminados):
+        self.btn_eliminar_todo.configure(state="normal")
+        if eliminados:
             messagebox.showinfo("Éxito", "¡Todos los datos han sido eliminados!", parent=self)
         else:
             messagebox.showerror("Error", "Clave incorrecta. No se eliminaron los datos.", parent=self)
 
+    def error_eliminar_todo(self, error):
+        self.btn_eliminar_todo.configure(state="normal")
+        messagebox.showerror("Error", f"No se pudieron eliminar los datos:\n{error}", parent=self)
+
     def on_close(self):
         if self.hijas_abiertas:
             messagebox.showwarning("Atención", "Por favor, cierre primero las otras ventanas.", parent=self)
             return
         if messagebox.askyesno("Salir", "¿Está seguro de querer cerrar el sistema?", parent=self):
+            cerrar_camaras()
             self.destroy()
 
+def buscar_con_sugerencias(codigo):
+    # (producto, sugerencias). Si el CodeBar no existe pero sí el mismo GTIN escrito con
+    # otros ceros (UPC-A contra EAN-13), devuelve ese producto; si no, las sugerencias.
+    producto = fuente.buscar_producto_por_codebar(codigo)
+    if producto or not codigo:
+        return producto, []
+    sugeridos = fuente.sugerir_productos(codigo)
+    if sugeridos and sugeridos[0][0] == EQUIVALENTE:
+        return sugeridos[0][1], []
+    return None, sugeridos
+
+def editar_si_existe(codebar, sku, marca, producto):
+    # Para ejecutor_bd: la comprobación y la edición en el mismo trabajo.
+    if not fuente.buscar_producto_por_codebar(codebar):
+        return False
+    fuente.editar_producto(codebar, sku, marca, producto)
+    return True
+
+class PanelSugerencias(ctk.CTkFrame):
+    # Productos parecidos a un CodeBar que no existe, debajo del campo donde se escribió:
+    # un clic en uno llama a `al_elegir(producto)`. Oculto mientras no hay nada que mostrar.
+    def __init__(self, master, al_elegir):
+        super().__init__(master)
+        self.al_elegir = al_elegir
+        self.lbl_titulo = ctk.CTkLabel(self, text="", anchor="w", justify="left")
+        self.lbl_titulo.pack(fill="x", padx=7, pady=(4, 2))
+        self.botones = []
+
+    def mostrar(self, codigo, sugeridos):
+        for boton in self.botones:
+            boton.destroy()
+        self.botones = []
+        lineas = [aviso_gtin(codigo)] if aviso_gtin(codigo) else []
+        if sugeridos:
+            lineas.append(f"{codigo} no existe en la base de datos. ¿Quiso decir...?")
+        else:
+            lineas.append(f"{codigo} no existe en la base de datos y no hay productos parecidos.")
+        self.lbl_titulo.configure(text="\n".join(lineas), text_color="#f87171")
+        for motivo, producto in sugeridos:
+            sku, marca, nombre, codebar = producto
+            boton = ctk.CTkButton(self, text=f"{codebar}  {nombre} ({marca}, {sku}): {MOTIVOS[motivo]}", anchor="w",
+                                  fg_color="transparent", border_width=1, text_color=("gray10", "gray90"),
+                                  command=lambda p=producto: self.elegir(p))
+            boton.pack(fill="x", padx=7, pady=1)
+            self.botones.append(boton)
+        self.grid()
+
+    def elegir(self, producto):
+        self.ocultar()
+        self.al_elegir(producto)
+
+    def ocultar(self):
+        self.grid_remove()
+
 class AgregarProducto(ctk.CTkToplevel):
     def __init__(self, master):
         super().__init__(master)
         self.title("Agregar Nuevo Producto")
-        self.geometry("490x440")
+        self.geometry("490x540")
         self.resizable(False, False)
 
         LABEL_WIDTH = 25
@@ -259,28 +711,47 @@ class AgregarProducto(ctk.CTkToplevel):
         self.entry_codebar.grid(row=0, column=1, pady=(8,2), padx=8, sticky="w")
         ctk.CTkButton(form, text="Escanear CodeBar", command=self.scan_barcode_camera, width=180)\
             .grid(row=1, column=0, columnspan=2, pady=(0,14), padx=8, sticky="w")
+        self.panel_sugerencias = PanelSugerencias(form, self.elegir_sugerencia)
+        self.panel_sugerencias.grid(row=2, column=0, columnspan=2, pady=(0, 10), padx=8, sticky="ew")
+        self.panel_sugerencias.grid_remove()
 
-        ctk.CTkLabel(form, text="SKU:", width=LABEL_WIDTH, anchor="w").grid(row=2, column=0, sticky="w", pady=8, padx=8)
+        ctk.CTkLabel(form, text="SKU:", width=LABEL_WIDTH, anchor="w").grid(row=3, column=0, sticky="w", pady=8, padx=8)
         self.entry_sku = ctk.CTkEntry(form, width=220)
-        self.entry_sku.grid(row=2, column=1, pady=8, padx=8, sticky="w")
-        ctk.CTkLabel(form, text="Marca:", width=LABEL_WIDTH, anchor="w").grid(row=3, column=0, sticky="w", pady=8, padx=8)
+        self.entry_sku.grid(row=3, column=1, pady=8, padx=8, sticky="w")
+        ctk.CTkLabel(form, text="Marca:", width=LABEL_WIDTH, anchor="w").grid(row=4, column=0, sticky="w", pady=8, padx=8)
         self.entry_marca = ctk.CTkEntry(form, width=220)
-        self.entry_marca.grid(row=3, column=1, pady=8, padx=8, sticky="w")
-        ctk.CTkLabel(form, text="Producto (Nombre):", width=LABEL_WIDTH, anchor="w").grid(row=4, column=0, sticky="w", pady=8, padx=8)
+        self.entry_marca.grid(row=4, column=1, pady=8, padx=8, sticky="w")
+        ctk.CTkLabel(form, text="Producto (Nombre):", width=LABEL_WIDTH, anchor="w").grid(row=5, column=0, sticky="w", pady=8, padx=8)
         self.entry_producto = ctk.CTkEntry(form, width=220)
-        self.entry_producto.grid(row=4, column=1, pady=8, padx=8, sticky="w")
+        self.entry_producto.grid(row=5, column=1, pady=8, padx=8, sticky="w")
 
         self.btn_guardar = ctk.CTkButton(form, text="Guardar", command=self.guardar_producto, width=180)
-        self.btn_guardar.grid(row=5, column=0, pady=18, padx=8, sticky="w")
+        self.btn_guardar.grid(row=6, column=0, pady=18, padx=8, sticky="w")
+        self.lbl_estado = ctk.CTkLabel(form, text="", anchor="w")
+        self.lbl_estado.grid(row=12, column=0, columnspan=2, padx=8, sticky="w")
+        self.trabajos = IndicadorTrabajos(self.lbl_estado)
         ctk.CTkButton(form, text="Buscar por CodeBar", command=self.buscar_producto, width=180)\
-            .grid(row=5, column=1, pady=18, padx=8, sticky="w")
+            .grid(row=6, column=1, pady=18, padx=8, sticky="w")
 
         self.btn_editar = ctk.CTkButton(form, text="Editar producto", command=self.editar_producto, width=380, fg_color="#eab308", text_color="black")
-        self.btn_editar.grid(row=6, column=0, columnspan=2, pady=(0, 10), padx=8, sticky="w")
+        self.btn_editar.grid(row=7, column=0, columnspan=2, pady=(0, 10), padx=8, sticky="w")
         self.btn_editar.configure(state="disabled")
 
-        ctk.CTkButton(form, text="Importar productos desde Excel", command=self.importar_desde_excel, width=380, fg_color="#0ea5e9", text_color="white")\
-            .grid(row=7, column=0, columnspan=2, pady=(12, 0), padx=8, sticky="w")
+        self.btn_importar = ctk.CTkButton(form, text="Importar productos desde Excel", command=self.importar_desde_excel, width=380, fg_color="#0ea5e9", text_color="white")
+        self.btn_importar.grid(row=8, column=0, columnspan=2, pady=(12, 0), padx=8, sticky="w")
+        if fuente is not datos:
+            self.btn_importar.configure(state="disabled")
+
+        self.progreso_importacion = ctk.CTkProgressBar(form, width=380)
+        self.progreso_importacion.grid(row=9, column=0, columnspan=2, pady=(10, 0), padx=8, sticky="w")
+        self.lbl_importacion = ctk.CTkLabel(form, text="", anchor="w")
+        self.lbl_importacion.grid(row=10, column=0, columnspan=2, padx=8, sticky="w")
+        self.btn_cancelar_importacion = ctk.CTkButton(form, text="Cancelar importación", command=self.cancelar_importacion_excel, width=180, fg_color="#dc2626", text_color="white")
+        self.btn_cancelar_importacion.grid(row=11, column=0, columnspan=2, pady=(4, 0), padx=8, sticky="w")
+        self.progreso_importacion.grid_remove()
+        self.lbl_importacion.grid_remove()
+        self.btn_cancelar_importacion.grid_remove()
+        self.tarea_importacion = None
 
     def scan_barcode_camera(self):
         def on_detect(barcode):
@@ -296,23 +767,46 @@ class AgregarProducto(ctk.CTkToplevel):
         if not codebar or not sku or not marca or not producto:
             messagebox.showwarning("Campos vacíos", "Todos los campos son obligatorios.", parent=self)
             return
-        if buscar_producto_por_codebar(codebar):
+        aviso = aviso_gtin(codebar)
+        if aviso and not messagebox.askyesno("Dígito verificador", f"{aviso}\n¿Guardar de todas formas?", parent=self):
+            return
+        # El duplicado lo detecta la clave primaria dentro del mismo trabajo.
+        self.btn_guardar.configure(state="disabled")
+        futuro = ejecutor_bd.enviar(fuente.agregar_producto, codebar, sku, marca, producto, clave=("producto", codebar))
+        self.trabajos.seguir(futuro, self.fin_guardar_producto, self.error_guardar_producto)
+
+    def fin_guardar_producto(self, agregado):
+        self.btn_guardar.configure(state="normal")
+        if not agregado:
             messagebox.showwarning("Duplicado", "El CodeBar ya existe. Use otro o búsquelo.", parent=self)
             self.btn_editar.configure(state="normal")
             return
-        agregar_producto(codebar, sku, marca, producto)
         messagebox.showinfo("Éxito", "Producto guardado correctamente.", parent=self)
         self.btn_editar.configure(state="disabled")
         self.destroy()
 
+    def error_guardar_producto(self, error):
+        self.btn_guardar.configure(state="normal")
+        messagebox.showerror("Error", f"No se pudo guardar el producto:\n{error}", parent=self)
+
     def buscar_producto(self):
         codebar = self.entry_codebar.get().strip()
         if not codebar:
             messagebox.showwarning("Ingrese CodeBar", "Debe ingresar un CodeBar para buscar.", parent=self)
             self.btn_editar.configure(state="disabled")
             return
-        result = buscar_producto_por_codebar(codebar)
+        self.btn_editar.configure(state="disabled")
+        futuro = ejecutor_bd.enviar(buscar_con_sugerencias, codebar)
+        al_completar(self, futuro, lambda r: self.fin_buscar_producto(codebar, *r), self.error_consulta)
+
+    def fin_buscar_producto(self, codebar, result, sugeridos):
+        if self.entry_codebar.get().strip() != codebar:
+            # Se escribió otro código mientras se buscaba: vale la búsqueda más nueva.
+            return
         if result:
+            self.ocultar_sugerencias()
+            self.entry_codebar.delete(0, "end")
+            self.entry_codebar.insert(0, result[3])
             self.entry_sku.delete(0, "end")
             self.entry_sku.insert(0, result[0])
             self.entry_marca.delete(0, "end")
@@ -320,10 +814,27 @@ class AgregarProducto(ctk.CTkToplevel):
             self.entry_producto.delete(0, "end")
             self.entry_producto.insert(0, result[2])
             self.btn_editar.configure(state="normal")
-            messagebox.showinfo("Encontrado", "Producto encontrado y campos actualizados.", parent=self)
+            aviso = "" if result[3] == codebar else f"\n{codebar} es el mismo código que {result[3]}, que ya existe."
+            messagebox.showinfo("Encontrado", "Producto encontrado y campos actualizados." + aviso, parent=self)
         else:
-            self.btn_editar.configure(state="disabled")
-            messagebox.showerror("No encontrado", "No existe ese CodeBar.", parent=self)
+            # Sin ventana emergente: lo parecido (o que no hay nada) se muestra bajo el campo.
+            self.geometry(f"490x{540 + 40 + 34 * len(sugeridos)}")
+            self.panel_sugerencias.mostrar(codebar, sugeridos)
+
+    def elegir_sugerencia(self, producto):
+        self.entry_codebar.delete(0, "end")
+        self.entry_codebar.insert(0, producto[3])
+        self.buscar_producto()
+
+    def error_consulta(self, error):
+        if isinstance(error, ConnectionError):
+            messagebox.showerror("Sin conexión", str(error), parent=self)
+        else:
+            messagebox.showerror("Error", f"No se pudo consultar la base de datos:\n{error}", parent=self)
+
+    def ocultar_sugerencias(self):
+        self.panel_sugerencias.ocultar()
+        self.geometry("490x540")
 
     def editar_producto(self):
         codebar = self.entry_codebar.get().strip()
@@ -333,58 +844,85 @@ class AgregarProducto(ctk.CTkToplevel):
         if not codebar or not sku or not marca or not producto:
             messagebox.showwarning("Campos vacíos", "Todos los campos son obligatorios.", parent=self)
             return
-        if not buscar_producto_por_codebar(codebar):
+        self.btn_editar.configure(state="disabled")
+        futuro = ejecutor_bd.enviar(editar_si_existe, codebar, sku, marca, producto, clave=("producto", codebar))
+        self.trabajos.seguir(futuro, self.fin_editar_producto, self.error_editar_producto)
+
+    def fin_editar_producto(self, editado):
+        if not editado:
             messagebox.showerror("No existe", "No existe un producto con ese CodeBar.", parent=self)
-            self.btn_editar.configure(state="disabled")
             return
-        editar_producto(codebar, sku, marca, producto)
         messagebox.showinfo("Éxito", "Producto actualizado correctamente.", parent=self)
-        self.btn_editar.configure(state="disabled")
         self.destroy()
 
+    def error_editar_producto(self, error):
+        self.btn_editar.configure(state="normal")
+        titulo = "Sin conexión" if isinstance(error, ConnectionError) else "Error"
+        messagebox.showerror(titulo, f"No se pudo actualizar el producto:\n{error}", parent=self)
+
     def importar_desde_excel(self):
+        if self.tarea_importacion and self.tarea_importacion.activa:
+            return
         ruta = filedialog.askopenfilename(
-            title="Selecciona archivo Excel",
-            filetypes=[("Archivos Excel", "*.xlsx")],
+            title="Selecciona archivo Excel o CSV",
+            filetypes=[("Archivos Excel", "*.xlsx"), ("Archivos CSV", "*.csv")],
             parent=self
         )
         if not ruta:
             return
-        try:
-            libro = openpyxl.load_workbook(ruta)
-            hoja = libro.active
-            headers = [cell.value for cell in next(hoja.iter_rows(min_row=1, max_row=1))]
-            try:
-                idx_codebar = headers.index("codebar")
-                idx_sku = headers.index("sku")
-                idx_marca = headers.index("marca")
-                idx_producto = headers.index("producto")
-            except ValueError:
-                messagebox.showerror("Formato incorrecto", "El archivo debe tener columnas: codebar, sku, marca, producto (en la primera fila)", parent=self)
-                return
+        self.btn_importar.configure(state="disabled")
+        self.progreso_importacion.set(0)
+        self.progreso_importacion.grid()
+        self.lbl_importacion.configure(text="Importando...")
+        self.lbl_importacion.grid()
+        self.btn_cancelar_importacion.grid()
+        self.tarea_importacion = TareaEnSegundoPlano(
+            self, importar_productos_archivo, ruta,
+            al_progresar=self.progreso_importar_excel,
+            al_terminar=self.fin_importar_excel,
+            al_fallar=self.error_importar_excel,
+            al_cancelar=self.cancelada_importar_excel
+        )
 
-            agregados = 0
-            actualizados = 0
-            for fila in hoja.iter_rows(min_row=2, values_only=True):
-                codebar = str(fila[idx_codebar]).strip() if fila[idx_codebar] else ""
-                sku = str(fila[idx_sku]).strip() if fila[idx_sku] else ""
-                marca = str(fila[idx_marca]).strip() if fila[idx_marca] else ""
-                producto = str(fila[idx_producto]).strip() if fila[idx_producto] else ""
-                if not (codebar and sku and marca and producto):
-                    continue
-                if buscar_producto_por_codebar(codebar):
-                    editar_producto(codebar, sku, marca, producto)
-                    actualizados += 1
-                else:
-                    agregar_producto(codebar, sku, marca, producto)
-                    agregados += 1
-            messagebox.showinfo(
-                "Importación finalizada",
-                f"Productos agregados: {agregados}\nProductos actualizados: {actualizados}",
-                parent=self
-            )
-        except Exception as e:
-            messagebox.showerror("Error", f"No se pudo importar:\n{e}", parent=self)
+    def cancelar_importacion_excel(self):
+        if self.tarea_importacion:
+            self.tarea_importacion.cancelar()
+            self.lbl_importacion.configure(text="Cancelando...")
+
+    def progreso_importar_excel(self, procesadas, total, conteo):
+        if total:
+            self.progreso_importacion.set(min(1, procesadas / total))
+        self.lbl_importacion.configure(
+            text=f"Filas: {procesadas}  Agregados: {conteo['agregados']}  "
+                 f"Actualizados: {conteo['actualizados']}  Omitidos: {conteo['omitidos']}"
+        )
+
+    def terminar_importacion_excel(self):
+        self.tarea_importacion = None
+        self.btn_importar.configure(state="normal")
+        self.progreso_importacion.grid_remove()
+        self.lbl_importacion.grid_remove()
+        self.btn_cancelar_importacion.grid_remove()
+
+    def fin_importar_excel(self, conteo):
+        self.terminar_importacion_excel()
+        messagebox.showinfo(
+            "Importación finalizada",
+            f"Productos agregados: {conteo['agregados']}\nProductos actualizados: {conteo['actualizados']}\n"
+            f"Filas omitidas: {conteo['omitidos']}",
+            parent=self
+        )
+
+    def error_importar_excel(self, error):
+        self.terminar_importacion_excel()
+        if isinstance(error, FormatoIncorrecto):
+            messagebox.showerror("Formato incorrecto", str(error), parent=self)
+        else:
+            messagebox.showerror("Error", f"No se pudo importar:\n{error}", parent=self)
+
+    def cancelada_importar_excel(self):
+        self.terminar_importacion_excel()
+        messagebox.showinfo("Importación cancelada", "No se importó ningún producto.", parent=self)
 
 class InventarioApp(ctk.CTkToplevel):
     def __init__(self, master):
@@ -411,6 +949,28 @@ class InventarioApp(ctk.CTkToplevel):
         self.entry_codebar.bind("<Return>", self.leer_codebar)
         ctk.CTkButton(frame1, text="Buscar", command=self.leer_codebar, width=BUTTON_WIDTH).grid(row=0, column=2, padx=7, pady=7, sticky="w")
         ctk.CTkButton(frame1, text="Escanear CodeBar", command=self.scan_barcode_camera, width=BUTTON_WIDTH).grid(row=0, column=3, padx=7, pady=7, sticky="w")
+        self.var_continuo = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(frame1, text="Escaneo continuo", variable=self.var_continuo).grid(row=0, column=4, padx=7, pady=7, sticky="w")
+        self.lector_camara = None
+
+        # Modo lector (lector USB que escribe como teclado): cada lectura agrega una
+        # línea con la cantidad indicada, sin ventanas emergentes que roben el foco.
+        frame_lector = ctk.CTkFrame(frame1, fg_color="transparent")
+        frame_lector.grid(row=0, column=5, padx=7, pady=7, sticky="w")
+        self.var_modo_lector = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(frame_lector, text="Modo lector", variable=self.var_modo_lector, command=self.cambiar_modo_lector).pack(side="left")
+        ctk.CTkLabel(frame_lector, text="Cant.:").pack(side="left", padx=(7, 2))
+        self.entry_cant_lector = ctk.CTkEntry(frame_lector, width=50)
+        self.entry_cant_lector.insert(0, "1")
+        self.entry_cant_lector.pack(side="left")
+        self.lbl_lector = ctk.CTkLabel(frame1, text="", anchor="w")
+        self.lbl_lector.grid(row=2, column=0, columnspan=6, padx=7, sticky="w")
+        self.panel_sugerencias = PanelSugerencias(frame1, self.elegir_sugerencia)
+        self.panel_sugerencias.grid(row=3, column=0, columnspan=6, padx=7, pady=(0, 7), sticky="ew")
+        self.panel_sugerencias.grid_remove()
+        self.captura_lector = None
+        self.lecturas_lector = 0
+        self.lecturas_en_curso = deque()
 
         self.var_sku = ctk.StringVar()
         self.var_marca = ctk.StringVar()
@@ -455,12 +1015,41 @@ class InventarioApp(ctk.CTkToplevel):
         frame_agregar = ctk.CTkFrame(self)
         frame_agregar.pack(fill="x", padx=10, pady=(0, 5))
         ctk.CTkButton(frame_agregar, text="Agregar a Tabla", command=self.agregar_a_tabla, width=BUTTON_WIDTH).pack(side="left", padx=5)
-        ctk.CTkButton(frame_agregar, text="Exportar a Excel", command=self.exportar_excel, width=BUTTON_WIDTH).pack(side="left", padx=5)
+        ctk.CTkButton(frame_agregar, text="Exportar a Excel", command=self.exportar_excel, width=BUTTON_WIDTH,
+                      state="normal" if fuente is datos else "disabled").pack(side="left", padx=5)
+        ctk.CTkButton(frame_agregar, text="Conciliar manifiesto", command=self.abrir_conciliacion, width=BUTTON_WIDTH,
+                      state="normal" if fuente is datos else "disabled").pack(side="left", padx=5)
         ctk.CTkButton(frame_agregar, text="Limpiar Tabla", command=self.limpiar_tabla, width=BUTTON_WIDTH).pack(side="left", padx=5)
+        ctk.CTkButton(frame_agregar, text="Recargar Tabla", command=self.cargar_importaciones, width=BUTTON_WIDTH).pack(side="left", padx=5)
         self.btn_editar = ctk.CTkButton(frame_agregar, text="Guardar Cambios", command=self.guardar_cambios, width=BUTTON_WIDTH, state="disabled")
         self.btn_editar.pack(side="left", padx=5)
         self.btn_eliminar = ctk.CTkButton(frame_agregar, text="Eliminar Seleccionado", command=self.eliminar_seleccionado, width=BUTTON_WIDTH, fg_color="#dc2626", text_color="white", state="disabled")
         self.btn_eliminar.pack(side="left", padx=5)
+        # Sesión de recepción: las líneas se acumulan (con diario en disco) y se
+        # guardan todas juntas al cerrar la importación.
+        self.btn_sesion = ctk.CTkButton(frame_agregar, text="Abrir sesión", command=self.alternar_sesion, width=BUTTON_WIDTH)
+        self.btn_sesion.pack(side="left", padx=5)
+        self.sesion = None
+        self.lbl_sesion = ctk.CTkLabel(frame_agregar, text="", text_color="#f59e0b")
+        self.lbl_sesion.pack(side="left", padx=5)
+        self.lbl_estado = ctk.CTkLabel(frame_agregar, text="")
+        self.lbl_estado.pack(side="left", padx=5)
+        self.trabajos = IndicadorTrabajos(self.lbl_estado)
+
+        frame_filtro = ctk.CTkFrame(self)
+        frame_filtro.pack(fill="x", padx=10, pady=(5, 0))
+        ctk.CTkLabel(frame_filtro, text="Filtrar (producto, marca, SKU, lote, observaciones):").pack(side="left", padx=7)
+        self.entry_filtro = ctk.CTkEntry(frame_filtro, width=360)
+        self.entry_filtro.pack(side="left", padx=7, pady=5)
+        self.entry_filtro.bind("<KeyRelease>", self.programar_filtro)
+        self.lbl_filtro = ctk.CTkLabel(frame_filtro, text="")
+        self.lbl_filtro.pack(side="left", padx=7)
+        # Las importaciones archivadas se ven (en solo lectura) solo si se pide.
+        self.var_con_archivo = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(frame_filtro, text="Incluir archivo", variable=self.var_con_archivo, command=self.cambiar_archivo,
+                      state="normal" if fuente is datos else "disabled").pack(side="right", padx=7)
+        self.filtro_pendiente = None
+        self.buscador = None
 
         frame3 = ctk.CTkFrame(self)
         frame3.pack(fill="both", expand=True, padx=10, pady=5)
@@ -474,38 +1063,176 @@ class InventarioApp(ctk.CTkToplevel):
             self.tree.heading(col, text=col.replace("_", " ").title())
             self.tree.column(col, width=110 if col not in ("observaciones", "lote", "fecha_expira", "producto") else 150, anchor="center")
         self.tree.pack(fill="both", expand=True, side="left")
-        ttk.Scrollbar(frame3, orient="vertical", command=self.tree.yview).pack(side="right", fill="y")
-        self.tree.configure(yscrollcommand=lambda f, l: self.tree.yview_moveto(f))
+        scrollbar = ttk.Scrollbar(frame3, orient="vertical")
+        scrollbar.pack(side="right", fill="y")
 
         self.tree.tag_configure("verde", background="#31c48d")
         self.tree.tag_configure("roja", background="#f87171")
+        self.tree.tag_configure("preparada", background="#fde68a")
 
         self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
 
         self.producto_actual = None
         self.rowid_map = {}
 
-        self.cargar_importaciones()
+        # Las lecturas de la grilla corren en ejecutor_bd; al llegar se vuelve a pintar.
+        self.aviso_lectura = ""
+        self.reintento_lectura = None
+        self.modelo = ModeloImportaciones(fuente=fuente, ejecutar=self.leer_en_segundo_plano,
+                                          al_cambiar=self.al_cambiar_modelo, al_fallar=self.error_lectura)
+        self.revisando_pendientes = False
+        self.tabla = TablaVirtual(self.tree, scrollbar, self.modelo, self.rowid_map, self.tag_fila)
+        self.tabla.renderizar()
+
+        if fuente is not datos:
+            # Envíos en cola o rechazados de una ejecución anterior.
+            if fuente.pendientes:
+                self.revisar_pendientes()
+            else:
+                self.mostrar_estado_sync(0)
+
+        # En modo servidor cada sesión se consulta al servidor: no en el hilo de Tk.
+        al_completar(self, ejecutor_bd.enviar(sesiones_interrumpidas, fuente), self.ofrecer_sesiones)
 
+    def leer_en_segundo_plano(self, funcion, args, al_terminar, al_fallar):
+        al_completar(self, ejecutor_bd.enviar(funcion, *args), al_terminar, al_fallar)
+
+    def ofrecer_sesiones(self, interrumpidas):
+        if interrumpidas:
+            self.after(200, lambda: self.restaurar_sesion(interrumpidas[0]))
+
+    def destroy(self):
+        if self.sesion is not None:
+            self.sesion.cerrar()
+        super().destroy()
+
+    def tag_fila(self, fila):
+        return "verde" if fila[8] == 0 else "roja"
+
+    @medido
     def cargar_importaciones(self):
-        for x in self.tree.get_children():
-            self.tree.delete(x)
-        self.rowid_map.clear()
-        for row in buscar_importaciones():
-            rowid = row[0]
-            fila = row[1:]
-            tag = "verde" if fila[8] == 0 else "roja"
-            item_id = self.tree.insert("", "end", values=fila, tags=(tag,))
-            self.rowid_map[item_id] = rowid
+        self.modelo.recargar(desde_rowid=0)
+        self.tabla.renderizar()
+
+    def cambiar_archivo(self):
+        origen = FuenteConArchivo() if self.var_con_archivo.get() else fuente
+        self.modelo.fuente = origen
+        if self.buscador is not None:
+            self.buscador.fuente = origen
+        self.modelo.recargar()
+        self.tabla.renderizar()
+        if self.entry_filtro.get().strip():
+            self.filtrar()
+
+    def archivada(self, rowid):
+        if isinstance(self.modelo.fuente, FuenteConArchivo) and self.modelo.fuente.archivada(rowid):
+            messagebox.showwarning("Solo lectura", "El archivo es de solo lectura: esta línea no se puede modificar.", parent=self)
+            return True
+        return False
+
+    def programar_filtro(self, event=None):
+        # Espera a que el usuario deje de escribir antes de lanzar la búsqueda.
+        if self.filtro_pendiente is not None:
+            self.after_cancel(self.filtro_pendiente)
+        self.filtro_pendiente = self.after(250, self.filtrar)
+
+    def filtrar(self):
+        self.filtro_pendiente = None
+        if self.buscador is None:
+            self.buscador = BuscadorImportaciones(self.modelo.tamano_pagina, fuente=self.modelo.fuente)
+            self.after(30, self.revisar_filtro)
+        self.buscador.buscar(self.entry_filtro.get().strip(), self.modelo.desde_rowid)
+        self.lbl_filtro.configure(text="Buscando...")
+
+    def revisar_filtro(self):
+        if not self.winfo_exists():
+            self.buscador.detener()
+            return
+        ultimo = None
+        while True:
+            try:
+                ultimo = self.buscador.resultados.get_nowait()
+            except queue.Empty:
+                break
+        # Solo se aplica el resultado de la búsqueda más reciente.
+        if ultimo is not None and ultimo[0] == self.buscador.generacion:
+            _, expresion, total, pagina, max_rowid = ultimo
+            self.modelo.aplicar_busqueda(expresion, total, pagina, max_rowid)
+            self.tabla.primera = 0
+            self.tabla.renderizar()
+            self.lbl_filtro.configure(text=f"{total} coincidencias" if expresion else "")
+        self.after(30, self.revisar_filtro)
+
+    def refrescar_fila(self, rowid):
+        # Actualiza solo la fila de ese rowid en el modelo (insertada, modificada
+        # o eliminada) y vuelve a pintar las filas visibles, sin recargar la tabla.
+        if rowid is None:
+            # Sin conexión con el servidor: la línea quedó en la cola de reintentos.
+            self.revisar_pendientes()
+            return
+        self.modelo.refrescar_fila(rowid)
+        self.tabla.renderizar()
+
+    def mostrar_estado_sync(self, pendientes):
+        avisos = [self.aviso_lectura] if self.aviso_lectura else []
+        if pendientes:
+            avisos.append(f"{pendientes} líneas sin enviar al servidor")
+        if fuente is not datos and fuente.rechazados:
+            avisos.append(f"{fuente.rechazados} líneas rechazadas por el servidor (ver {fuente.archivo_rechazados})")
+        self.lbl_estado.configure(text="; ".join(avisos))
+
+    def error_lectura(self, error):
+        # Sin servidor (o con un error al leer) la tabla se queda con lo que ya mostraba,
+        # se avisa en la barra y se vuelve a leer más tarde, sin cuadros de diálogo.
+        if isinstance(error, ConnectionError):
+            self.aviso_lectura = "Sin conexión con el servidor: la tabla puede estar desactualizada"
+        else:
+            self.aviso_lectura = f"No se pudo leer la tabla: {error}"
+        self.mostrar_estado_sync(fuente.pendientes if fuente is not datos else 0)
+        if self.reintento_lectura is None:
+            self.reintento_lectura = self.after(5000, self.reintentar_lectura)
+
+    def reintentar_lectura(self):
+        self.reintento_lectura = None
+        self.modelo.recargar()
+        self.tabla.renderizar()
+
+    def al_cambiar_modelo(self):
+        if self.aviso_lectura:
+            self.aviso_lectura = ""
+            self.mostrar_estado_sync(fuente.pendientes if fuente is not datos else 0)
+        self.tabla.renderizar()
+
+    def revisar_pendientes(self):
+        if not self.winfo_exists():
+            return
+        pendientes = fuente.pendientes
+        self.mostrar_estado_sync(pendientes)
+        if pendientes:
+            if not self.revisando_pendientes:
+                self.revisando_pendientes = True
+                self.after(2000, self.seguir_pendientes)
+        else:
+            self.modelo.recargar()
+            self.tabla.renderizar()
+
+    def seguir_pendientes(self):
+        self.revisando_pendientes = False
+        self.revisar_pendientes()
 
     def on_tree_select(self, event):
         selected = self.tree.selection()
         if not selected:
+            if self.tabla.rowid_seleccionado is not None:
+                # La fila seleccionada solo salió del área visible al desplazarse.
+                return
             self.btn_editar.configure(state="disabled")
             self.btn_eliminar.configure(state="disabled")
             self.edit_rowid = None
             return
         item_id = selected[0]
+        if self.rowid_map.get(item_id) == self.edit_rowid:
+            return
         fila = self.tree.item(item_id)["values"]
         self.entry_importacion_no.delete(0, "end")
         self.entry_importacion_no.insert(0, fila[0])
@@ -529,6 +1256,72 @@ class InventarioApp(ctk.CTkToplevel):
         self.btn_editar.configure(state="normal")
         self.btn_eliminar.configure(state="normal")
 
+    def alternar_sesion(self):
+        if self.sesion is None:
+            importacion_no = self.entry_importacion_no.get().strip()
+            if not importacion_no:
+                messagebox.showwarning("Campo requerido", "Indique el número de importación de la sesión.", parent=self)
+                return
+            self.abrir_sesion(SesionRecepcion(importacion_no, fuente=fuente))
+        else:
+            self.cerrar_sesion()
+
+    def abrir_sesion(self, sesion):
+        self.sesion = sesion
+        self.modelo.preparadas = sesion.lineas
+        self.entry_importacion_no.delete(0, "end")
+        self.entry_importacion_no.insert(0, sesion.importacion_no)
+        self.btn_sesion.configure(text="Cerrar importación")
+        self.actualizar_sesion()
+
+    def restaurar_sesion(self, sesion):
+        if not self.winfo_exists() or self.sesion is not None:
+            return
+        respuesta = messagebox.askyesnocancel(
+            "Sesión sin guardar",
+            f"La importación {sesion.importacion_no} tiene {len(sesion.lineas)} líneas sin guardar "
+            f"(sesión iniciada el {sesion.inicio.replace('T', ' ')}).\n\n"
+            "Sí: continuar la sesión.  No: descartarla.  Cancelar: decidir más tarde.",
+            parent=self)
+        if respuesta:
+            self.abrir_sesion(sesion)
+        elif respuesta is False:
+            sesion.descartar()
+
+    def actualizar_sesion(self):
+        texto = ""
+        if self.sesion is not None:
+            texto = f"Importación {self.sesion.importacion_no}: {len(self.sesion.lineas)} líneas sin guardar"
+        self.lbl_sesion.configure(text=texto)
+        self.tabla.renderizar()
+
+    def cerrar_sesion(self):
+        sesion = self.sesion
+        if not messagebox.askyesno("Cerrar importación",
+                                   f"¿Guardar las {len(sesion.lineas)} líneas de la importación {sesion.importacion_no}?",
+                                   parent=self):
+            return
+        # Lo que se escanee mientras se guarda ya no entra en esta sesión.
+        self.sesion = None
+        self.btn_sesion.configure(state="disabled")
+        self.lbl_sesion.configure(text=f"Guardando {len(sesion.lineas)} líneas...")
+        futuro = ejecutor_bd.enviar(sesion.confirmar)
+        self.trabajos.seguir(futuro, self.fin_cerrar_sesion, lambda error: self.error_cerrar_sesion(sesion, error))
+
+    def fin_cerrar_sesion(self, ids):
+        self.btn_sesion.configure(state="normal", text="Abrir sesión")
+        self.modelo.preparadas = []
+        self.modelo.recargar()
+        self.actualizar_sesion()
+        if ids is None:
+            self.revisar_pendientes()
+
+    def error_cerrar_sesion(self, sesion, error):
+        self.btn_sesion.configure(state="normal")
+        self.error_bd(error)
+        if self.sesion is None:
+            self.abrir_sesion(sesion)
+
     def guardar_cambios(self):
         if self.edit_rowid is None:
             return
@@ -560,19 +1353,51 @@ class InventarioApp(ctk.CTkToplevel):
         recibida = int(cant_recibida)
         rechazada = int(cant_rechazada)
         aceptada = max(0, recibida - rechazada)
-        actualizar_importacion(self.edit_rowid, importacion_no, sku, marca, producto, codebar, lote, fecha_expira_formatted, recibida, rechazada, aceptada, observaciones)
+        rowid = self.edit_rowid
+        if rowid < 0:
+            # Línea de la sesión abierta, todavía sin guardar.
+            if self.sesion is not None:
+                self.sesion.reemplazar(-1 - rowid, (importacion_no, sku, marca, producto, codebar, lote,
+                                                    fecha_expira_formatted, recibida, rechazada, aceptada, observaciones))
+                self.limpiar_campos()
+                self.actualizar_sesion()
+            return
+        if self.archivada(rowid):
+            return
+        futuro = ejecutor_bd.enviar(
+            fuente.actualizar_importacion, rowid, importacion_no, sku, marca, producto, codebar, lote,
+            fecha_expira_formatted, recibida, rechazada, aceptada, observaciones, clave=("importacion", rowid)
+        )
+        self.trabajos.seguir(futuro, lambda _: self.fin_guardar_cambios(rowid), self.error_bd)
+
+    def fin_guardar_cambios(self, rowid):
         messagebox.showinfo("Éxito", "Importación actualizada correctamente.", parent=self)
-        self.cargar_importaciones()
-        self.limpiar_campos()
+        self.refrescar_fila(rowid)
+        if self.edit_rowid == rowid:
+            self.limpiar_campos()
 
     def eliminar_seleccionado(self):
-        if self.edit_rowid is None:
+        if self.edit_rowid is None or (self.edit_rowid >= 0 and self.archivada(self.edit_rowid)):
             return
         if messagebox.askyesno("Confirmar", "¿Seguro que deseas eliminar esta importación?", parent=self):
-            eliminar_importacion_por_rowid(self.edit_rowid)
-            self.cargar_importaciones()
+            rowid = self.edit_rowid
+            if rowid < 0:
+                if self.sesion is not None:
+                    self.sesion.quitar(-1 - rowid)
+                    self.limpiar_campos()
+                    self.actualizar_sesion()
+                return
+            futuro = ejecutor_bd.enviar(fuente.eliminar_importacion_por_rowid, rowid, clave=("importacion", rowid))
+            self.trabajos.seguir(futuro, lambda _: self.fin_eliminar_seleccionado(rowid), self.error_bd)
+
+    def fin_eliminar_seleccionado(self, rowid):
+        self.refrescar_fila(rowid)
+        if self.edit_rowid == rowid:
             self.limpiar_campos()
 
+    def error_bd(self, error):
+        messagebox.showerror("Error", f"No se pudo guardar en la base de datos:\n{error}", parent=self)
+
     def limpiar_campos(self):
         self.entry_importacion_no.delete(0, "end")
         self.entry_cant_recibida.delete(0, "end")
@@ -581,38 +1406,83 @@ class InventarioApp(ctk.CTkToplevel):
         self.entry_lote.delete(0, "end")
         self.entry_fecha_expira.delete(0, "end")
         self.entry_observaciones.delete("0.0", "end")
+        self.limpiar_producto()
+        self.btn_editar.configure(state="disabled")
+        self.btn_eliminar.configure(state="disabled")
+        self.edit_rowid = None
+        self.tabla.limpiar_seleccion()
+        if self.sesion is not None:
+            self.entry_importacion_no.insert(0, self.sesion.importacion_no)
+
+    def limpiar_producto(self):
         self.entry_codebar.delete(0, "end")
         self.var_sku.set("")
         self.var_marca.set("")
         self.var_producto.set("")
-        self.btn_editar.configure(state="disabled")
-        self.btn_eliminar.configure(state="disabled")
-        self.edit_rowid = None
+        self.var_codebar.set("")
+        self.producto_actual = None
+        self.panel_sugerencias.ocultar()
 
-    def leer_codebar(self, event=None):
+    def leer_codebar(self, event=None, continuo=False):
+        # La consulta corre en ejecutor_bd; mientras tanto no hay producto elegido.
         codebar = self.entry_codebar.get().strip()
-        producto = buscar_producto_por_codebar(codebar)
+        self.producto_actual = None
+        futuro = ejecutor_bd.enviar(buscar_con_sugerencias, codebar)
+        al_completar(self, futuro, lambda r: self.fin_leer_codebar(codebar, continuo, *r), self.error_consulta)
+
+    def fin_leer_codebar(self, codebar, continuo, producto, sugeridos):
+        # En escaneo continuo cuenta cada lectura; a mano, solo la del código que sigue escrito.
+        if not continuo and self.entry_codebar.get().strip() != codebar:
+            return
         if producto:
+            self.panel_sugerencias.ocultar()
+            if producto[3] != codebar:
+                # El mismo GTIN con otros ceros: queda el CodeBar del catálogo.
+                self.entry_codebar.delete(0, "end")
+                self.entry_codebar.insert(0, producto[3])
             self.var_sku.set(producto[0])
             self.var_marca.set(producto[1])
             self.var_producto.set(producto[2])
             self.var_codebar.set(producto[3])
             self.producto_actual = producto
-            self.entry_importacion_no.focus_set()
+            if continuo:
+                # Escaneo continuo: cada código agrega una línea con los mismos datos de recepción.
+                self.agregar_a_tabla(continuo=True)
+            else:
+                self.entry_importacion_no.focus_set()
         else:
             self.var_sku.set("")
             self.var_marca.set("")
             self.var_producto.set("")
             self.var_codebar.set("")
             self.producto_actual = None
-            messagebox.showerror("No encontrado", "Producto no existe en la base de datos.", parent=self)
+            if not codebar:
+                messagebox.showerror("No encontrado", "Producto no existe en la base de datos.", parent=self)
+                return
+            # Sin ventana emergente: lo parecido (o que no hay nada) se muestra bajo el campo.
+            self.panel_sugerencias.mostrar(codebar, sugeridos)
+
+    def elegir_sugerencia(self, producto):
+        self.entry_codebar.delete(0, "end")
+        self.entry_codebar.insert(0, producto[3])
+        self.leer_codebar()
+
+    def error_consulta(self, error):
+        if isinstance(error, ConnectionError):
+            messagebox.showerror("Sin conexión", str(error), parent=self)
+        else:
+            messagebox.showerror("Error", f"No se pudo consultar la base de datos:\n{error}", parent=self)
 
     def scan_barcode_camera(self):
-        def on_detect(barcode):
-            self.entry_codebar.delete(0, "end")
-            self.entry_codebar.insert(0, barcode)
-            self.leer_codebar()
-        BarcodeCameraReader(on_detect, camera_index=0)
+        if self.lector_camara is not None and self.lector_camara.running:
+            self.lector_camara.focus_force()
+            return
+        self.lector_camara = BarcodeCameraReader(self.on_detect_camara, camera_index=0, continuo=self.var_continuo.get())
+
+    def on_detect_camara(self, barcode):
+        self.entry_codebar.delete(0, "end")
+        self.entry_codebar.insert(0, barcode)
+        self.leer_codebar(continuo=self.lector_camara is not None and self.lector_camara.continuo)
 
     def update_cant_aceptada(self, event=None):
         try:
@@ -626,22 +1496,19 @@ class InventarioApp(ctk.CTkToplevel):
         aceptada = max(0, recibida - rechazada)
         self.var_cant_aceptada.set(str(aceptada))
 
-    def agregar_a_tabla(self):
-        if not self.producto_actual:
-            messagebox.showwarning("Sin producto", "Debe buscar primero un producto válido.", parent=self)
-            return
+    def armar_linea(self, producto, cant_recibida, cant_rechazada):
+        # Línea de importación con el producto dado y los datos de recepción del
+        # formulario. Devuelve (fila, None) o (None, (título, mensaje)).
         importacion_no = self.entry_importacion_no.get().strip()
-        cant_recibida = self.entry_cant_recibida.get().strip()
-        cant_rechazada = self.entry_cant_rechazada.get().strip()
         lote = self.entry_lote.get().strip()
         fecha_expira = self.entry_fecha_expira.get().strip()
         observaciones = self.entry_observaciones.get("0.0", "end").strip()
         if not importacion_no:
-            messagebox.showwarning("Campo requerido", "Debe indicar el número de importación.", parent=self)
-            return
+            return None, ("Campo requerido", "Debe indicar el número de importación.")
+        if self.sesion is not None and importacion_no != self.sesion.importacion_no:
+            return None, ("Sesión abierta", f"La sesión abierta es de la importación {self.sesion.importacion_no}.")
         if not cant_recibida.isdigit() or not cant_rechazada.isdigit():
-            messagebox.showwarning("Datos inválidos", "Las cantidades deben ser números enteros.", parent=self)
-            return
+            return None, ("Datos inválidos", "Las cantidades deben ser números enteros.")
         try:
             if fecha_expira:
                 dt = datetime.strptime(fecha_expira, '%d/%m/%Y')
@@ -649,35 +1516,137 @@ class InventarioApp(ctk.CTkToplevel):
             else:
                 fecha_expira_formatted = ""
         except:
-            messagebox.showwarning("Fecha inválida", "La fecha de expiración debe tener formato dd/mm/aaaa.", parent=self)
-            return
+            return None, ("Fecha inválida", "La fecha de expiración debe tener formato dd/mm/aaaa.")
 
         recibida = int(cant_recibida)
         rechazada = int(cant_rechazada)
         aceptada = max(0, recibida - rechazada)
-        fila = (
-            importacion_no,
-            self.var_sku.get(),
-            self.var_marca.get(),
-            self.var_producto.get(),
-            self.var_codebar.get(),
-            lote, fecha_expira_formatted,
-            recibida, rechazada, aceptada, observaciones
-        )
-        agregar_importacion(*fila)
-        self.cargar_importaciones()
-        self.limpiar_campos()
+        sku, marca, nombre, codebar = producto
+        return (importacion_no, sku, marca, nombre, codebar, lote, fecha_expira_formatted,
+                recibida, rechazada, aceptada, observaciones), None
+
+    def guardar_linea(self, fila, nueva, al_fallar=None):
+        if self.sesion is not None:
+            self.sesion.agregar(fila)
+            self.actualizar_sesion()
+            return
+        # Con `nueva` (escaneo continuo o modo lector) cada lectura es una línea nueva;
+        # a mano, un doble clic con los mismos datos se une al envío anterior en lugar
+        # de duplicar la línea.
+        clave = None if nueva else ("agregar", fila)
+        futuro = ejecutor_bd.enviar(fuente.agregar_importacion, *fila, clave=clave)
+        self.trabajos.seguir(futuro, self.refrescar_fila, al_fallar or self.error_bd)
+
+    def agregar_a_tabla(self, continuo=False):
+        if not self.producto_actual:
+            messagebox.showwarning("Sin producto", "Debe buscar primero un producto válido.", parent=self)
+            return
+        fila, error = self.armar_linea(self.producto_actual, self.entry_cant_recibida.get().strip(),
+                                       self.entry_cant_rechazada.get().strip())
+        if error:
+            messagebox.showwarning(*error, parent=self)
+            return
+        self.guardar_linea(fila, nueva=continuo)
+        if continuo:
+            self.limpiar_producto()
+        else:
+            self.limpiar_campos()
+
+    def cambiar_modo_lector(self):
+        if self.captura_lector is None:
+            self.captura_lector = CapturaEscaner(self, self.al_leer_lector)
+        if self.var_modo_lector.get():
+            self.captura_lector.activar()
+            self.lecturas_lector = 0
+            self.mostrar_lector("Modo lector activo: escanee los productos.")
+        else:
+            self.captura_lector.desactivar()
+            self.mostrar_lector("")
+
+    def mostrar_lector(self, texto, error=False):
+        self.lbl_lector.configure(text=texto, text_color="#f87171" if error else "#31c48d")
+        if error:
+            self.bell()
+
+    def al_leer_lector(self, codigo):
+        # La consulta corre en ejecutor_bd; los resultados se procesan en el orden en que
+        # se leyeron los códigos aunque sus callbacks lleguen en otro.
+        futuro = ejecutor_bd.enviar(buscar_con_sugerencias, codigo)
+        self.lecturas_en_curso.append((codigo, futuro))
+        al_completar(self, futuro, lambda r: self.procesar_lecturas(), lambda e: self.procesar_lecturas())
+
+    def procesar_lecturas(self):
+        while self.lecturas_en_curso and self.lecturas_en_curso[0][1].done():
+            codigo, futuro = self.lecturas_en_curso.popleft()
+            error = futuro.exception()
+            if isinstance(error, ConnectionError):
+                self.mostrar_lector(f"{codigo}: sin conexión con el servidor, no se agregó.", error=True)
+            elif error is not None:
+                self.mostrar_lector(f"{codigo}: {error}", error=True)
+            else:
+                self.registrar_lectura(codigo, *futuro.result())
+
+    def registrar_lectura(self, codigo, producto, sugeridos):
+        # Sin cuadros de diálogo: un error se informa en la etiqueta (con un pitido) y
+        # las lecturas siguientes se siguen procesando.
+        if producto is None:
+            # Lo parecido queda en el panel para elegirlo a mano; la lectura no se agrega.
+            texto = f"{codigo}: no existe en la base de datos, no se agregó."
+            if sugeridos:
+                sku, marca, nombre, codebar = sugeridos[0][1]
+                texto += f" ¿Era {nombre} ({codebar})?"
+            self.mostrar_lector(" ".join(filter(None, (aviso_gtin(codigo), texto))), error=True)
+            self.panel_sugerencias.mostrar(codigo, sugeridos)
+            return
+        fila, error = self.armar_linea(producto, self.entry_cant_lector.get().strip(), "0")
+        if error:
+            self.mostrar_lector(f"{codigo}: {error[1]}", error=True)
+            return
+        # Un error al guardar también va a la etiqueta: un cuadro de diálogo se llevaría
+        # el foco y las lecturas que siguen.
+        self.guardar_linea(fila, nueva=True, al_fallar=lambda error: self.error_lectura_guardada(codigo, producto, error))
+        self.panel_sugerencias.ocultar()
+        self.lecturas_lector += 1
+        self.mostrar_lector(f"{producto[2]} ({codigo}) x{fila[7]} agregado. {self.lecturas_lector} lecturas en este modo.")
+
+    def error_lectura_guardada(self, codigo, producto, error):
+        self.lecturas_lector -= 1
+        self.mostrar_lector(f"{producto[2]} ({codigo}): no se pudo guardar, no se agregó. {error}", error=True)
 
     def exportar_excel(self):
-        filas = [self.tree.item(x)["values"] for x in self.tree.get_children()]
-        exportar_importaciones_excel(filas, parent=self)
+        win = ExportarImportaciones(self, desde_rowid=self.modelo.desde_rowid)
+        win.focus_force()
+
+    def abrir_conciliacion(self):
+        # Con una sesión abierta también cuentan sus líneas aún sin guardar.
+        if self.sesion is not None:
+            win = VentanaConciliacion(self, self.sesion.importacion_no, self.sesion.lineas)
+        else:
+            win = VentanaConciliacion(self, self.entry_importacion_no.get().strip())
+        win.focus_force()
 
     def limpiar_tabla(self):
-        for x in self.tree.get_children():
-            self.tree.delete(x)
-        self.rowid_map.clear()
+        # Oculta las filas actuales; solo se mostrarán las que se agreguen después.
+        self.modelo.recargar(desde_rowid=self.modelo.max_rowid)
+        self.tabla.limpiar_seleccion()
+        self.tabla.renderizar()
 
 if __name__ == '__main__':
-    init_db()
+    fuente = fuente_de_datos()
+    if fuente is datos:
+        init_db()
+        def precargar_cache():
+            try:
+                cache_productos.precargar()
+            finally:
+                datos.cerrar_conexion_hilo()
+        threading.Thread(target=precargar_cache, daemon=True).start()
     app = MainMenu()
-    app.mainloop()
\ No newline at end of file
+    informar_primera_ventana(app)
+    # Cámara y Excel se cargan al primer uso; con la ventana ya visible se
+    # adelanta su importación en segundo plano para que ese primer uso no espere.
+    app.after(500, precalentar_en_segundo_plano)
+    try:
+        app.mainloop()
+    finally:
+        cerrar_conexiones()
\ No newline at end of file
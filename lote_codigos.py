@@ -0,0 +1,120 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import datos
+from camara import ANCHO_DECODIFICACION, Antirrebote, decodificar, preparar_para_decodificar
+
+# Lectura de códigos desde fotos (p. ej. etiquetas de tarimas enviadas por el
+# proveedor) o desde videos de las cámaras del andén, repartiendo los cuadros
+# entre varios procesos. Usa la misma decodificación que la cámara en vivo.
+
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+EXTENSIONES_VIDEO = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+# Las fotos suelen tener las etiquetas más pequeñas que la cámara en vivo: se reducen menos.
+ANCHO_IMAGEN = 1600
+CUADROS_VIDEO_POR_SEGUNDO = 5
+
+class ResultadoLote:
+    def __init__(self):
+        self.conteos = {}
+        # codebar -> cuadros donde empezó cada lectura contada ("foto.jpg" o "video.mp4#120").
+        self.cuadros = {}
+        self.procesados = 0
+        self.sin_codigo = []
+
+    def sumar(self, codigo, cuadro):
+        self.conteos[codigo] = self.conteos.get(codigo, 0) + 1
+        self.cuadros.setdefault(codigo, []).append(cuadro)
+
+def _leer_imagen(ruta, ancho):
+    import cv2
+    imagen = cv2.imread(ruta, cv2.IMREAD_GRAYSCALE)
+    if imagen is None:
+        return None
+    return decodificar(preparar_para_decodificar(imagen, ancho))
+
+def listar_imagenes(directorio):
+    return sorted(os.path.join(raiz, nombre) for raiz, _, nombres in os.walk(directorio)
+                  for nombre in nombres if nombre.lower().endswith(EXTENSIONES_IMAGEN))
+
+def cuadros_video(ruta, por_segundo=CUADROS_VIDEO_POR_SEGUNDO, ancho=None):
+    # (número de cuadro, segundo, cuadro listo para decodificar), tomando `por_segundo`
+    # cuadros por segundo de video. Se leen en orden en este proceso; los procesos
+    # del grupo solo decodifican.
+    import cv2
+    cap = cv2.VideoCapture(ruta)
+    if not cap.isOpened():
+        raise ValueError(f"No se pudo abrir el video {ruta}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    salto = max(1, round(fps / por_segundo)) if por_segundo else 1
+    numero = 0
+    try:
+        while cap.grab():
+            if numero % salto == 0:
+                ok, cuadro = cap.retrieve()
+                if ok:
+                    yield numero, numero / fps, preparar_para_decodificar(cuadro, ancho or ANCHO_DECODIFICACION)
+            numero += 1
+    finally:
+        cap.release()
+
+def _en_orden(ejecutor, funcion, tareas, en_vuelo):
+    # Como ejecutor.map, pero con a lo sumo `en_vuelo` tareas pendientes (un video
+    # largo no se carga entero en memoria). `tareas` son pares (clave, argumentos);
+    # devuelve (clave, resultado) en el mismo orden.
+    pendientes = deque()
+    for clave, argumentos in tareas:
+        pendientes.append((clave, ejecutor.submit(funcion, *argumentos)))
+        if len(pendientes) >= en_vuelo:
+            clave, futuro = pendientes.popleft()
+            yield clave, futuro.result()
+    while pendientes:
+        clave, futuro = pendientes.popleft()
+        yield clave, futuro.result()
+
+def leer_lote(ruta, procesos=None, por_segundo=CUADROS_VIDEO_POR_SEGUNDO, ancho=ANCHO_IMAGEN, progreso=None):
+    # `ruta` es una carpeta de fotos o un archivo de video. En las fotos cuenta cada
+    # etiqueta leída; en un video, un código que sigue a la vista en cuadros
+    # seguidos cuenta una vez (el mismo criterio que la cámara en vivo).
+    resultado = ResultadoLote()
+    procesos = procesos or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        if os.path.isdir(ruta):
+            tareas = ((imagen, (imagen, ancho)) for imagen in listar_imagenes(ruta))
+            for imagen, codigos in _en_orden(ejecutor, _leer_imagen, tareas, procesos * 4):
+                resultado.procesados += 1
+                if not codigos:
+                    resultado.sin_codigo.append(imagen)
+                for codigo in codigos or ():
+                    resultado.sumar(codigo, imagen)
+                if progreso:
+                    progreso(resultado.procesados)
+        elif ruta.lower().endswith(EXTENSIONES_VIDEO):
+            antirrebote = Antirrebote()
+            nombre = os.path.basename(ruta)
+            tareas = (((f"{nombre}#{numero}", segundo), (cuadro,)) for numero, segundo, cuadro in cuadros_video(ruta, por_segundo))
+            for (cuadro, segundo), codigos in _en_orden(ejecutor, decodificar, tareas, procesos * 4):
+                resultado.procesados += 1
+                for codigo in set(codigos):
+                    if antirrebote.aceptar(codigo, segundo):
+                        resultado.sumar(codigo, cuadro)
+                if progreso:
+                    progreso(resultado.procesados)
+        else:
+            raise ValueError(f"{ruta} no es una carpeta de imágenes ni un video ({', '.join(EXTENSIONES_VIDEO)})")
+    return resultado
+
+def cargar_en_importacion(resultado, importacion_no, lote="", fecha_expira="", fuente=datos):
+    # Una línea por código conocido con la cantidad leída, por el mismo camino que
+    # agregar_importacion y en una sola transacción. Devuelve (rowids, desconocidos).
+    lineas, desconocidos = [], []
+    for codigo, cantidad in sorted(resultado.conteos.items()):
+        producto = fuente.buscar_producto_por_codebar(codigo)
+        if producto is None:
+            desconocidos.append(codigo)
+            continue
+        sku, marca, nombre, codebar = producto
+        lineas.append((importacion_no, sku, marca, nombre, codebar, lote, fecha_expira, cantidad, 0, cantidad,
+                       "lectura por lote"))
+    return (fuente.agregar_importaciones(lineas) if lineas else []), desconocidos
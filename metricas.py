@@ -0,0 +1,120 @@
+import functools
+import logging
+import math
+import os
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# Con la medición apagada cada función instrumentada solo paga una consulta a
+# ACTIVO antes de llamar a la original. Se enciende con INVENTARIO_METRICAS=1 o
+# desde la ventana de diagnóstico (Ctrl+Shift+D en el menú principal).
+ACTIVO = os.environ.get("INVENTARIO_METRICAS") == "1"
+UMBRAL_LENTO_MS = float(os.environ.get("INVENTARIO_UMBRAL_LENTO_MS", "200"))
+ARCHIVO_LENTAS = "operaciones_lentas.log"
+
+# Cubetas logarítmicas de 1 µs a ~100 s, cada una un 25 % más ancha que la anterior:
+# los percentiles tienen un error menor al 25 % con memoria fija por operación.
+_MINIMO = 1e-6
+_FACTOR = 1.25
+_CUBETAS = 84
+
+class Histograma:
+    def __init__(self):
+        self.conteos = [0] * _CUBETAS
+        self.llamadas = 0
+        self.total = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos):
+        if segundos <= _MINIMO:
+            cubeta = 0
+        else:
+            cubeta = min(_CUBETAS - 1, int(math.log(segundos / _MINIMO, _FACTOR)) + 1)
+        self.conteos[cubeta] += 1
+        self.llamadas += 1
+        self.total += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def percentil(self, p):
+        # Límite superior de la cubeta donde cae el percentil p (0-100).
+        if not self.llamadas:
+            return 0.0
+        objetivo = math.ceil(self.llamadas * p / 100)
+        acumulado = 0
+        for cubeta, conteo in enumerate(self.conteos):
+            acumulado += conteo
+            if acumulado >= objetivo:
+                return min(self.maximo, _MINIMO * _FACTOR ** cubeta)
+        return self.maximo
+
+_histogramas = {}
+_contadores = {}
+_lock = threading.Lock()
+_log_lentas = None
+
+def activar(activo=True):
+    global ACTIVO
+    ACTIVO = activo
+
+def fijar_umbral(ms):
+    global UMBRAL_LENTO_MS
+    UMBRAL_LENTO_MS = ms
+
+def _registro_lentas():
+    global _log_lentas
+    if _log_lentas is None:
+        log = logging.getLogger("inventario.lentas")
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        manejador = RotatingFileHandler(ARCHIVO_LENTAS, maxBytes=1_000_000, backupCount=3, encoding="utf-8")
+        manejador.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+        log.addHandler(manejador)
+        _log_lentas = log
+    return _log_lentas
+
+def registrar(nombre, segundos):
+    with _lock:
+        histograma = _histogramas.get(nombre)
+        if histograma is None:
+            histograma = _histogramas[nombre] = Histograma()
+        histograma.registrar(segundos)
+    if segundos * 1000 >= UMBRAL_LENTO_MS:
+        _registro_lentas().info("%s %.1f ms", nombre, segundos * 1000)
+
+def contar(nombre, cantidad=1):
+    if not ACTIVO:
+        return
+    with _lock:
+        _contadores[nombre] = _contadores.get(nombre, 0) + cantidad
+
+def medido(funcion=None, *, nombre=None):
+    # Decorador: @medido o @medido(nombre="..."). Por defecto el nombre es modulo.funcion.
+    if funcion is None:
+        return functools.partial(medido, nombre=nombre)
+    nombre = nombre or f"{funcion.__module__}.{funcion.__qualname__}"
+
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not ACTIVO:
+            return funcion(*args, **kwargs)
+        inicio = time.perf_counter()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            registrar(nombre, time.perf_counter() - inicio)
+    return envoltura
+
+def estadisticas():
+    # [(nombre, llamadas, total_ms, p50_ms, p95_ms, p99_ms, max_ms)] ordenado por tiempo total.
+    with _lock:
+        filas = [(nombre, h.llamadas, h.total * 1000, h.percentil(50) * 1000, h.percentil(95) * 1000,
+                  h.percentil(99) * 1000, h.maximo * 1000) for nombre, h in _histogramas.items()]
+        contadores = dict(_contadores)
+    return sorted(filas, key=lambda fila: fila[2], reverse=True), contadores
+
+def reiniciar():
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
@@ -0,0 +1,637 @@
+# Cada migración lleva la base de la versión anterior a la suya. La versión
+# aplicada se guarda en PRAGMA user_version, así que un productos.db existente se
+# actualiza en su lugar la próxima vez que se abre la aplicación.
+
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+def _v1_esquema_inicial(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            codebar TEXT PRIMARY KEY,
+            sku TEXT,
+            marca TEXT,
+            producto TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS importaciones (
+            importacion_no TEXT,
+            sku TEXT,
+            marca TEXT,
+            producto TEXT,
+            codebar TEXT,
+            lote TEXT,
+            fecha_expira TEXT,
+            cant_recibida INTEGER,
+            cant_rechazada INTEGER,
+            cant_aceptada INTEGER,
+            observaciones TEXT
+        )
+    ''')
+
+def _v2_normalizar_importaciones(conn):
+    # sku, marca y producto pasan a leerse de productos por codebar, y fecha_expira
+    # se guarda como aaaa-mm-dd (ordenable e indexable). El id conserva el rowid
+    # anterior y ahora es estable (INTEGER PRIMARY KEY).
+    conn.execute('''
+        INSERT OR IGNORE INTO productos (codebar, sku, marca, producto)
+        SELECT codebar, sku, marca, producto FROM importaciones
+        WHERE codebar IS NOT NULL AND codebar != ''
+        GROUP BY codebar
+    ''')
+    conn.execute('''
+        CREATE TABLE importaciones_v2 (
+            id INTEGER PRIMARY KEY,
+            importacion_no TEXT,
+            codebar TEXT REFERENCES productos(codebar),
+            lote TEXT,
+            fecha_expira TEXT,
+            cant_recibida INTEGER,
+            cant_rechazada INTEGER,
+            cant_aceptada INTEGER,
+            observaciones TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO importaciones_v2 (
+            id, importacion_no, codebar, lote, fecha_expira,
+            cant_recibida, cant_rechazada, cant_aceptada, observaciones
+        )
+        SELECT rowid, importacion_no, codebar, lote,
+               CASE WHEN fecha_expira GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]'
+                    THEN substr(fecha_expira, 7, 4) || '-' || substr(fecha_expira, 4, 2) || '-' || substr(fecha_expira, 1, 2)
+               END,
+               cant_recibida, cant_rechazada, cant_aceptada, observaciones
+        FROM importaciones ORDER BY rowid
+    ''')
+    conn.execute('DROP TABLE importaciones')
+    conn.execute('ALTER TABLE importaciones_v2 RENAME TO importaciones')
+    conn.execute('CREATE INDEX idx_importaciones_codebar ON importaciones(codebar)')
+    conn.execute('CREATE INDEX idx_importaciones_no ON importaciones(importacion_no)')
+    conn.execute('CREATE INDEX idx_importaciones_fecha_expira ON importaciones(fecha_expira)')
+    # Misma forma que la tabla original, para la interfaz y las exportaciones.
+    conn.execute('''
+        CREATE VIEW importaciones_detalle AS
+        SELECT i.id AS id,
+               i.importacion_no AS importacion_no,
+               coalesce(p.sku, '') AS sku,
+               coalesce(p.marca, '') AS marca,
+               coalesce(p.producto, '') AS producto,
+               i.codebar AS codebar,
+               i.lote AS lote,
+               coalesce(strftime('%d/%m/%Y', i.fecha_expira), '') AS fecha_expira,
+               i.cant_recibida AS cant_recibida,
+               i.cant_rechazada AS cant_rechazada,
+               i.cant_aceptada AS cant_aceptada,
+               i.observaciones AS observaciones,
+               i.fecha_expira AS fecha_expira_iso
+        FROM importaciones i LEFT JOIN productos p ON p.codebar = i.codebar
+    ''')
+
+def _v3_busqueda_texto(conn):
+    # Índice de texto completo de cada línea de importación. Los textos del producto
+    # vienen de productos, así que los disparadores de productos también lo actualizan.
+    conn.execute('''
+        CREATE VIRTUAL TABLE importaciones_fts USING fts5(
+            producto, marca, sku, lote, observaciones,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO importaciones_fts (rowid, producto, marca, sku, lote, observaciones)
+        SELECT id, producto, marca, sku, lote, observaciones FROM importaciones_detalle
+    ''')
+    conn.execute('''
+        CREATE TRIGGER importaciones_fts_ai AFTER INSERT ON importaciones BEGIN
+            INSERT INTO importaciones_fts (rowid, producto, marca, sku, lote, observaciones)
+            SELECT new.id, p.producto, p.marca, p.sku, new.lote, new.observaciones
+            FROM (SELECT 1) LEFT JOIN productos p ON p.codebar = new.codebar;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER importaciones_fts_au AFTER UPDATE ON importaciones BEGIN
+            DELETE FROM importaciones_fts WHERE rowid = old.id;
+            INSERT INTO importaciones_fts (rowid, producto, marca, sku, lote, observaciones)
+            SELECT new.id, p.producto, p.marca, p.sku, new.lote, new.observaciones
+            FROM (SELECT 1) LEFT JOIN productos p ON p.codebar = new.codebar;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER importaciones_fts_ad AFTER DELETE ON importaciones BEGIN
+            DELETE FROM importaciones_fts WHERE rowid = old.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER productos_fts_ai AFTER INSERT ON productos BEGIN
+            UPDATE importaciones_fts SET producto = new.producto, marca = new.marca, sku = new.sku
+            WHERE rowid IN (SELECT id FROM importaciones WHERE codebar = new.codebar);
+        END
+    ''')
+    # Solo si cambia algún texto: reimportar un catálogo igual no reescribe el índice.
+    conn.execute('''
+        CREATE TRIGGER productos_fts_au AFTER UPDATE ON productos
+        WHEN old.producto IS NOT new.producto OR old.marca IS NOT new.marca OR old.sku IS NOT new.sku
+          OR old.codebar IS NOT new.codebar
+        BEGIN
+            UPDATE importaciones_fts SET producto = NULL, marca = NULL, sku = NULL
+            WHERE rowid IN (SELECT id FROM importaciones WHERE codebar = old.codebar);
+            UPDATE importaciones_fts SET producto = new.producto, marca = new.marca, sku = new.sku
+            WHERE rowid IN (SELECT id FROM importaciones WHERE codebar = new.codebar);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER productos_fts_ad AFTER DELETE ON productos BEGIN
+            UPDATE importaciones_fts SET producto = NULL, marca = NULL, sku = NULL
+            WHERE rowid IN (SELECT id FROM importaciones WHERE codebar = old.codebar);
+        END
+    ''')
+
+# Compartido con archivo.reconstruir_stock(), que suma también las líneas archivadas.
+LLENAR_STOCK = '''
+    INSERT INTO stock (codebar, lote, cant_recibida, cant_rechazada, cant_aceptada, lineas)
+    SELECT coalesce(codebar, ''), coalesce(lote, ''),
+           total(cant_recibida), total(cant_rechazada), total(cant_aceptada), count(*)
+    FROM {origen}
+    GROUP BY coalesce(codebar, ''), coalesce(lote, '')
+'''
+
+def _v4_resumen_stock(conn):
+    # Existencias por codebar y lote mantenidas por disparadores: consultar el
+    # stock cuesta lo mismo con mil que con millones de líneas de importación.
+    conn.execute('''
+        CREATE TABLE stock (
+            codebar TEXT NOT NULL,
+            lote TEXT NOT NULL,
+            cant_recibida INTEGER NOT NULL DEFAULT 0,
+            cant_rechazada INTEGER NOT NULL DEFAULT 0,
+            cant_aceptada INTEGER NOT NULL DEFAULT 0,
+            lineas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (codebar, lote)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(LLENAR_STOCK.format(origen="importaciones"))
+    sumar = '''
+        INSERT INTO stock (codebar, lote, cant_recibida, cant_rechazada, cant_aceptada, lineas)
+        VALUES (coalesce(new.codebar, ''), coalesce(new.lote, ''),
+                coalesce(new.cant_recibida, 0), coalesce(new.cant_rechazada, 0), coalesce(new.cant_aceptada, 0), 1)
+        ON CONFLICT (codebar, lote) DO UPDATE SET
+            cant_recibida = cant_recibida + excluded.cant_recibida,
+            cant_rechazada = cant_rechazada + excluded.cant_rechazada,
+            cant_aceptada = cant_aceptada + excluded.cant_aceptada,
+            lineas = lineas + 1;
+    '''
+    restar = '''
+        UPDATE stock SET
+            cant_recibida = cant_recibida - coalesce(old.cant_recibida, 0),
+            cant_rechazada = cant_rechazada - coalesce(old.cant_rechazada, 0),
+            cant_aceptada = cant_aceptada - coalesce(old.cant_aceptada, 0),
+            lineas = lineas - 1
+        WHERE codebar = coalesce(old.codebar, '') AND lote = coalesce(old.lote, '');
+        DELETE FROM stock WHERE codebar = coalesce(old.codebar, '') AND lote = coalesce(old.lote, '') AND lineas <= 0;
+    '''
+    conn.execute(f'CREATE TRIGGER stock_ai AFTER INSERT ON importaciones BEGIN {sumar} END')
+    conn.execute(f'CREATE TRIGGER stock_ad AFTER DELETE ON importaciones BEGIN {restar} END')
+    conn.execute(f'''
+        CREATE TRIGGER stock_au AFTER UPDATE OF codebar, lote, cant_recibida, cant_rechazada, cant_aceptada
+        ON importaciones BEGIN {restar} {sumar} END
+    ''')
+
+def _v5_indice_fefo(conn):
+    # Índice de cobertura para vencimientos: los reportes FEFO y la alerta del menú
+    # recorren solo el rango de fechas pedido, sin leer las filas de la tabla.
+    # Reemplaza al índice de fecha_expira, que es prefijo de este.
+    conn.execute('''
+        CREATE INDEX idx_importaciones_fefo ON importaciones(fecha_expira, codebar, lote, cant_aceptada)
+    ''')
+    conn.execute('DROP INDEX idx_importaciones_fecha_expira')
+
+def _v6_recepciones(conn):
+    # Sesiones de recepción confirmadas (ver sesion_recepcion.py). Se registran en la
+    # misma transacción que sus líneas: al reproducir el diario de una sesión que sí
+    # se confirmó, se sabe que no hay que volver a insertarla.
+    conn.execute('''
+        CREATE TABLE recepciones (
+            sesion TEXT PRIMARY KEY,
+            lineas INTEGER,
+            confirmada TEXT
+        )
+    ''')
+
+def _v7_indice_recepcion(conn):
+    # Índice de cobertura para conciliar manifiestos: lo recibido en una importación
+    # por codebar y lote sale del índice, ya agrupado, sin leer la tabla ni ordenar.
+    # Reemplaza al índice de importacion_no, que es prefijo de este.
+    conn.execute('''
+        CREATE INDEX idx_importaciones_recepcion ON importaciones(importacion_no, codebar, lote, cant_recibida)
+    ''')
+    conn.execute('DROP INDEX idx_importaciones_no')
+
+def _v8_actividad_importaciones(conn):
+    # Último día en que se agregó o modificó una línea de cada importación: las que
+    # llevan tiempo sin cambios se consideran cerradas y se pueden archivar (ver
+    # archivo.py). Las importaciones existentes cuentan como activas hoy.
+    conn.execute('''
+        CREATE TABLE importaciones_actividad (
+            importacion_no TEXT PRIMARY KEY,
+            ultima_actividad TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO importaciones_actividad
+        SELECT importacion_no, date('now', 'localtime') FROM importaciones
+        WHERE importacion_no IS NOT NULL GROUP BY importacion_no
+    ''')
+    # Solo se reescribe la fila la primera vez en el día.
+    anotar = '''
+        INSERT INTO importaciones_actividad VALUES (new.importacion_no, date('now', 'localtime'))
+        ON CONFLICT (importacion_no) DO UPDATE SET ultima_actividad = excluded.ultima_actividad
+        WHERE ultima_actividad < excluded.ultima_actividad;
+    '''
+    conn.execute(f'CREATE TRIGGER actividad_ai AFTER INSERT ON importaciones WHEN new.importacion_no IS NOT NULL BEGIN {anotar} END')
+    conn.execute(f'CREATE TRIGGER actividad_au AFTER UPDATE ON importaciones WHEN new.importacion_no IS NOT NULL BEGIN {anotar} END')
+
+def _v9_diario_cambios(conn):
+    # Diario de altas, cambios y bajas de productos e importaciones para exportar
+    # solo lo nuevo a otros sistemas (ver cambios.py). Con AUTOINCREMENT un seq no se
+    # reutiliza aunque se borren (compacten) las entradas más altas. `clave` va sin
+    # tipo: el id queda entero y el codebar texto, sin conversiones.
+    conn.execute('''
+        CREATE TABLE cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla TEXT NOT NULL,
+            clave NOT NULL,
+            operacion TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE cambios_consumidores (
+            consumidor TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL
+        )
+    ''')
+    # Mientras no haya consumidores registrados los disparadores no anotan nada.
+    activo = 'EXISTS (SELECT 1 FROM cambios_consumidores)'
+    tablas = {
+        'productos': ('codebar', ('sku', 'marca', 'producto')),
+        'importaciones': ('id', ('importacion_no', 'codebar', 'lote', 'fecha_expira', 'cant_recibida',
+                                 'cant_rechazada', 'cant_aceptada', 'observaciones')),
+    }
+    for tabla, (clave, columnas) in tablas.items():
+        cambio = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in (clave,) + columnas)
+        conn.execute(f'''
+            CREATE TRIGGER cambios_{tabla}_ai AFTER INSERT ON {tabla} WHEN {activo} BEGIN
+                INSERT INTO cambios (tabla, clave, operacion) VALUES ('{tabla}', new.{clave}, 'I');
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER cambios_{tabla}_ad AFTER DELETE ON {tabla} WHEN {activo} BEGIN
+                INSERT INTO cambios (tabla, clave, operacion) VALUES ('{tabla}', old.{clave}, 'D');
+            END
+        ''')
+        # Guardar una fila igual (p. ej. reimportar el mismo catálogo) no se anota. Si
+        # cambia la clave, para el otro sistema es una baja de la vieja.
+        conn.execute(f'''
+            CREATE TRIGGER cambios_{tabla}_au AFTER UPDATE ON {tabla} WHEN {activo} AND ({cambio}) BEGIN
+                INSERT INTO cambios (tabla, clave, operacion)
+                SELECT '{tabla}', old.{clave}, 'D' WHERE old.{clave} IS NOT new.{clave};
+                INSERT INTO cambios (tabla, clave, operacion) VALUES ('{tabla}', new.{clave}, 'U');
+            END
+        ''')
+
+# El tokenizador trigram de SQLite distingue acentos: el texto se guarda sin ellos
+# y sugerencias.py quita los mismos de lo que se busca.
+ACENTOS, SIN_ACENTOS = "áéíóúüÁÉÍÓÚÜ", "aeiouuAEIOUU"
+_SIN_ACENTOS = str.maketrans(ACENTOS, SIN_ACENTOS)
+
+def texto_trigramas(p):
+    # Expresión SQL con el texto indexado de la fila `p` de productos.
+    texto = f"coalesce({p}.producto, '') || ' ' || coalesce({p}.marca, '') || ' ' || coalesce({p}.sku, '')"
+    for acento, letra in zip(ACENTOS, SIN_ACENTOS):
+        texto = f"replace({texto}, '{acento}', '{letra}')"
+    return texto
+
+def plegar(texto):
+    return (texto or "").translate(_SIN_ACENTOS).lower()
+
+def palabras_vocabulario(texto):
+    # Palabras de 3 letras o más, sin acentos y en minúsculas, como en productos_vocabulario.
+    return [p for p in plegar(texto).split() if len(p) >= 3]
+
+def agregar_vocabulario(conn, filas):
+    # `filas`: (producto, marca) de productos nuevos o editados. Las palabras que dejan
+    # de usarse quedan; corregir hacia una de ellas solo no encuentra nada.
+    palabras = set()
+    for producto, marca in filas:
+        palabras.update(palabras_vocabulario(producto))
+        palabras.update(palabras_vocabulario(marca))
+    conn.executemany('INSERT OR IGNORE INTO productos_vocabulario VALUES (?)', ((p,) for p in palabras))
+
+# Compartido con datos.compactar_base(): VACUUM puede renumerar el rowid de productos.
+LLENAR_TRIGRAMAS = f'''
+    INSERT INTO productos_trigramas (rowid, texto) SELECT rowid, {texto_trigramas('productos')} FROM productos
+'''
+
+# Compartido con datos.indexar_trigramas(): pasa al índice los productos anotados como
+# pendientes, en una sola sentencia.
+INDEXAR_PENDIENTES = (
+    'DELETE FROM productos_trigramas WHERE rowid IN (SELECT id FROM productos_trigramas_pendientes)',
+    f'''
+        INSERT INTO productos_trigramas (rowid, texto)
+        SELECT p.rowid, {texto_trigramas('p')}
+        FROM productos_trigramas_pendientes x JOIN productos p ON p.rowid = x.id
+    ''',
+    'DELETE FROM productos_trigramas_pendientes',
+)
+
+def _v10_trigramas_productos(conn):
+    # Índice de trigramas del nombre, la marca y el SKU de cada producto, y vocabulario
+    # de las palabras de nombres y marcas, para sugerir productos parecidos a lo escrito
+    # aunque tenga errores (ver sugerencias.py). El tokenizador trigram requiere SQLite
+    # 3.34; con uno anterior no hay sugerencias por nombre.
+    try:
+        conn.execute("CREATE VIRTUAL TABLE productos_trigramas USING fts5(texto, tokenize = 'trigram')")
+    except sqlite3.OperationalError:
+        return
+    conn.execute(LLENAR_TRIGRAMAS)
+    conn.execute('CREATE TABLE productos_vocabulario (palabra TEXT PRIMARY KEY) WITHOUT ROWID')
+    agregar_vocabulario(conn, conn.execute('SELECT producto, marca FROM productos').fetchall())
+    # Los disparadores solo anotan el rowid: FTS5 vuelca lo pendiente a disco en cada
+    # sentencia con disparadores, y escribir el índice fila por fila triplicaba lo que
+    # tarda importar un catálogo. Lo anotado se indexa de una vez al terminar cada
+    # importación, en la misma transacción que agrega o edita un producto y al abrir
+    # la base; buscar sugerencias no escribe.
+    conn.execute('CREATE TABLE productos_trigramas_pendientes (id INTEGER PRIMARY KEY)')
+    conn.execute('''
+        CREATE TRIGGER productos_trigramas_ai AFTER INSERT ON productos BEGIN
+            INSERT OR IGNORE INTO productos_trigramas_pendientes VALUES (new.rowid);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER productos_trigramas_au AFTER UPDATE ON productos
+        WHEN old.producto IS NOT new.producto OR old.marca IS NOT new.marca OR old.sku IS NOT new.sku
+        BEGIN
+            INSERT OR IGNORE INTO productos_trigramas_pendientes VALUES (new.rowid);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER productos_trigramas_ad AFTER DELETE ON productos BEGIN
+            INSERT OR IGNORE INTO productos_trigramas_pendientes VALUES (old.rowid);
+        END
+    ''')
+
+def _ids_archivados(conn):
+    # El id más alto de cada archivo anual junto a la base (ver archivo.py).
+    from archivo import CARPETA_ARCHIVO, listar_archivos
+    ruta = conn.execute("SELECT file FROM pragma_database_list WHERE name = 'main'").fetchone()[0]
+    if not ruta:
+        return []
+    maximos = []
+    for _, archivo in listar_archivos(os.path.join(os.path.dirname(ruta), CARPETA_ARCHIVO)):
+        leido = sqlite3.connect("file:" + pathname2url(archivo) + "?mode=ro", uri=True)
+        try:
+            maximos.append(leido.execute('SELECT coalesce(max(id), 0) FROM importaciones').fetchone()[0])
+        finally:
+            leido.close()
+    return maximos
+
+def _v11_id_autoincremental(conn):
+    # Con AUTOINCREMENT un id no se reutiliza aunque se borren o archiven las líneas
+    # más nuevas, así que en la vista unificada con los archivos (ver archivo.py) dos
+    # líneas nunca comparten id. SQLite no permite agregarlo a una tabla existente: se
+    # rehace con sus mismos índices, disparadores y vista. La secuencia arranca en el id
+    # más alto de la base y de los archivos ya creados.
+    dependientes = conn.execute('''
+        SELECT sql FROM sqlite_master
+        WHERE tbl_name = 'importaciones' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+    ''').fetchall()
+    vista = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'importaciones_detalle'").fetchone()[0]
+    conn.execute('DROP VIEW importaciones_detalle')
+    conn.execute('''
+        CREATE TABLE importaciones_v11 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            importacion_no TEXT,
+            codebar TEXT REFERENCES productos(codebar),
+            lote TEXT,
+            fecha_expira TEXT,
+            cant_recibida INTEGER,
+            cant_rechazada INTEGER,
+            cant_aceptada INTEGER,
+            observaciones TEXT
+        )
+    ''')
+    columnas = "id, importacion_no, codebar, lote, fecha_expira, cant_recibida, cant_rechazada, cant_aceptada, observaciones"
+    conn.execute(f'INSERT INTO importaciones_v11 ({columnas}) SELECT {columnas} FROM importaciones ORDER BY id')
+    # Borrar la tabla entera no dispara los disparadores de borrado (stock, diario de cambios).
+    conn.execute('DROP TABLE importaciones')
+    # Los disparadores de productos nombran a importaciones: sin el modo anterior de
+    # ALTER TABLE, SQLite rechaza el cambio de nombre porque la tabla vieja ya no está.
+    conn.execute('PRAGMA legacy_alter_table = ON')
+    try:
+        conn.execute('ALTER TABLE importaciones_v11 RENAME TO importaciones')
+    finally:
+        conn.execute('PRAGMA legacy_alter_table = OFF')
+    for sql, in dependientes:
+        conn.execute(sql)
+    conn.execute(vista)
+    tope = max([conn.execute('SELECT coalesce(max(id), 0) FROM importaciones').fetchone()[0]] + _ids_archivados(conn))
+    # sqlite_sequence no tiene clave única: la fila que dejó la copia se reemplaza.
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'importaciones'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('importaciones', ?)", (tope,))
+
+# Vista de las líneas con el texto del producto, o el propio de la línea si lo tiene.
+# Misma forma que la tabla original, para la interfaz y las exportaciones.
+VISTA_DETALLE = '''
+    CREATE VIEW importaciones_detalle AS
+    SELECT i.id AS id,
+           i.importacion_no AS importacion_no,
+           coalesce(i.sku_linea, p.sku, '') AS sku,
+           coalesce(i.marca_linea, p.marca, '') AS marca,
+           coalesce(i.producto_linea, p.producto, '') AS producto,
+           i.codebar AS codebar,
+           i.lote AS lote,
+           coalesce(strftime('%d/%m/%Y', i.fecha_expira), '') AS fecha_expira,
+           i.cant_recibida AS cant_recibida,
+           i.cant_rechazada AS cant_rechazada,
+           i.cant_aceptada AS cant_aceptada,
+           i.observaciones AS observaciones,
+           i.fecha_expira AS fecha_expira_iso
+    FROM importaciones i LEFT JOIN productos p ON p.codebar = i.codebar
+'''
+
+def _guardar_texto_v1(conn):
+    # Antes de _v2_normalizar_importaciones, que descarta el texto de cada línea: se
+    # copia a una tabla temporal de la conexión para _v12_texto_por_linea. No queda en
+    # el archivo, así que el esquema no depende de cuándo se migró la base.
+    conn.execute('''
+        CREATE TEMP TABLE importaciones_texto_v1 (
+            id INTEGER PRIMARY KEY, codebar TEXT, sku TEXT, marca TEXT, producto TEXT
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO temp.importaciones_texto_v1 SELECT rowid, codebar, sku, marca, producto FROM importaciones
+    ''')
+
+def _v12_texto_por_linea(conn):
+    # sku, marca y producto propios de la línea (NULL: los del producto). Los tienen las
+    # líneas sin codebar y, si la base se migra desde la versión 1 en esta misma
+    # corrida, las históricas cuyo texto no coincidía con el del producto que quedó al
+    # normalizar (ver _guardar_texto_v1); se guardan los tres juntos. Las bases que ya
+    # pasaron la versión 2 no conservan ese texto.
+    for columna in ('sku_linea', 'marca_linea', 'producto_linea'):
+        conn.execute(f'ALTER TABLE importaciones ADD COLUMN {columna} TEXT')
+    if conn.execute("SELECT 1 FROM sqlite_temp_master WHERE name = 'importaciones_texto_v1'").fetchone():
+        conn.execute('''
+            CREATE TEMP TABLE texto_propio AS
+            SELECT t.id, coalesce(t.sku, '') AS sku, coalesce(t.marca, '') AS marca, coalesce(t.producto, '') AS producto
+            FROM temp.importaciones_texto_v1 t LEFT JOIN productos p ON p.codebar = t.codebar
+            WHERE p.codebar IS NULL OR t.sku IS NOT p.sku OR t.marca IS NOT p.marca OR t.producto IS NOT p.producto
+        ''')
+        conn.execute('''
+            UPDATE importaciones SET
+                sku_linea = (SELECT sku FROM temp.texto_propio t WHERE t.id = importaciones.id),
+                marca_linea = (SELECT marca FROM temp.texto_propio t WHERE t.id = importaciones.id),
+                producto_linea = (SELECT producto FROM temp.texto_propio t WHERE t.id = importaciones.id)
+            WHERE id IN (SELECT id FROM temp.texto_propio)
+        ''')
+        conn.execute('DROP TABLE temp.texto_propio')
+        conn.execute('DROP TABLE temp.importaciones_texto_v1')
+    conn.execute('DROP VIEW importaciones_detalle')
+    conn.execute(VISTA_DETALLE)
+    texto = '''
+        SELECT new.id, coalesce(new.producto_linea, p.producto), coalesce(new.marca_linea, p.marca),
+               coalesce(new.sku_linea, p.sku), new.lote, new.observaciones
+        FROM (SELECT 1) LEFT JOIN productos p ON p.codebar = new.codebar;
+    '''
+    conn.execute('DROP TRIGGER importaciones_fts_ai')
+    conn.execute('DROP TRIGGER importaciones_fts_au')
+    conn.execute(f'''
+        CREATE TRIGGER importaciones_fts_ai AFTER INSERT ON importaciones BEGIN
+            INSERT INTO importaciones_fts (rowid, producto, marca, sku, lote, observaciones) {texto}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER importaciones_fts_au AFTER UPDATE ON importaciones BEGIN
+            DELETE FROM importaciones_fts WHERE rowid = old.id;
+            INSERT INTO importaciones_fts (rowid, producto, marca, sku, lote, observaciones) {texto}
+        END
+    ''')
+    # Editar un producto no cambia el texto de las líneas que tienen el suyo.
+    de_producto = 'SELECT id FROM importaciones WHERE codebar = {} AND producto_linea IS NULL'
+    for disparador in ('productos_fts_ai', 'productos_fts_au', 'productos_fts_ad'):
+        conn.execute(f'DROP TRIGGER {disparador}')
+    conn.execute(f'''
+        CREATE TRIGGER productos_fts_ai AFTER INSERT ON productos BEGIN
+            UPDATE importaciones_fts SET producto = new.producto, marca = new.marca, sku = new.sku
+            WHERE rowid IN ({de_producto.format('new.codebar')});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER productos_fts_au AFTER UPDATE ON productos
+        WHEN old.producto IS NOT new.producto OR old.marca IS NOT new.marca OR old.sku IS NOT new.sku
+          OR old.codebar IS NOT new.codebar
+        BEGIN
+            UPDATE importaciones_fts SET producto = NULL, marca = NULL, sku = NULL
+            WHERE rowid IN ({de_producto.format('old.codebar')});
+            UPDATE importaciones_fts SET producto = new.producto, marca = new.marca, sku = new.sku
+            WHERE rowid IN ({de_producto.format('new.codebar')});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER productos_fts_ad AFTER DELETE ON productos BEGIN
+            UPDATE importaciones_fts SET producto = NULL, marca = NULL, sku = NULL
+            WHERE rowid IN ({de_producto.format('old.codebar')});
+        END
+    ''')
+    # El diario de cambios también anota cuando cambia solo el texto de la línea.
+    columnas = ('id', 'importacion_no', 'codebar', 'lote', 'fecha_expira', 'cant_recibida', 'cant_rechazada',
+                'cant_aceptada', 'observaciones', 'sku_linea', 'marca_linea', 'producto_linea')
+    cambio = ' OR '.join(f'old.{c} IS NOT new.{c}' for c in columnas)
+    conn.execute('DROP TRIGGER cambios_importaciones_au')
+    conn.execute(f'''
+        CREATE TRIGGER cambios_importaciones_au AFTER UPDATE ON importaciones
+        WHEN EXISTS (SELECT 1 FROM cambios_consumidores) AND ({cambio}) BEGIN
+            INSERT INTO cambios (tabla, clave, operacion)
+            SELECT 'importaciones', old.id, 'D' WHERE old.id IS NOT new.id;
+            INSERT INTO cambios (tabla, clave, operacion) VALUES ('importaciones', new.id, 'U');
+        END
+    ''')
+    conn.execute('''
+        UPDATE importaciones_fts SET
+            producto = (SELECT producto_linea FROM importaciones WHERE id = importaciones_fts.rowid),
+            marca = (SELECT marca_linea FROM importaciones WHERE id = importaciones_fts.rowid),
+            sku = (SELECT sku_linea FROM importaciones WHERE id = importaciones_fts.rowid)
+        WHERE rowid IN (SELECT id FROM importaciones WHERE producto_linea IS NOT NULL)
+    ''')
+
+def _v13_version_productos(conn):
+    # Contador de cambios en productos, para que la caché en memoria de cada proceso
+    # (ver datos.CacheProductos) vea lo que escriben otros procesos, como cli.py o
+    # otra instancia de la aplicación. Guardar una fila igual no lo cambia.
+    conn.execute('CREATE TABLE productos_version (version INTEGER NOT NULL)')
+    conn.execute('INSERT INTO productos_version VALUES (0)')
+    sumar = 'UPDATE productos_version SET version = version + 1;'
+    conn.execute(f'CREATE TRIGGER productos_version_ai AFTER INSERT ON productos BEGIN {sumar} END')
+    conn.execute(f'CREATE TRIGGER productos_version_ad AFTER DELETE ON productos BEGIN {sumar} END')
+    conn.execute(f'''
+        CREATE TRIGGER productos_version_au AFTER UPDATE ON productos
+        WHEN old.producto IS NOT new.producto OR old.marca IS NOT new.marca OR old.sku IS NOT new.sku
+          OR old.codebar IS NOT new.codebar
+        BEGIN {sumar} END
+    ''')
+
+def _v14_ids_de_recepcion(conn):
+    # Primer id de las líneas de cada envío confirmado (son consecutivos, ver
+    # datos.agregar_importaciones): un reenvío de algo ya guardado recibe los mismos
+    # ids aunque el servidor se haya reiniciado. Las anteriores quedan en NULL.
+    conn.execute('ALTER TABLE recepciones ADD COLUMN primer_id INTEGER')
+
+MIGRACIONES = (
+    (1, _v1_esquema_inicial),
+    (2, _v2_normalizar_importaciones),
+    (3, _v3_busqueda_texto),
+    (4, _v4_resumen_stock),
+    (5, _v5_indice_fefo),
+    (6, _v6_recepciones),
+    (7, _v7_indice_recepcion),
+    (8, _v8_actividad_importaciones),
+    (9, _v9_diario_cambios),
+    (10, _v10_trigramas_productos),
+    (11, _v11_id_autoincremental),
+    (12, _v12_texto_por_linea),
+    (13, _v13_version_productos),
+    (14, _v14_ids_de_recepcion),
+)
+
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+# Pasos que corren justo antes de una migración, en su misma transacción, para guardar
+# en tablas temporales lo que esa migración descarta y una posterior de la misma
+# corrida necesita.
+ANTES_DE = {2: _guardar_texto_v1}
+
+def version_esquema(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrar(conn, progreso=None):
+    # Cada paso corre en su propia transacción junto con el cambio de user_version:
+    # si falla, la base queda en la versión anterior.
+    aplicadas = []
+    for version, migracion in MIGRACIONES:
+        if version <= version_esquema(conn):
+            continue
+        if progreso:
+            progreso(version, migracion.__name__)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version in ANTES_DE:
+                ANTES_DE[version](conn)
+            migracion(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        aplicadas.append(version)
+    return aplicadas
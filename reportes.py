@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+
+from datos import consulta_fefo
+from exportador import exportar_consulta
+
+ENCABEZADOS_STOCK = ("CodeBar", "SKU", "Marca", "Producto", "Lote",
+                     "Cantidad Recibida", "Cantidad Rechazada", "Cantidad Aceptada")
+ENCABEZADOS_VENCIMIENTOS = ("Fecha Expira", "Días Restantes", "CodeBar", "SKU", "Marca", "Producto", "Lote",
+                            "Cantidad Aceptada", "Líneas")
+
+def exportar_stock(ruta, progreso=None):
+    # Existencias por producto y lote, leídas del resumen que mantienen los disparadores.
+    return exportar_consulta(ruta, ENCABEZADOS_STOCK, '''
+        SELECT s.codebar, coalesce(p.sku, ''), coalesce(p.marca, ''), coalesce(p.producto, ''), s.lote,
+               s.cant_recibida, s.cant_rechazada, s.cant_aceptada
+        FROM stock s LEFT JOIN productos p ON p.codebar = s.codebar
+        ORDER BY s.codebar, s.lote
+    ''', progreso=progreso, titulo="Stock")
+
+def exportar_vencimientos(ruta, dias=30, hoy=None, progreso=None):
+    # Lotes en orden FEFO que vencen entre hoy y `dias` días después (si `dias` es
+    # negativo, los vencidos en ese lapso).
+    hoy = hoy or date.today()
+    desde, hasta = sorted((hoy, hoy + timedelta(days=dias)))
+    sql, params = consulta_fefo(desde, hasta, hoy)
+    return exportar_consulta(ruta, ENCABEZADOS_VENCIMIENTOS, sql, params, progreso=progreso, titulo="Vencimientos")
@@ -0,0 +1,252 @@
+import argparse
+import hmac
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+# Servicio HTTP/JSON opcional que es el único dueño de productos.db, para que
+# varias estaciones de recepción trabajen sobre la misma importación sin
+# compartir el archivo por red. Solo usa la biblioteca estándar y datos.py.
+import datos
+
+PUERTO = 8765
+MAX_LOTE = 256
+MAX_ENVIOS_RECORDADOS = 10000
+
+class NoEncontrado(Exception):
+    pass
+
+class EscritorAgrupado:
+    # Un solo hilo escribe. Lo que llegó de todas las estaciones mientras se
+    # confirmaba la transacción anterior se aplica junto en la siguiente (un
+    # commit para muchas escrituras); cada operación va en su propio SAVEPOINT,
+    # así que un error solo revierte esa operación. La respuesta se envía
+    # después del COMMIT.
+    def __init__(self, max_lote=MAX_LOTE):
+        self.max_lote = max_lote
+        self.transacciones = 0
+        self.operaciones = 0
+        self._cola = queue.Queue()
+        threading.Thread(target=self._trabajar, name="escritor", daemon=True).start()
+
+    def ejecutar(self, funcion, *args):
+        futuro = Future()
+        self._cola.put((funcion, args, futuro))
+        return futuro.result()
+
+    def _trabajar(self):
+        while True:
+            trabajos = [self._cola.get()]
+            while len(trabajos) < self.max_lote:
+                try:
+                    trabajos.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            resultados = []
+            try:
+                with datos.transaccion() as conn:
+                    for funcion, args, futuro in trabajos:
+                        conn.execute('SAVEPOINT operacion')
+                        try:
+                            resultado = funcion(*args)
+                        except Exception as e:
+                            conn.execute('ROLLBACK TO operacion')
+                            conn.execute('RELEASE operacion')
+                            datos.cache_productos.invalidar()
+                            resultados.append((futuro, None, e))
+                        else:
+                            conn.execute('RELEASE operacion')
+                            resultados.append((futuro, resultado, None))
+            except Exception as e:
+                for _, _, futuro in trabajos:
+                    futuro.set_exception(e)
+                continue
+            self.transacciones += 1
+            self.operaciones += len(trabajos)
+            for futuro, resultado, error in resultados:
+                if error is None:
+                    futuro.set_result(resultado)
+                else:
+                    futuro.set_exception(error)
+
+class ServidorSync(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, clave=None):
+        super().__init__(direccion, ManejadorSync)
+        self.clave = clave
+        self.escritor = EscritorAgrupado()
+        # Cambia con cada escritura de productos; los clientes vacían su caché al verla cambiar.
+        self.version_productos = 0
+        # Respuestas de los últimos envíos de líneas: si un cliente reintenta un
+        # envío que sí llegó, recibe los mismos ids en lugar de duplicar las líneas.
+        # Un reintento que llega mientras el original se guarda espera a que termine.
+        self._envios = OrderedDict()
+        self._en_curso = set()
+        self._lock = threading.Lock()
+        self._terminado = threading.Condition(self._lock)
+
+    def _cambio_productos(self):
+        with self._lock:
+            self.version_productos += 1
+
+    def _crea_productos(self, lineas):
+        # Una línea con un producto desconocido también lo registra.
+        return any(linea[4] and datos.buscar_producto_por_codebar(linea[4]) is None for linea in lineas)
+
+    def _agregar_lineas(self, id_envio, lineas):
+        with self._terminado:
+            while id_envio in self._en_curso:
+                self._terminado.wait()
+            if id_envio in self._envios:
+                return self._envios[id_envio]
+            self._en_curso.add(id_envio)
+        try:
+            nuevos = self._crea_productos(lineas)
+            # id_envio queda en recepciones en la misma transacción que las líneas: un
+            # reintento que llega después de reiniciar el servidor (o de olvidarlo en
+            # memoria) no las duplica y recibe los mismos ids.
+            ids = self.escritor.ejecutar(datos.agregar_importaciones, lineas, id_envio)
+            if nuevos:
+                self._cambio_productos()
+            with self._lock:
+                self._envios[id_envio] = ids
+                while len(self._envios) > MAX_ENVIOS_RECORDADOS:
+                    self._envios.popitem(last=False)
+            return ids
+        finally:
+            with self._terminado:
+                self._en_curso.discard(id_envio)
+                self._terminado.notify_all()
+
+    def despachar(self, metodo, ruta, params, cuerpo):
+        uno = lambda nombre, defecto=None: params.get(nombre, [defecto])[0]
+        busqueda = uno("busqueda")
+        if ruta == ["estado"] and metodo == "GET":
+            return {"version_productos": self.version_productos, "transacciones": self.escritor.transacciones,
+                    "operaciones": self.escritor.operaciones}
+        if ruta[0] == "productos":
+            if len(ruta) == 2 and metodo == "GET":
+                return {"producto": datos.buscar_producto_por_codebar(ruta[1])}
+            if len(ruta) == 1 and metodo == "GET":
+                return {"sugerencias": datos.sugerir_productos(uno("sugerir", ""), int(uno("limite", 8)))}
+            if len(ruta) == 1 and metodo == "POST":
+                agregado = self.escritor.ejecutar(datos.agregar_producto, *cuerpo["producto"])
+                self._cambio_productos()
+                return {"agregado": agregado}
+            if len(ruta) == 2 and metodo == "PUT":
+                self.escritor.ejecutar(datos.editar_producto, ruta[1], *cuerpo["producto"])
+                self._cambio_productos()
+                return {}
+        if ruta[0] == "recepciones" and len(ruta) == 2 and metodo == "GET":
+            # Una sesión de recepción se envía con su id como id_envio (ver cliente_sync.py).
+            return {"confirmada": datos.recepcion_confirmada(ruta[1])}
+        if ruta[0] == "importaciones":
+            if len(ruta) == 1 and metodo == "GET":
+                return {"filas": datos.buscar_importaciones_pagina(int(uno("despues_de", 0)), int(uno("limite", 200)), busqueda)}
+            if len(ruta) == 1 and metodo == "POST":
+                return {"ids": self._agregar_lineas(cuerpo["id_envio"], cuerpo["lineas"])}
+            if ruta[1:] == ["conteo"] and metodo == "GET":
+                return {"total": datos.contar_importaciones(int(uno("despues_de", 0)), busqueda)}
+            if ruta[1:] == ["max_rowid"] and metodo == "GET":
+                return {"max_rowid": datos.max_rowid_importaciones()}
+            if ruta[1:] == ["posicion"] and metodo == "GET":
+                return {"rowid": datos.rowid_importacion_en_posicion(int(uno("despues_de", 0)), int(uno("desplazamiento")), busqueda)}
+            if len(ruta) == 2 and ruta[1].isdigit():
+                rowid = int(ruta[1])
+                if metodo == "GET":
+                    return {"fila": datos.buscar_importacion_por_rowid(rowid, busqueda)}
+                if metodo == "PUT":
+                    nuevos = self._crea_productos([cuerpo["linea"]])
+                    self.escritor.ejecutar(datos.actualizar_importacion, rowid, *cuerpo["linea"])
+                    if nuevos:
+                        self._cambio_productos()
+                    return {}
+                if metodo == "DELETE":
+                    self.escritor.ejecutar(datos.eliminar_importacion_por_rowid, rowid)
+                    return {}
+        raise NoEncontrado(f"{metodo} /{'/'.join(ruta)}")
+
+class ManejadorSync(BaseHTTPRequestHandler):
+    # HTTP/1.1: cada estación mantiene abierta su conexión entre pedidos.
+    protocol_version = "HTTP/1.1"
+    # Encabezados y cuerpo salen en escrituras separadas; con Nagle la segunda
+    # esperaría el ACK retardado del cliente (~40 ms por pedido).
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PUT(self):
+        self._atender("PUT")
+
+    def do_DELETE(self):
+        self._atender("DELETE")
+
+    def _atender(self, metodo):
+        partes = urlsplit(self.path)
+        ruta = [unquote(p) for p in partes.path.strip("/").split("/")]
+        largo = int(self.headers.get("Content-Length") or 0)
+        crudo = self.rfile.read(largo) if largo else b""
+        clave = self.server.clave
+        if clave and not hmac.compare_digest(self.headers.get("X-Clave", ""), clave):
+            self._responder(401, {"error": "clave incorrecta"})
+            return
+        try:
+            cuerpo = json.loads(crudo) if crudo else {}
+            respuesta = self.server.despachar(metodo, ruta, parse_qs(partes.query), cuerpo)
+        except NoEncontrado as e:
+            self._responder(404, {"error": f"ruta desconocida: {e}"})
+        except (ValueError, KeyError, TypeError) as e:
+            self._responder(400, {"error": f"pedido inválido: {e}"})
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+        else:
+            self._responder(200, respuesta)
+
+    def _responder(self, estado, contenido):
+        cuerpo = json.dumps(contenido, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("X-Version-Productos", str(self.server.version_productos))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def finish(self):
+        super().finish()
+        # El hilo de esta conexión termina aquí; su conexión SQLite también.
+        datos.cerrar_conexion_hilo()
+
+    def log_message(self, formato, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor de sincronización para varias estaciones de recepción.")
+    parser.add_argument("--db", default=datos.DB_NAME)
+    parser.add_argument("--host", default="127.0.0.1", help="use 0.0.0.0 para aceptar otras estaciones de la red")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    args = parser.parse_args()
+
+    datos.DB_NAME = args.db
+    datos.init_db()
+    servidor = ServidorSync((args.host, args.puerto), clave=os.environ.get("INVENTARIO_CLAVE_SYNC"))
+    print(f"Sirviendo {args.db} en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        datos.cerrar_conexiones()
+
+if __name__ == '__main__':
+    main()
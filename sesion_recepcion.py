@@ -0,0 +1,134 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+import datos
+from cliente_sync import ErrorServidor
+
+DIRECTORIO_SESIONES = "sesiones"
+
+# Sesiones con el diario abierto en esta ejecución; no se ofrecen como interrumpidas.
+_abiertas = set()
+
+class SesionRecepcion:
+    # Líneas escaneadas de una importación que todavía no están en la base. Cada
+    # cambio se anota antes en un diario (un JSON por línea, solo se agrega al
+    # final) para que un cierre inesperado no pierda nada. Al cerrar la importación
+    # todas las líneas se guardan en una sola transacción y el diario se borra.
+    def __init__(self, importacion_no, fuente=datos, directorio=DIRECTORIO_SESIONES, sesion=None, inicio=None):
+        self.importacion_no = importacion_no
+        self.fuente = fuente
+        self.sesion = sesion or uuid.uuid4().hex
+        self.inicio = inicio or datetime.now().isoformat(timespec="seconds")
+        self.lineas = []
+        self.ruta = os.path.join(directorio, f"{self.sesion}.jsonl")
+        self._diario = None
+
+    def _abrir_diario(self):
+        if self._diario is None:
+            os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+            nuevo = not os.path.exists(self.ruta)
+            self._diario = open(self.ruta, "a", encoding="utf-8")
+            _abiertas.add(self.sesion)
+            if nuevo:
+                self._escribir({"sesion": self.sesion, "importacion_no": self.importacion_no, "inicio": self.inicio})
+
+    def _escribir(self, registro):
+        self._diario.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        # flush y no fsync: el registro queda en manos del sistema operativo, lo que
+        # basta si se cierra la aplicación, sin pagar una escritura a disco por lectura.
+        self._diario.flush()
+
+    def _anotar(self, registro):
+        self._abrir_diario()
+        self._escribir(registro)
+
+    def agregar(self, linea):
+        self._anotar({"agregar": list(linea)})
+        self.lineas.append(tuple(linea))
+
+    def reemplazar(self, indice, linea):
+        self._anotar({"reemplazar": indice, "linea": list(linea)})
+        self.lineas[indice] = tuple(linea)
+
+    def quitar(self, indice):
+        self._anotar({"quitar": indice})
+        del self.lineas[indice]
+
+    def confirmar(self):
+        # Devuelve los rowid nuevos (los de la primera vez si la sesión ya se había
+        # confirmado; None si un ClienteSync sin conexión la dejó en su cola de reintentos).
+        ids = self.fuente.agregar_importaciones(self.lineas, sesion=self.sesion) if self.lineas else []
+        self.descartar()
+        return ids
+
+    def cerrar(self):
+        # Deja el diario en disco: la sesión se ofrecerá para restaurar la próxima vez.
+        if self._diario is not None:
+            self._diario.close()
+            self._diario = None
+        _abiertas.discard(self.sesion)
+
+    def descartar(self):
+        self.cerrar()
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+    def _compactar(self):
+        # Reescribe el diario con el estado actual; también elimina una última línea
+        # a medio escribir, que de otro modo quedaría pegada a la siguiente.
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"sesion": self.sesion, "importacion_no": self.importacion_no, "inicio": self.inicio},
+                               ensure_ascii=False) + "\n")
+            for linea in self.lineas:
+                f.write(json.dumps({"agregar": list(linea)}, ensure_ascii=False) + "\n")
+        os.replace(temporal, self.ruta)
+
+    @classmethod
+    def desde_diario(cls, ruta, fuente=datos):
+        registros = []
+        with open(ruta, encoding="utf-8") as f:
+            for texto in f:
+                try:
+                    registros.append(json.loads(texto))
+                except ValueError:
+                    break
+        cabecera = registros[0]
+        sesion = cls(cabecera["importacion_no"], fuente, os.path.dirname(ruta), cabecera["sesion"], cabecera["inicio"])
+        for registro in registros[1:]:
+            if "agregar" in registro:
+                sesion.lineas.append(tuple(registro["agregar"]))
+            elif "reemplazar" in registro:
+                sesion.lineas[registro["reemplazar"]] = tuple(registro["linea"])
+            elif "quitar" in registro:
+                del sesion.lineas[registro["quitar"]]
+        sesion._compactar()
+        return sesion
+
+def sesiones_interrumpidas(fuente=datos, directorio=DIRECTORIO_SESIONES):
+    # Sesiones cuyo diario quedó en disco porque la aplicación se cerró antes de
+    # confirmarlas, de la más antigua a la más nueva.
+    if not os.path.isdir(directorio):
+        return []
+    sesiones = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(".jsonl") or nombre[:-len(".jsonl")] in _abiertas:
+            continue
+        try:
+            sesion = SesionRecepcion.desde_diario(os.path.join(directorio, nombre), fuente)
+        except (ValueError, KeyError, IndexError):
+            continue
+        try:
+            confirmada = fuente.recepcion_confirmada(sesion.sesion)
+        except (ConnectionError, ErrorServidor):
+            # Sin respuesta del servidor no se sabe: se ofrece igual, y confirmarla otra
+            # vez no duplica.
+            confirmada = False
+        if confirmada:
+            # Se guardó, pero la aplicación se cerró antes de borrar el diario.
+            sesion.descartar()
+            continue
+        sesiones.append(sesion)
+    return sorted(sesiones, key=lambda s: s.inicio)
@@ -0,0 +1,216 @@
+from itertools import islice, product
+
+from migraciones import plegar
+
+# Búsqueda de productos cuando un CodeBar no existe tal cual: el mismo GTIN escrito
+# con otra cantidad de ceros, el dígito verificador que falta, códigos a un dígito de
+# distancia (lectura errónea), códigos que empiezan con lo escrito y, si lo escrito
+# es texto, productos de nombre, marca o SKU parecidos. Todo se resuelve con la
+# clave primaria de productos, el vocabulario de palabras y el índice
+# productos_trigramas; cada consulta lee unas pocas páginas, sin importar el tamaño
+# del catálogo.
+
+LONGITUDES_GTIN = (8, 12, 13, 14)
+LIMITE = 8
+CANDIDATOS_TEXTO = 200
+COMBINACIONES = 16
+TAMANO_LOTE_CLAVES = 500
+
+EQUIVALENTE = "equivalente"
+SIN_VERIFICADOR = "verificador"
+PARECIDO = "parecido"
+PREFIJO = "prefijo"
+NOMBRE = "nombre"
+MOTIVOS = {
+    EQUIVALENTE: "mismo código con otros ceros a la izquierda",
+    SIN_VERIFICADOR: "falta el dígito verificador",
+    PARECIDO: "difiere en un carácter",
+    PREFIJO: "empieza igual",
+    NOMBRE: "nombre parecido",
+}
+
+_DIGITOS = "0123456789"
+_ALFANUMERICOS = _DIGITOS + "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LETRAS = "abcdefghijklmnopqrstuvwxyz" + _DIGITOS
+
+# --- GTIN (UPC-A, EAN-8, EAN-13, GTIN-14) ---
+
+def digito_verificador(cuerpo):
+    # Dígito de control GS1: pesos 3 y 1 alternados desde la derecha.
+    suma = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(cuerpo)))
+    return str((10 - suma % 10) % 10)
+
+def es_gtin(codigo):
+    return codigo.isdigit() and len(codigo) in LONGITUDES_GTIN
+
+def gtin_valido(codigo):
+    return es_gtin(codigo) and digito_verificador(codigo[:-1]) == codigo[-1]
+
+def normalizar_gtin(codigo):
+    # GTIN-14 (con ceros a la izquierda), o None si no es un GTIN válido. Un UPC-A y
+    # el EAN-13 que empieza con 0 dan lo mismo.
+    if not codigo.isdigit() or len(codigo) > 14 or not gtin_valido(codigo.zfill(14)):
+        return None
+    return codigo.zfill(14)
+
+def equivalentes_gtin(codigo):
+    # El mismo GTIN con cada largo estándar; también cubre un cero inicial perdido.
+    gtin = normalizar_gtin(codigo)
+    if gtin is None:
+        return []
+    nucleo = gtin.lstrip("0")
+    return [nucleo.zfill(n) for n in LONGITUDES_GTIN if n >= len(nucleo) and nucleo.zfill(n) != codigo]
+
+def aviso_gtin(codigo):
+    # Texto para mostrar si `codigo` tiene largo de GTIN pero su dígito verificador no cuadra.
+    if es_gtin(codigo) and not gtin_valido(codigo):
+        return f"El dígito verificador de {codigo} no es válido (debería ser {digito_verificador(codigo[:-1])}): probablemente se leyó mal."
+    return None
+
+# --- Candidatos ---
+
+def vecinos(codigo, alfabeto=None):
+    # Códigos a distancia de edición 1 (cambio, falta o sobra un carácter) y con dos
+    # caracteres vecinos intercambiados.
+    if alfabeto is None:
+        alfabeto = _DIGITOS if codigo.isdigit() else _ALFANUMERICOS + "".join(set(codigo) - set(_ALFANUMERICOS))
+    resultado = set()
+    for i in range(len(codigo)):
+        resultado.add(codigo[:i] + codigo[i + 1:])
+        for c in alfabeto:
+            resultado.add(codigo[:i] + c + codigo[i + 1:])
+            resultado.add(codigo[:i] + c + codigo[i:])
+        if i + 1 < len(codigo):
+            resultado.add(codigo[:i] + codigo[i + 1] + codigo[i] + codigo[i + 2:])
+    for c in alfabeto:
+        resultado.add(codigo + c)
+    resultado.discard(codigo)
+    resultado.discard("")
+    return resultado
+
+def _por_codebar(conn, claves):
+    claves = list(claves)
+    filas = []
+    for i in range(0, len(claves), TAMANO_LOTE_CLAVES):
+        lote = claves[i:i + TAMANO_LOTE_CLAVES]
+        filas += conn.execute(
+            f'SELECT sku, marca, producto, codebar FROM productos WHERE codebar IN ({",".join("?" * len(lote))})', lote
+        ).fetchall()
+    return filas
+
+def _por_prefijo(conn, prefijo, limite):
+    # Rango sobre la clave primaria: [prefijo, prefijo con el último carácter + 1).
+    tope = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return conn.execute(
+        'SELECT sku, marca, producto, codebar FROM productos WHERE codebar >= ? AND codebar < ? ORDER BY codebar LIMIT ?',
+        (prefijo, tope, limite)
+    ).fetchall()
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+def _frase(texto):
+    return '"' + texto.replace('"', '""') + '"'
+
+def _hay_trigramas(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'productos_trigramas'").fetchone() is not None
+
+def _correcciones(conn, palabra):
+    # Palabras del vocabulario a un error de `palabra`; [palabra] si está tal cual.
+    if conn.execute('SELECT 1 FROM productos_vocabulario WHERE palabra = ?', (palabra,)).fetchone():
+        return [palabra]
+    claves = sorted(vecinos(palabra, _LETRAS + "".join(set(palabra) - set(_LETRAS))))
+    correcciones = []
+    for i in range(0, len(claves), TAMANO_LOTE_CLAVES):
+        lote = claves[i:i + TAMANO_LOTE_CLAVES]
+        correcciones += [fila[0] for fila in conn.execute(
+            f'SELECT palabra FROM productos_vocabulario WHERE palabra IN ({",".join("?" * len(lote))})', lote)]
+    return correcciones
+
+def _sin_una_parte(texto, partes=4):
+    # Con un solo error, para alguna de `partes` partes de lo escrito lo de antes y lo
+    # de después quedan intactos; el tokenizador trigram busca cada frase como texto
+    # dentro del indexado. Solo se usa si lo corregido con el vocabulario no alcanzó:
+    # con palabras muy repetidas en el catálogo recorre listas largas del índice.
+    cortes = [len(texto) * i // partes for i in range(partes + 1)]
+    ramas = []
+    for i in range(partes):
+        intactos = [t for t in (texto[:cortes[i]], texto[cortes[i + 1]:]) if len(t) >= 3]
+        if intactos:
+            ramas.append("(" + " AND ".join(_frase(t) for t in intactos) + ")")
+    return " OR ".join(ramas)
+
+def _por_texto(conn, texto, limite):
+    # Lo escrito tal cual; si no alcanza, con cada palabra que no está en el vocabulario
+    # reemplazada por las que sí están a un error de ella: primero en el mismo orden y
+    # después en cualquiera. Si con eso no alcanza, trozos intactos de lo escrito.
+    plegado = " ".join(plegar(texto).split())
+    if len(plegado) < 3:
+        return []
+    consulta = '''
+        SELECT p.sku, p.marca, p.producto, p.codebar, productos_trigramas.texto
+        FROM productos_trigramas JOIN productos p ON p.rowid = productos_trigramas.rowid
+        WHERE productos_trigramas MATCH ? LIMIT ?
+    '''
+    exactos = conn.execute(consulta, (_frase(plegado), limite)).fetchall()
+    if len(exactos) >= limite:
+        return [fila[:4] for fila in exactos]
+
+    opciones = [_correcciones(conn, p) if len(p) >= 3 else [p] for p in plegado.split()]
+    candidatos = {}
+
+    def buscar(orden, expresion, tope):
+        # Cada candidato queda con la primera expresión que lo encontró.
+        for fila in conn.execute(consulta, (expresion, tope)):
+            candidatos.setdefault(fila[3], (orden, fila))
+
+    def faltan():
+        return len(candidatos) + len(exactos) < limite
+
+    # Con lo corregido en el mismo orden basta con `limite` filas: todas coinciden igual
+    # de bien, y cortar ahí evita recorrer entera la lista de una palabra muy común.
+    if all(opciones):
+        frases = [" ".join(c) for c in islice(product(*opciones), COMBINACIONES)]
+        if frases != [plegado]:
+            buscar(0, " OR ".join(_frase(f) for f in frases), limite)
+    # Una palabra que no se pudo corregir (un SKU, dos errores) no se exige.
+    palabras = [o for o in opciones if o and len(o[0]) >= 3]
+    if palabras and faltan():
+        buscar(1, " AND ".join("(" + " OR ".join(_frase(p) for p in o) + ")" for o in palabras), CANDIDATOS_TEXTO)
+    if len(plegado) >= 6 and faltan():
+        buscar(2, _sin_una_parte(plegado), CANDIDATOS_TEXTO)
+
+    # Luego por trigramas en común y, a igual cantidad, primero el nombre al que le sobran menos.
+    buscados = _trigramas(plegado)
+    vistos = {fila[3] for fila in exactos}
+    ordenados = sorted((c for c in candidatos.values() if c[1][3] not in vistos),
+                       key=lambda c: (c[0], -len(buscados & _trigramas(c[1][4].lower())),
+                                      len(_trigramas(plegar(c[1][2])) - buscados)))
+    return [fila[:4] for fila in exactos] + [fila[:4] for _, fila in ordenados]
+
+def sugerir(conn, texto, limite=LIMITE):
+    # [(motivo, (sku, marca, producto, codebar))] para un CodeBar (o texto) que no
+    # existe tal cual, de lo más a lo menos probable. Con EQUIVALENTE primero, ese
+    # producto es el buscado.
+    texto = texto.strip()
+    sugerencias, vistos = [], {texto}
+
+    def agregar(motivo, filas):
+        for fila in filas:
+            if len(sugerencias) < limite and fila[3] not in vistos:
+                vistos.add(fila[3])
+                sugerencias.append((motivo, tuple(fila)))
+
+    if texto and not any(c.isspace() for c in texto):
+        agregar(EQUIVALENTE, _por_codebar(conn, equivalentes_gtin(texto)))
+        if texto.isdigit() and len(texto) + 1 in LONGITUDES_GTIN:
+            completo = texto + digito_verificador(texto)
+            agregar(SIN_VERIFICADOR, _por_codebar(conn, [completo] + equivalentes_gtin(completo)))
+        # El dígito verificador delata cualquier dígito mal leído: de los vecinos de un
+        # GTIN inválido, los que sí son válidos son los candidatos reales y van primero.
+        agregar(PARECIDO, sorted(_por_codebar(conn, vecinos(texto)), key=lambda fila: not gtin_valido(fila[3])))
+        if len(texto) >= 3:
+            agregar(PREFIJO, _por_prefijo(conn, texto, limite))
+    if len(sugerencias) < limite and any(c.isalpha() for c in texto) and _hay_trigramas(conn):
+        agregar(NOMBRE, _por_texto(conn, texto, limite))
+    return sugerencias
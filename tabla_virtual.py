@@ -0,0 +1,340 @@
+from bisect import bisect_left
+from collections import OrderedDict, deque
+import tkinter.ttk as ttk
+
+import datos
+from metricas import medido
+
+def _contar(fuente, desde_rowid, busqueda):
+    return fuente.contar_importaciones(desde_rowid, busqueda=busqueda), fuente.max_rowid_importaciones()
+
+def _leer_pagina(fuente, ancla, desplazamiento, tamano_pagina, busqueda):
+    # Devuelve (ancla de la página, filas); el ancla se ubica primero si no se conocía.
+    if desplazamiento is not None:
+        ancla = fuente.rowid_importacion_en_posicion(ancla, desplazamiento, busqueda=busqueda)
+        if ancla is None:
+            return None, []
+    return ancla, fuente.buscar_importaciones_pagina(ancla, tamano_pagina, busqueda=busqueda)
+
+def _leer_fila(fuente, rowid, busqueda):
+    return fuente.buscar_importacion_por_rowid(rowid, busqueda=busqueda)
+
+def _ejecutar_ahora(funcion, args, al_terminar, al_fallar):
+    try:
+        resultado = funcion(*args)
+    except Exception as e:
+        al_fallar(e)
+    else:
+        al_terminar(resultado)
+
+class ModeloImportaciones:
+    # Mantiene en memoria solo unas pocas páginas de importaciones. Cada página se
+    # busca por clave (rowid > ancla); el ancla de una página lejana se ubica una vez
+    # con OFFSET desde el ancla conocida más cercana y queda guardada. `fuente` es
+    # el módulo datos o un cliente_sync.ClienteSync con las mismas funciones.
+    # `preparadas` son líneas de una sesión de recepción aún sin guardar: se muestran
+    # después de las guardadas, con rowid negativo (-1 - índice en la lista).
+    # Las lecturas pasan por `ejecutar(funcion, args, al_terminar, al_fallar)`: por
+    # defecto en el acto; la interfaz las manda a ejecutor_bd, y entonces una página
+    # que no está en memoria se muestra vacía hasta que llega y se avisa con
+    # `al_cambiar()`. Los resultados se aplican en el orden en que se pidieron, y los
+    # pedidos antes de vaciar el caché se descartan. Un error se pasa a
+    # `al_fallar(error)` o, sin él, se relanza; lo que no se pudo leer se vuelve a
+    # pedir con recargar().
+    def __init__(self, tamano_pagina=200, max_paginas=10, fuente=datos, ejecutar=None, al_cambiar=None, al_fallar=None):
+        self.fuente = fuente
+        self.tamano_pagina = tamano_pagina
+        self.max_paginas = max_paginas
+        self.ejecutar = ejecutar or _ejecutar_ahora
+        self.al_cambiar = al_cambiar
+        self.al_fallar = al_fallar
+        self.desde_rowid = 0
+        self.busqueda = None
+        self.preparadas = []
+        self.guardadas = 0
+        self.max_rowid = 0
+        self.generacion = 0
+        self.lecturas = deque()
+        self.recargar()
+
+    @property
+    def total(self):
+        return self.guardadas + len(self.filas_preparadas())
+
+    def filas_preparadas(self):
+        return self.preparadas if self.busqueda is None else []
+
+    def _leer(self, funcion, args, aplicar):
+        pedido = [self.generacion, aplicar, None, False]
+        self.lecturas.append(pedido)
+
+        def terminar(resultado):
+            pedido[2:] = resultado, True
+            self._aplicar_lecturas()
+
+        def fallar(error):
+            pedido[1:] = None, None, True
+            self._aplicar_lecturas()
+            if self.al_fallar is None:
+                raise error
+            self.al_fallar(error)
+        self.ejecutar(funcion, args, terminar, fallar)
+
+    def _aplicar_lecturas(self):
+        aplicadas = False
+        while self.lecturas and self.lecturas[0][3]:
+            generacion, aplicar, resultado, _ = self.lecturas.popleft()
+            if aplicar is not None and generacion == self.generacion:
+                aplicar(resultado)
+                aplicadas = True
+        if aplicadas and self.al_cambiar is not None:
+            self.al_cambiar()
+
+    def recargar(self, desde_rowid=None):
+        if desde_rowid is not None:
+            self.desde_rowid = desde_rowid
+        self._vaciar_cache()
+        self._leer(_contar, (self.fuente, self.desde_rowid, self.busqueda), self._fin_recargar)
+
+    def _fin_recargar(self, resultado):
+        self.guardadas, self.max_rowid = resultado
+
+    def aplicar_busqueda(self, busqueda, total, primera_pagina, max_rowid):
+        # Resultado calculado fuera del hilo de la interfaz (ver BuscadorImportaciones).
+        self.busqueda = busqueda
+        self.guardadas = total
+        self.max_rowid = max_rowid
+        self._vaciar_cache()
+        self.paginas[0] = primera_pagina
+        if len(primera_pagina) == self.tamano_pagina:
+            self.anclas[1] = primera_pagina[-1][0]
+
+    def _vaciar_cache(self):
+        self.generacion += 1
+        self.paginas = OrderedDict()
+        self.anclas = {0: self.desde_rowid}
+        self.cargando = set()
+
+    def _invalidar_desde(self, numero):
+        for k in [k for k in self.paginas if k >= numero]:
+            del self.paginas[k]
+        for k in [k for k in self.anclas if k > numero]:
+            del self.anclas[k]
+
+    def pagina(self, numero):
+        filas = self.paginas.get(numero)
+        if filas is not None:
+            self.paginas.move_to_end(numero)
+            return filas
+        if numero not in self.cargando:
+            self.cargando.add(numero)
+            base = numero if numero in self.anclas else max(k for k in self.anclas if k < numero)
+            ancla_base = self.anclas[base]
+            desplazamiento = None if base == numero else (numero - base) * self.tamano_pagina - 1
+            self._leer(_leer_pagina, (self.fuente, ancla_base, desplazamiento, self.tamano_pagina, self.busqueda),
+                       lambda resultado: self._fin_pagina(numero, base, ancla_base, resultado))
+        return self.paginas.get(numero, [])
+
+    def _fin_pagina(self, numero, base, ancla_base, resultado):
+        self.cargando.discard(numero)
+        if self.anclas.get(base) != ancla_base:
+            # Una fila borrada mientras se leía movió las anclas: se pedirá de nuevo.
+            return
+        ancla, filas = resultado
+        if ancla is not None:
+            self.anclas[numero] = ancla
+        self.paginas[numero] = filas
+        if len(filas) == self.tamano_pagina:
+            self.anclas.setdefault(numero + 1, filas[-1][0])
+        while len(self.paginas) > self.max_paginas:
+            self.paginas.popitem(last=False)
+
+    def filas(self, inicio, cantidad):
+        resultado = []
+        posicion = inicio
+        fin = min(self.guardadas, inicio + cantidad)
+        while posicion < fin:
+            numero, desplazamiento = divmod(posicion, self.tamano_pagina)
+            filas = self.pagina(numero)[desplazamiento:desplazamiento + fin - posicion]
+            if not filas:
+                break
+            resultado.extend(filas)
+            posicion += len(filas)
+        if posicion < fin:
+            # Faltan guardadas que todavía se están leyendo: las preparadas van después.
+            return resultado
+        preparadas = self.filas_preparadas()
+        desde = max(0, inicio - self.guardadas)
+        hasta = min(len(preparadas), inicio + cantidad - self.guardadas)
+        resultado.extend((-1 - i, *preparadas[i]) for i in range(desde, hasta))
+        return resultado
+
+    def _ubicar(self, rowid):
+        for numero, filas in self.paginas.items():
+            if filas and filas[0][0] <= rowid <= filas[-1][0]:
+                i = bisect_left([f[0] for f in filas], rowid)
+                if filas[i][0] == rowid:
+                    return numero, i
+        return None
+
+    def refrescar_fila(self, rowid):
+        if rowid <= self.desde_rowid:
+            return
+        self._leer(_leer_fila, (self.fuente, rowid, self.busqueda), lambda row: self._fin_refrescar(rowid, row))
+
+    def _fin_refrescar(self, rowid, row):
+        # Con una búsqueda activa, una fila que deja de coincidir se trata como eliminada.
+        ubicacion = self._ubicar(rowid)
+        if row is None:
+            if ubicacion is not None:
+                self.guardadas -= 1
+                self._invalidar_desde(ubicacion[0])
+            elif rowid > self.max_rowid:
+                # Fila nueva que no coincide con la búsqueda activa.
+                self.max_rowid = rowid
+            elif self.busqueda is None:
+                # Sin vaciar el caché con _vaciar_cache(): las lecturas pedidas después
+                # de esta (otras filas nuevas) todavía tienen que aplicarse.
+                self.guardadas -= 1
+                self._invalidar_desde(0)
+            else:
+                self.recargar()
+        elif ubicacion is not None:
+            numero, i = ubicacion
+            self.paginas[numero][i] = row
+        elif rowid > self.max_rowid:
+            # Los rowid nuevos siempre quedan al final.
+            self.max_rowid = rowid
+            self.guardadas += 1
+            self._invalidar_desde((self.guardadas - 1) // self.tamano_pagina)
+        elif self.busqueda is not None:
+            # Fila existente que empezó a coincidir con la búsqueda: su posición no se conoce.
+            self.recargar()
+
+class TablaVirtual:
+    # Muestra en un ttk.Treeview solo las filas visibles del modelo. Los items se
+    # reutilizan al desplazarse y la barra de desplazamiento refleja la posición
+    # sobre el total de filas, no sobre los items cargados.
+    def __init__(self, tree, scrollbar, modelo, rowid_map, tag_fila):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.modelo = modelo
+        self.rowid_map = rowid_map
+        self.tag_fila = tag_fila
+        self.items = []
+        self.primera = 0
+        self.filas_visibles = int(tree.cget("height"))
+        self.rowid_seleccionado = None
+
+        self.scrollbar.configure(command=self.desplazar)
+        self.tree.bind("<Configure>", self._al_redimensionar)
+        self.tree.bind("<<TreeviewSelect>>", self._al_seleccionar, add="+")
+        self.tree.bind("<MouseWheel>", self._rueda)
+        self.tree.bind("<Button-4>", lambda e: self._mover(-3))
+        self.tree.bind("<Button-5>", lambda e: self._mover(3))
+        for tecla in ("Up", "Down", "Prior", "Next", "Home", "End"):
+            self.tree.bind(f"<{tecla}>", self._tecla)
+
+    @medido
+    def renderizar(self):
+        self.primera = max(0, min(self.primera, self.modelo.total - self.filas_visibles))
+        filas = self.modelo.filas(self.primera, self.filas_visibles)
+        while len(self.items) < len(filas):
+            self.items.append(self.tree.insert("", "end"))
+        while len(self.items) > len(filas):
+            self.tree.delete(self.items.pop())
+        self.rowid_map.clear()
+        seleccion = None
+        for item_id, row in zip(self.items, filas):
+            fila = row[1:]
+            self.tree.item(item_id, values=fila, tags=("preparada",) if row[0] < 0 else (self.tag_fila(fila),))
+            self.rowid_map[item_id] = row[0]
+            if row[0] == self.rowid_seleccionado:
+                seleccion = item_id
+        actual = self.tree.selection()
+        if seleccion is not None:
+            if actual != (seleccion,):
+                self.tree.selection_set(seleccion)
+        elif actual:
+            self.tree.selection_remove(*actual)
+        self.scrollbar.set(*self.fracciones())
+
+    def fracciones(self):
+        total = self.modelo.total
+        if not total:
+            return 0.0, 1.0
+        return self.primera / total, min(1.0, (self.primera + self.filas_visibles) / total)
+
+    def desplazar(self, *args):
+        if args[0] == "moveto":
+            self.primera = int(float(args[1]) * self.modelo.total)
+        elif args[0] == "scroll":
+            paso = self.filas_visibles if args[2] == "pages" else 1
+            self.primera += int(args[1]) * paso
+        self.renderizar()
+
+    def limpiar_seleccion(self):
+        self.rowid_seleccionado = None
+        actual = self.tree.selection()
+        if actual:
+            self.tree.selection_remove(*actual)
+
+    def seleccionar_posicion(self, posicion):
+        if not self.modelo.total:
+            return
+        posicion = max(0, min(posicion, self.modelo.total - 1))
+        if posicion < self.primera:
+            self.primera = posicion
+        elif posicion >= self.primera + self.filas_visibles:
+            self.primera = posicion - self.filas_visibles + 1
+        self.renderizar()
+        indice = posicion - self.primera
+        if 0 <= indice < len(self.items):
+            item_id = self.items[indice]
+            self.tree.selection_set(item_id)
+            self.tree.focus(item_id)
+
+    def _posicion_seleccionada(self):
+        for indice, item_id in enumerate(self.items):
+            if self.rowid_map.get(item_id) == self.rowid_seleccionado:
+                return self.primera + indice
+        return None
+
+    def _al_seleccionar(self, event):
+        seleccion = self.tree.selection()
+        if seleccion:
+            self.rowid_seleccionado = self.rowid_map.get(seleccion[0])
+
+    def _mover(self, filas):
+        self.primera += filas
+        self.renderizar()
+        return "break"
+
+    def _rueda(self, event):
+        return self._mover(-3 if event.delta > 0 else 3)
+
+    def _tecla(self, event):
+        actual = self._posicion_seleccionada()
+        if actual is None:
+            actual = self.primera - 1 if event.keysym in ("Down", "Next") else self.primera
+        saltos = {"Up": -1, "Down": 1, "Prior": -self.filas_visibles, "Next": self.filas_visibles}
+        if event.keysym == "Home":
+            destino = 0
+        elif event.keysym == "End":
+            destino = self.modelo.total - 1
+        else:
+            destino = actual + saltos[event.keysym]
+        self.seleccionar_posicion(destino)
+        return "break"
+
+    def _al_redimensionar(self, event):
+        alto_fila = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        encabezado = 25
+        if self.items:
+            caja = self.tree.bbox(self.items[0])
+            if caja:
+                encabezado, alto_fila = caja[1], caja[3]
+        visibles = max(1, (event.height - encabezado) // alto_fila)
+        if visibles != self.filas_visibles:
+            self.filas_visibles = visibles
+            self.renderizar()
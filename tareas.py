@@ -0,0 +1,199 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+import datos
+
+class TareaCancelada(Exception):
+    pass
+
+class TareaEnSegundoPlano:
+    # Ejecuta `funcion` en un hilo aparte. La función recibe un argumento `progreso`
+    # que puede llamar con cualquier dato; si la tarea fue cancelada, `progreso`
+    # lanza TareaCancelada para que la función aborte (y revierta su transacción).
+    # Los resultados vuelven al hilo de Tk consultando una cola con after().
+    def __init__(self, widget, funcion, *args, al_progresar=None, al_terminar=None,
+                 al_fallar=None, al_cancelar=None, intervalo=100, **kwargs):
+        self.widget = widget
+        self.al_progresar = al_progresar
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.al_cancelar = al_cancelar
+        self.intervalo = intervalo
+        self._cola = queue.Queue()
+        self._cancelar = threading.Event()
+        self._hilo = threading.Thread(target=self._ejecutar, args=(funcion, args, kwargs), daemon=True)
+        self._hilo.start()
+        self.widget.after(self.intervalo, self._revisar)
+
+    @property
+    def cancelada(self):
+        return self._cancelar.is_set()
+
+    @property
+    def activa(self):
+        return self._hilo.is_alive()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    def _progreso(self, *valores):
+        if self._cancelar.is_set():
+            raise TareaCancelada()
+        self._cola.put(('progreso', valores))
+
+    def _ejecutar(self, funcion, args, kwargs):
+        try:
+            resultado = funcion(*args, progreso=self._progreso, **kwargs)
+        except TareaCancelada:
+            self._cola.put(('cancelada', None))
+        except Exception as e:
+            self._cola.put(('error', e))
+        else:
+            self._cola.put(('fin', resultado))
+        finally:
+            # El hilo termina aquí: su conexión (si abrió una) no debe quedar abierta.
+            datos.cerrar_conexion_hilo()
+
+    def _revisar(self):
+        try:
+            if not self.widget.winfo_exists():
+                self._cancelar.set()
+                return
+        except Exception:
+            self._cancelar.set()
+            return
+        ultimo_progreso = None
+        final = None
+        while final is None:
+            try:
+                tipo, valor = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == 'progreso':
+                ultimo_progreso = valor
+            else:
+                final = (tipo, valor)
+        # Solo se pinta el último progreso pendiente; los intermedios se descartan.
+        if ultimo_progreso is not None and self.al_progresar:
+            self.al_progresar(*ultimo_progreso)
+        if final is None:
+            self.widget.after(self.intervalo, self._revisar)
+            return
+        tipo, valor = final
+        if tipo == 'fin' and self.al_terminar:
+            self.al_terminar(valor)
+        elif tipo == 'error' and self.al_fallar:
+            self.al_fallar(valor)
+        elif tipo == 'cancelada' and self.al_cancelar:
+            self.al_cancelar()
+
+class _Trabajo:
+    __slots__ = ("funcion", "args", "kwargs", "clave", "futuro")
+
+    def __init__(self, funcion, args, kwargs, clave):
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.clave = clave
+        self.futuro = Future()
+
+class EjecutorBD:
+    # Un único hilo que ejecuta en orden los trabajos de base de datos enviados
+    # desde la interfaz; cada envío devuelve un Future. Con `clave`, un envío
+    # repetido de la misma función se une al trabajo que aún no terminó: si tiene
+    # los mismos argumentos se devuelve el mismo Future (doble clic) y si todavía
+    # no empezó se le cambian los argumentos por los últimos. Una función distinta
+    # con la misma clave (borrar una fila con una edición pendiente) es un trabajo
+    # aparte con su propio Future, que corre después del pendiente.
+    def __init__(self):
+        self._cola = queue.Queue()
+        self._por_clave = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def enviar(self, funcion, *args, clave=None, **kwargs):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._trabajar, daemon=True)
+                self._hilo.start()
+            previo = self._por_clave.get(clave) if clave is not None else None
+            if previo is not None and previo.funcion == funcion:
+                if (previo.args, previo.kwargs) == (args, kwargs):
+                    return previo.futuro
+                if not previo.futuro.running():
+                    previo.funcion, previo.args, previo.kwargs = funcion, args, kwargs
+                    return previo.futuro
+            trabajo = _Trabajo(funcion, args, kwargs, clave)
+            if clave is not None:
+                self._por_clave[clave] = trabajo
+            self._cola.put(trabajo)
+            return trabajo.futuro
+
+    def _trabajar(self):
+        while True:
+            trabajo = self._cola.get()
+            with self._lock:
+                iniciado = trabajo.futuro.set_running_or_notify_cancel()
+                funcion, args, kwargs = trabajo.funcion, trabajo.args, trabajo.kwargs
+            if iniciado:
+                try:
+                    resultado = funcion(*args, **kwargs)
+                except BaseException as e:
+                    trabajo.futuro.set_exception(e)
+                else:
+                    trabajo.futuro.set_result(resultado)
+            with self._lock:
+                if self._por_clave.get(trabajo.clave) is trabajo:
+                    del self._por_clave[trabajo.clave]
+
+ejecutor_bd = EjecutorBD()
+
+def al_completar(widget, futuro, al_terminar=None, al_fallar=None, intervalo=30):
+    # Consulta el Future con after() y llama al callback en el hilo de Tk. Si el
+    # widget ya no existe el resultado se descarta.
+    def revisar():
+        try:
+            if not widget.winfo_exists():
+                return
+        except Exception:
+            return
+        if not futuro.done():
+            widget.after(intervalo, revisar)
+            return
+        error = futuro.exception()
+        if error is None:
+            if al_terminar:
+                al_terminar(futuro.result())
+        elif al_fallar:
+            al_fallar(error)
+    widget.after(intervalo, revisar)
+
+class IndicadorTrabajos:
+    # Muestra `texto` en una etiqueta mientras haya trabajos pendientes enviados
+    # desde una ventana. Un Future que ya se está siguiendo (envío unido a uno
+    # anterior) no vuelve a disparar sus callbacks.
+    def __init__(self, etiqueta, texto="Guardando..."):
+        self.etiqueta = etiqueta
+        self.texto = texto
+        self.pendientes = set()
+
+    @property
+    def ocupado(self):
+        return bool(self.pendientes)
+
+    def seguir(self, futuro, al_terminar=None, al_fallar=None):
+        if futuro in self.pendientes:
+            return
+        self.pendientes.add(futuro)
+        self.etiqueta.configure(text=self.texto)
+
+        def terminar(callback, valor):
+            self.pendientes.discard(futuro)
+            if not self.pendientes:
+                self.etiqueta.configure(text="")
+            if callback:
+                callback(valor)
+        al_completar(self.etiqueta, futuro,
+                     lambda resultado: terminar(al_terminar, resultado),
+                     lambda error: terminar(al_fallar, error))
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Las pruebas reutilizan los generadores de datos de benchmarks/.
+sys.path[:0] = [RAIZ, os.path.join(RAIZ, "benchmarks")]
+
+@pytest.fixture
+def raiz_tk():
+    # Una ventana Tk oculta; sin pantalla la prueba se omite (en un servidor, xvfb-run).
+    tk = pytest.importorskip("tkinter")
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        pytest.skip(f"sin pantalla: {e}")
+    yield root
+    root.destroy()
@@ -0,0 +1,19 @@
+import statistics
+
+import pytest
+
+from bench_arranque import (PRESUPUESTO, PRESUPUESTO_IMPORTACION, pesados_cargados, tiempo_importacion,
+                            tiempo_primera_ventana)
+
+# Importar la aplicación necesita customtkinter, no una pantalla.
+pytest.importorskip("customtkinter")
+
+def test_no_importa_modulos_pesados_al_iniciar():
+    assert pesados_cargados() == []
+
+def test_importacion_dentro_del_presupuesto():
+    assert tiempo_importacion() <= PRESUPUESTO_IMPORTACION
+
+def test_primera_ventana_dentro_del_presupuesto(raiz_tk, tmp_path):
+    tiempos = [tiempo_primera_ventana(tmp_path) for _ in range(3)]
+    assert statistics.median(tiempos) <= PRESUPUESTO
@@ -0,0 +1,47 @@
+import pytest
+
+from bench_escaner import flujo, leer_en_ventana
+from escaner import DetectorEscaner, INTERVALO_MAX
+
+def teclear(detector, teclas):
+    # Devuelve lo que el detector devolvió como escrito a mano, al final de todo.
+    texto = [detector.tecla(caracter, instante)[0] for caracter, instante in teclas]
+    texto.append(detector.cerrar())
+    return "".join(texto)
+
+@pytest.mark.parametrize("cada", [0.2, 1.0])
+def test_rafagas_sinteticas_sin_perder_lecturas(cada):
+    codigos, teclas, escrito = flujo(300, cada, 1)
+    detector = DetectorEscaner()
+    texto = teclear(detector, teclas)
+    assert list(detector.lecturas) == codigos
+    assert texto == "".join(escrito)
+
+def test_lector_sin_enter_se_cierra_por_pausa():
+    detector = DetectorEscaner()
+    teclas = [(c, i * 0.005) for i, c in enumerate("7401234567895")]
+    teclas.append(("5", 1.0))
+    texto = teclear(detector, teclas)
+    assert list(detector.lecturas) == ["7401234567895"]
+    assert texto == "5"
+
+def test_enter_a_mano_no_se_consume():
+    detector = DetectorEscaner()
+    assert detector.tecla("1", 0.0) == ("", True)
+    assert detector.tecla("2", 0.2) == ("1", True)
+    assert detector.tecla("\n", 0.4) == ("2", False)
+    assert not detector.lecturas
+
+def test_tecla_a_mano_pegada_a_la_rafaga():
+    # Una cifra escrita a mano a menos de INTERVALO_MAX de la lectura no se pega al código.
+    detector = DetectorEscaner()
+    teclas = [("3", 0.0)] + [(c, INTERVALO_MAX * 0.7 + i * 0.004) for i, c in enumerate("7401234567895\n")]
+    texto = teclear(detector, teclas)
+    assert list(detector.lecturas) == ["7401234567895"]
+    assert texto == "3"
+
+def test_ventana_con_eventos_de_teclado(raiz_tk):
+    codigos, teclas, escrito = flujo(50, 0.2, 2)
+    leidas, campo = leer_en_ventana(raiz_tk, teclas, len(codigos))
+    assert leidas == codigos
+    assert campo == "".join(escrito)